@@ -301,7 +301,8 @@ bool uploadImage(camera_fb_t* fb) {
     bool success = false;
     if (httpResponseCode > 0) {
         Serial.printf("HTTP Response: %d\n", httpResponseCode);
-        if (httpResponseCode == 200) {
+        // 202 = accepted by a server in async ingest mode
+        if (httpResponseCode == 200 || httpResponseCode == 202) {
             String response = http.getString();
             Serial.printf("Server response: %s\n", response.c_str());
             success = true;
@@ -327,6 +328,7 @@ bool sendStreamFrame(camera_fb_t* fb) {
 
     // Add authentication header
     http.addHeader("X-Auth-Token", AUTH_TOKEN);
+    http.addHeader("X-Device-ID", DEVICE_ID);  // Stream channel on the server
     http.addHeader("Content-Type", "image/jpeg");
 
     // Send frame as raw JPEG
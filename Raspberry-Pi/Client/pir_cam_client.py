@@ -19,6 +19,7 @@ Dependencies:
 import sys
 import time
 import logging
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta
 from io import BytesIO
@@ -181,6 +182,113 @@ def get_camera_interface(config) -> CameraInterface:
     else:
         raise RuntimeError("No camera interface available")
 
+# ============================================================================
+# STREAM SENDER
+# ============================================================================
+
+class StreamSender:
+    """
+    Sends live frames over one persistent connection (/stream_ingest)
+
+    Frames are written as one continuous multipart body (chunked transfer
+    encoding), so there is no HTTP request per frame. Only the newest frame
+    is kept: if the link is slower than the camera, frames are skipped.
+    Reconnects after errors, with a growing delay; if the server has no
+    /stream_ingest, `supported` becomes False and the caller should use
+    /stream_frame. Other 4xx answers (e.g. wrong auth_token) stop the
+    sender, as retrying would not help.
+    """
+
+    BOUNDARY = 'frame'
+    MAX_RECONNECT_DELAY = 60.0
+
+    def __init__(self, server_url: str, auth_token: str, device_id: str, reconnect_delay: float = 2.0):
+        self.url = f"{server_url}/stream_ingest"
+        self.headers = {
+            'X-Auth-Token': auth_token,
+            'X-Device-ID': device_id,
+            'Content-Type': f'multipart/x-mixed-replace; boundary={self.BOUNDARY}'
+        }
+        self.reconnect_delay = reconnect_delay
+        self.supported = True
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._running = True
+
+        self._thread = threading.Thread(target=self._run, name="stream-sender", daemon=True)
+        self._thread.start()
+
+    def send(self, jpeg_bytes: bytes):
+        """Queue a frame (replaces a frame that was not sent yet)"""
+        with self._cond:
+            self._frame = jpeg_bytes
+            self._cond.notify()
+
+    def _parts(self):
+        """Request body: one multipart part per frame, until close()"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._frame is not None or not self._running)
+                if not self._running:
+                    break
+                frame, self._frame = self._frame, None
+
+            yield (f"--{self.BOUNDARY}\r\n"
+                   f"Content-Type: image/jpeg\r\n"
+                   f"Content-Length: {len(frame)}\r\n\r\n").encode() + frame + b"\r\n"
+
+        yield f"--{self.BOUNDARY}--\r\n".encode()
+
+    def _rejected(self, status_code: int) -> bool:
+        """True if the server answered with a 4xx status (stop streaming)"""
+        if status_code in (404, 405):
+            # Older servers only have /stream_frame
+            logger.warning("Server has no /stream_ingest, using one request per frame")
+            self.supported = False
+            return True
+        if 400 <= status_code < 500:
+            hint = " - check auth_token" if status_code in (401, 403) else ""
+            logger.error(f"Stream ingest rejected (HTTP {status_code}), live stream stopped{hint}")
+            return True
+        return False
+
+    def _run(self):
+        # Probe with an empty body: finds missing endpoints and a wrong
+        # token before the first frame is streamed
+        try:
+            probe = requests.post(self.url, data=f"--{self.BOUNDARY}--\r\n", headers=self.headers, timeout=10)
+            if self._rejected(probe.status_code):
+                return
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Stream ingest probe failed: {e}")
+
+        delay = self.reconnect_delay
+        while self._running:
+            try:
+                logger.info(f"Stream connection open: {self.url}")
+                response = requests.post(self.url, data=self._parts(), headers=self.headers, timeout=(10, None))
+                if response.status_code == 200:
+                    delay = self.reconnect_delay
+                else:
+                    logger.error(f"Stream connection closed: HTTP {response.status_code}")
+                    if self._rejected(response.status_code):
+                        return
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Stream connection lost: {e}")
+
+            if self._running:
+                time.sleep(delay)
+                delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    def close(self):
+        """End the request body and stop"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+
 # ============================================================================
 # MOTION DETECTOR CLIENT
 # ============================================================================
@@ -206,6 +314,11 @@ class MotionDetectorClient:
         self.stream_interval = 1.0 / config['streaming']['fps']
         self.last_stream_time = None
 
+        # One persistent connection for all stream frames (see StreamSender)
+        self.stream_sender = None
+        if self.streaming_enabled and config['streaming'].get('persistent', True):
+            self.stream_sender = StreamSender(self.server_url, self.auth_token, self.device_id)
+
         # Initialize PIR
         pir_pin = config['pir']['gpio_pin']
         logger.info(f"Initializing PIR sensor on GPIO {pir_pin}...")
@@ -243,6 +356,7 @@ class MotionDetectorClient:
 
             if event_type == 'stream':
                 headers['Content-Type'] = 'image/jpeg'
+                headers['X-Device-ID'] = self.device_id  # Stream channel on the server
 
             response = requests.post(
                 endpoint,
@@ -252,7 +366,8 @@ class MotionDetectorClient:
                 timeout=10
             )
 
-            if response.status_code == 200:
+            # 202 = accepted by a server in async ingest mode
+            if response.status_code in (200, 202):
                 logger.debug(f"Upload successful ({event_type}): {len(jpeg_bytes)} bytes")
                 return True
             else:
@@ -313,8 +428,11 @@ class MotionDetectorClient:
             # Capture frame
             jpeg_bytes = self.camera.capture_jpeg()
 
-            # Upload (fire-and-forget, don't block)
-            self.upload_image(jpeg_bytes, event_type='stream')
+            # Hand to the persistent connection, or upload (fire-and-forget, don't block)
+            if self.stream_sender and self.stream_sender.supported:
+                self.stream_sender.send(jpeg_bytes)
+            else:
+                self.upload_image(jpeg_bytes, event_type='stream')
 
             self.last_stream_time = now
 
@@ -354,6 +472,8 @@ class MotionDetectorClient:
         """Stop client"""
         logger.info("Stopping client...")
         self.running = False
+        if self.stream_sender:
+            self.stream_sender.close()
         self.camera.close()
         logger.info("Client stopped")
 
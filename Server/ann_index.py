@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Approximate Nearest-Neighbour Index - IVF (NumPy only)
+=======================================================
+Inverted-file index for large face galleries.
+
+Embeddings are clustered with spherical k-means; each cluster keeps its
+samples as a small FaceGallery. A query is only compared against the
+samples in the `nprobe` clusters whose centroids are closest, so search
+cost grows with N / nlist * nprobe instead of N.
+
+Knobs (config.yaml -> face_recognition.index):
+- nlist: number of clusters (0 = auto, ~4 * sqrt(samples))
+- nprobe: clusters searched per query (higher = better recall, slower)
+"""
+
+import logging
+import time
+from threading import RLock
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from face_gallery import FaceGallery, NO_MATCH_DISTANCE, normalize_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """
+    IVF index over normalized embeddings with incremental insert/delete
+
+    Exposes the same search() interface as FaceGallery, so the matcher
+    does not care which one it gets.
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, train_iters: int = 10,
+                 max_train_samples: int = 20000, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+
+        self._lock = RLock()
+        self._centroids = np.zeros((0, 0), dtype=np.float32)
+        self._lists: List[FaceGallery] = []
+        self._where: Dict[int, int] = {}  # sample_id -> list number
+        self._size = 0
+        self.trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ------------------------------------------------------------------
+    # Build / train
+    # ------------------------------------------------------------------
+
+    def build(self, gallery: FaceGallery):
+        """(Re)train centroids on the gallery and assign all samples"""
+        start = time.time()
+        n = len(gallery)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, max(1, n))
+
+        centroids = self._train(gallery.matrix, nlist)
+        assignment = self._assign(gallery.matrix, centroids)
+
+        lists = [gallery.filtered(assignment == c) for c in range(nlist)]
+        where = {int(sid): int(c) for sid, c in zip(gallery.sample_ids, assignment)}
+
+        with self._lock:
+            self._centroids = centroids
+            self._lists = lists
+            self._where = where
+            self._size = n
+            self.trained_size = n
+
+        logger.info(f"IVF index built: {n} samples, {nlist} lists ({(time.time() - start) * 1000:.0f} ms)")
+
+    def _train(self, matrix: np.ndarray, nlist: int) -> np.ndarray:
+        """Spherical k-means on (a sample of) the normalized embeddings"""
+        rng = np.random.default_rng(self.seed)
+
+        if len(matrix) > self.max_train_samples:
+            matrix = matrix[rng.choice(len(matrix), self.max_train_samples, replace=False)]
+
+        centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+
+        for _ in range(self.train_iters):
+            assignment = self._assign(matrix, centroids)
+
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, matrix)
+            counts = np.bincount(assignment, minlength=nlist)
+
+            # Re-seed empty clusters with random samples
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = matrix[rng.choice(len(matrix), len(empty), replace=False)]
+
+            centroids = normalize_embeddings(sums)
+
+        return centroids
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Nearest centroid (max cosine similarity) for each row"""
+        if len(matrix) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.argmax(matrix @ centroids.T, axis=1)
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def add(self, sample_id: int, person_id: int, embedding: np.ndarray):
+        """Insert one sample into its nearest list"""
+        row = normalize_embeddings(np.asarray(embedding, dtype=np.float32).ravel())
+        with self._lock:
+            c = int(self._assign(row, self._centroids)[0])
+            self._lists[c] = self._lists[c].with_sample(sample_id, person_id, row[0])
+            self._where[int(sample_id)] = c
+            self._size += 1
+
+    def remove(self, sample_id: int):
+        """Remove one sample (no-op if unknown)"""
+        with self._lock:
+            c = self._where.pop(int(sample_id), None)
+            if c is None:
+                return
+            self._lists[c] = self._lists[c].filtered(self._lists[c].sample_ids != sample_id)
+            self._size -= 1
+
+    def remove_person(self, person_id: int):
+        """Remove all samples of a person"""
+        with self._lock:
+            for c, lst in enumerate(self._lists):
+                keep = lst.person_ids != person_id
+                if not keep.all():
+                    for sid in lst.sample_ids[~keep]:
+                        self._where.pop(int(sid), None)
+                    self._size -= int((~keep).sum())
+                    self._lists[c] = lst.filtered(keep)
+
+    def relabel(self, from_person_id: int, into_person_id: int):
+        """Move all samples of from_person_id to into_person_id"""
+        with self._lock:
+            self._lists = [
+                lst.relabeled(from_person_id, into_person_id) if (lst.person_ids == from_person_id).any() else lst
+                for lst in self._lists
+            ]
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(self, queries: np.ndarray, k: int = 2, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate k nearest samples for each query
+
+        Probes the nprobe closest lists, widening the probe until at least
+        k candidates were seen, so d1 and d2 always come from real samples
+        when the index holds at least k of them.
+
+        Returns:
+            (person_ids, distances) shaped (n, k), as FaceGallery.search()
+        """
+        queries = normalize_embeddings(queries)
+        n = len(queries)
+        nprobe = nprobe or self.nprobe
+
+        out_ids = np.full((n, k), -1, dtype=np.int64)
+        out_dist = np.full((n, k), NO_MATCH_DISTANCE, dtype=np.float64)
+
+        with self._lock:
+            if self._size == 0 or n == 0:
+                return out_ids, out_dist
+
+            centroids = self._centroids
+            lists = self._lists
+
+        # Lists ordered by centroid distance, per query
+        probe_order = np.argsort(-(queries @ centroids.T), axis=1)
+
+        for i, query in enumerate(queries):
+            cand_ids = []
+            cand_dist = []
+            seen = 0
+
+            for probed, c in enumerate(probe_order[i]):
+                if probed >= nprobe and seen >= k:
+                    break
+                lst = lists[c]
+                if len(lst) == 0:
+                    continue
+                ids, dists = lst.search(query, k)
+                cand_ids.append(ids[0])
+                cand_dist.append(dists[0])
+                seen += len(lst)
+
+            ids = np.concatenate(cand_ids)
+            dists = np.concatenate(cand_dist)
+            order = np.argsort(dists)[:k]
+            out_ids[i, :len(order)] = ids[order]
+            out_dist[i, :len(order)] = dists[order]
+
+        return out_ids, out_dist
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sizes = [len(lst) for lst in self._lists]
+            return {
+                'samples': self._size,
+                'nlist': len(self._lists),
+                'nprobe': self.nprobe,
+                'trained_size': self.trained_size,
+                'max_list_size': max(sizes) if sizes else 0
+            }
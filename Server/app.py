@@ -16,20 +16,29 @@ Features:
 
 import os
 import sys
+import atexit
+import signal
 import time
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
-from threading import Lock
 from io import BytesIO
+from threading import Lock
+from urllib.parse import quote
 
 from flask import Flask, request, Response, jsonify, render_template, redirect, url_for
+from markupsafe import escape
+from PIL import Image
 import yaml
 
 # Import our modules
-from database import Database
-from face_recognition_cv import FaceRecognitionCV
+from database import Database, encode_cursor, decode_cursor
+from face_recognition_cv import FaceRecognitionCV, FaceCrop
+from storage import ImageStorage
+from stream_hub import StreamHub, MosaicComposer, MJPEG_BOUNDARY, mjpeg_part, read_mjpeg_parts
+from clip_recorder import ClipRecorder, iter_clip_frames
 from notifications import get_notification_backend
+import metrics
 
 # ============================================================================
 # CONFIGURATION
@@ -59,26 +68,126 @@ STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 FACES_DIR = Path(config['face_recognition']['faces_dir'])
 FACES_DIR.mkdir(parents=True, exist_ok=True)
 
+# Sharded image layout; /image/<key> and the templates look files up here
+clips_config = config['storage'].get('clips', {})
+storage_areas = {'images': STORAGE_DIR, 'faces': FACES_DIR}
+if clips_config.get('enabled', False):
+    storage_areas['clips'] = Path(clips_config.get('dir', './captured_clips'))
+storage = ImageStorage(storage_areas)
+
 # Auth
 AUTH_TOKEN = config['security']['auth_token']
 
 # Stream state
-latest_frame = None
-frame_lock = Lock()
 latest_image_path = None
 latest_event_id = None
 
 # Auto-learning cooldown tracking
 learning_cooldown = {}  # {person_id: last_learning_timestamp}
+auto_learn_lock = Lock()
+
+# Pipeline metrics (/metrics); recognition and database stages are
+# recorded in face_recognition_cv.py and database.py
+UPLOAD_STAGE_SECONDS = metrics.histogram(
+    'facerec_upload_stage_seconds',
+    'Latency of the /upload pipeline stages',
+    ['stage'],
+    trace_prefix=''
+)
+UPLOADS_TOTAL = metrics.counter('facerec_uploads_total', 'Images received, by source', ['source'])
+FACES_TOTAL = metrics.counter('facerec_faces_detected_total', 'Faces detected in uploaded images')
+AUTO_LEARNED_TOTAL = metrics.counter('facerec_auto_learned_total', 'Face samples added by auto-learning')
 
 # ============================================================================
 # INITIALIZE COMPONENTS
 # ============================================================================
 
 app = Flask(__name__)
-db = Database(config['face_recognition']['db_path'])
+app.jinja_env.globals['image_url'] = storage.url_for
+app.jinja_env.globals['clip_url'] = lambda clip_path: storage.url_for(clip_path, route='clip')
+db = Database(
+    config['face_recognition']['db_path'],
+    config['face_recognition'].get('index'),
+    config['face_recognition'].get('group_commit'),
+    config['face_recognition'].get('db_pool_size', 8)
+)
+atexit.register(db.close)  # Flushes queued group-commit writes
+
+@app.teardown_request
+def release_db_connection(exc):
+    """Return the request thread's database connection to the pool"""
+    db.release()
+
+# Live stream: one channel per device; /stream_frame publishes, every
+# /stream viewer waits for new frames of its channel
+stream_hub = StreamHub(
+    max_devices=config['stream'].get('max_devices', 16),
+    keepalive_s=config['stream'].get('keepalive_seconds', 10),
+    renditions=config['stream'].get('renditions', {}),
+    default_quality=lambda: config['stream'].get('jpeg_quality', 80)
+)
+mosaic_config = config['stream'].get('mosaic', {})
+stream_mosaic = MosaicComposer(
+    stream_hub,
+    fps=mosaic_config.get('fps', 2),
+    tile_size=(mosaic_config.get('tile_width', 320), mosaic_config.get('tile_height', 240)),
+    jpeg_quality=config['stream'].get('jpeg_quality', 80)
+)
+atexit.register(stream_hub.close)
+atexit.register(stream_mosaic.close)
+
+# Optional: pre/post-roll clips of motion events from the live stream
+clip_recorder = None
+if clips_config.get('enabled', False):
+    clip_recorder = ClipRecorder(
+        storage,
+        pre_roll_s=clips_config.get('pre_roll_seconds', 5),
+        post_roll_s=clips_config.get('post_roll_seconds', 10),
+        max_memory_mb=clips_config.get('max_memory_mb', 64),
+        max_devices=config['stream'].get('max_devices', 16),
+        max_clip_s=clips_config.get('max_clip_seconds', 60)
+    )
+    atexit.register(clip_recorder.close)
 face_rec = FaceRecognitionCV(config)
 
+# Optional: run detection/embedding in worker processes
+recognition_pool = None
+execution = config['face_recognition'].get('execution', {})
+if face_rec.enabled and execution.get('mode') == 'process':
+    from recognition_workers import RecognitionWorkerPool
+    recognition_pool = RecognitionWorkerPool(face_rec, config, workers=execution.get('workers', 4),
+                                             timeout=execution.get('timeout_seconds', 30))
+    atexit.register(recognition_pool.close)
+
+# Optional: background retention (storage.max_age_days / max_images)
+retention_engine = None
+if config['storage'].get('retention', {}).get('enabled', False):
+    from retention import RetentionEngine
+    retention_engine = RetentionEngine(db, config, storage)
+    atexit.register(retention_engine.stop)
+
+# Optional: write uploaded images in the background (bytes stay in memory)
+disk_writer = None
+disk_writer_config = config['storage'].get('disk_writer', {})
+if disk_writer_config.get('enabled', False):
+    from disk_writer import DiskWriter
+
+    # Events of images written before a crash/restart
+    for pending_path in db.get_pending_image_paths():
+        db.set_image_storage_state(pending_path, 'stored' if Path(pending_path).is_file() else 'failed')
+
+    disk_writer = DiskWriter(
+        max_pending_bytes=int(disk_writer_config.get('max_pending_mb', 64) * 1024 * 1024),
+        fsync=disk_writer_config.get('fsync', 'batch'),
+        max_batch=disk_writer_config.get('max_batch', 32),
+        on_stored=lambda path: db.set_image_storage_state(path, 'stored'),
+        on_failed=lambda path, error: db.set_image_storage_state(path, 'failed')
+    )
+    atexit.register(disk_writer.close)  # Registered after db.close, so it runs first
+
+# Optional: asynchronous /upload (202 + job id, recognition in background)
+ingest_queue = None
+
 # Initialize notification backend
 notification_backend = None
 if config['notifications']['enabled']:
@@ -152,19 +261,62 @@ def check_auth():
         return False
     return True
 
-def save_face_crop(person_id: int, face_crop_bytes: bytes, event_id: int) -> Path:
-    """Save face crop to disk"""
-    person_dir = FACES_DIR / f"person_{person_id}"
-    person_dir.mkdir(parents=True, exist_ok=True)
+def page_args(default_limit: int = 50, max_limit: int = 200):
+    """
+    Parse limit/cursor query parameters of keyset-paginated lists
 
-    filename = f"event_{event_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-    filepath = person_dir / filename
+    Returns:
+        (limit, keyset after which the page starts or None)
 
-    with open(filepath, 'wb') as f:
-        f.write(face_crop_bytes)
+    Raises:
+        ValueError: Malformed cursor
+    """
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = min(max(limit, 1), max_limit)
+    cursor = request.args.get('cursor')
+    return limit, (decode_cursor(cursor) if cursor else None)
+
+def event_filter_args() -> dict:
+    """
+    Parse the event filter query parameters (since/until as ISO 8601,
+    device_id, status, person_id) into query_events() keyword arguments
 
+    Raises:
+        ValueError: Malformed timestamp or person_id
+    """
+    filters = {}
+    for key in ('since', 'until'):
+        if request.args.get(key):
+            filters[key] = datetime.fromisoformat(request.args[key])
+    for key in ('device_id', 'status'):
+        if request.args.get(key):
+            filters[key] = request.args[key]
+    if request.args.get('person_id'):
+        filters['person_id'] = int(request.args['person_id'])
+    return filters
+
+def save_image(filepath: Path, image_bytes: bytes):
+    """Store an uploaded image: in the background (DiskWriter) or directly"""
+    if disk_writer is not None:
+        queued = disk_writer.submit(filepath, image_bytes)
+        logger.info(f"Image {'queued' if queued else 'saved'}: {filepath}")
+    else:
+        with open(filepath, 'wb') as f:
+            f.write(image_bytes)
+        logger.info(f"Image saved: {filepath}")
+
+def save_face_crop(person_id: int, face_crop: FaceCrop, event_id: int) -> Path:
+    """Save face crop to disk (JPEG-encodes the crop)"""
+    filepath = storage.face_crop_path(person_id, event_id)
+    write_face_crop(filepath, face_crop.tobytes())
     return filepath
 
+def write_face_crop(filepath: Path, jpeg: bytes):
+    """Write an encoded face crop (creates the person directory)"""
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'wb') as f:
+        f.write(jpeg)
+
 def can_auto_learn(person_id: int) -> bool:
     """Check if auto-learning is allowed (cooldown check)"""
     if not config['face_recognition']['auto_learning']['enabled']:
@@ -202,32 +354,35 @@ def auto_learn_face(person_id: int, face_result: dict, event_id: int):
         logger.debug(f"Auto-learning skipped: cooldown active")
         return
 
-    # Check sample limit
-    current_count = db.count_face_samples(person_id)
-    max_samples = auto_learning['max_samples_per_person']
-
-    if current_count >= max_samples:
-        # Replace oldest or lowest quality
-        if auto_learning['replace_strategy'] == 'oldest':
-            old_sample_id = db.get_oldest_face_sample(person_id)
-            if old_sample_id:
-                db.delete_face_sample(old_sample_id)
-                logger.info(f"Replaced oldest sample for person {person_id}")
-
     # Save face crop
     face_crop_path = save_face_crop(person_id, face_result['face_crop'], event_id)
 
-    # Add to database
-    db.add_face_sample(
-        person_id=person_id,
-        embedding=face_result['embedding'],
-        image_path=str(face_crop_path),
-        quality_score=face_result['quality_score'],
-        bbox=face_result['bbox']
-    )
+    # Check sample limit, replace + add as one atomic unit. One auto-learn
+    # at a time: with group commit, the count must include the previous
+    # one's writes, which are only queued when its transaction ends.
+    max_samples = auto_learning['max_samples_per_person']
+    with auto_learn_lock, db.transaction():
+        current_count = db.count_face_samples(person_id)
+        if current_count >= max_samples:
+            # Replace oldest or lowest quality
+            if auto_learning['replace_strategy'] == 'oldest':
+                old_sample_id = db.get_oldest_face_sample(person_id)
+                if old_sample_id:
+                    db.delete_face_sample(old_sample_id)
+                    logger.info(f"Replaced oldest sample for person {person_id}")
+
+        # Add to database
+        db.add_face_sample(
+            person_id=person_id,
+            embedding=face_result['embedding'],
+            image_path=str(face_crop_path),
+            quality_score=face_result['quality_score'],
+            bbox=face_result['bbox']
+        )
 
     # Update cooldown
     learning_cooldown[person_id] = datetime.now()
+    AUTO_LEARNED_TOTAL.inc()
 
     logger.info(f"✓ Auto-learned new sample for person {person_id} (quality={face_result['quality_score']:.2f})")
 
@@ -251,6 +406,10 @@ def show_notification(person_name: str, confidence: float, status: str, image_pa
             title = "❓ Unbekannte Person"
             msg = f"Keine Übereinstimmung gefunden"
 
+        # The backend shows the image file as icon; give a queued write a moment
+        if disk_writer is not None:
+            disk_writer.wait(image_path, timeout=1.0)
+
         # Show notification via backend
         url = f"http://localhost:{config['server']['port']}/latest"
         notification_backend.show_notification(title, msg, image_path, url)
@@ -259,6 +418,325 @@ def show_notification(person_name: str, confidence: float, status: str, image_pa
     except Exception as e:
         logger.error(f"Failed to show notification: {e}")
 
+def start_trace(image_bytes: bytes):
+    """
+    Pipeline trace for an upload (metrics.trace), or None if neither
+    stored traces nor the slow-upload log are enabled
+    """
+    trace_config = config.get('metrics', {}).get('trace', {})
+    if not trace_config.get('enabled', False) and not trace_config.get('slow_upload_ms', 0):
+        return None
+
+    trace = metrics.Trace(image_bytes=len(image_bytes))
+    try:
+        # Reads the JPEG header only
+        trace.info['resolution'] = list(Image.open(BytesIO(image_bytes)).size)
+    except Exception:
+        trace.info['resolution'] = None
+    return trace
+
+def finish_trace(trace: metrics.Trace, filepath: Path, device_id: str, event_ids: list):
+    """Store the trace with the upload's events; log it if the upload was slow"""
+    trace_config = config.get('metrics', {}).get('trace', {})
+    data = trace.to_dict()
+
+    slow_ms = trace_config.get('slow_upload_ms', 0)
+    if slow_ms and data['total_ms'] >= slow_ms:
+        stages = sorted(data['stages_ms'].items(), key=lambda item: item[1], reverse=True)
+        logger.warning(f"Slow upload {filepath.name} from {device_id}: {data['total_ms']:.0f} ms "
+                       f"({', '.join(f'{stage} {ms:.0f} ms' for stage, ms in stages[:5])}; "
+                       f"{data.get('faces', 0)} faces, gallery {data.get('gallery_size', 0)}, "
+                       f"{data['image_bytes'] // 1024} KB)")
+
+    if trace_config.get('enabled', False) and event_ids:
+        try:
+            db.add_event_trace(event_ids, data)
+        except Exception as e:
+            logger.error(f"Cannot store trace of {filepath.name}: {e}")
+
+def process_upload(filepath: Path, device_id: str, image_bytes: bytes = None, clip_path: Path = None,
+                   trace: metrics.Trace = None) -> list:
+    """
+    Run face recognition, events, workflow and notifications for an upload
+
+    Called from /upload directly (sync mode) or from the ingest queue (async mode).
+    image_bytes are the uploaded bytes; the file may still be pending in the
+    DiskWriter, its events are then marked storage_state='pending'.
+    clip_path is the event's pre/post-roll clip (ClipRecorder), if any.
+    trace (start_trace()) collects the stage timings of this upload; it is
+    stored with the upload's events.
+
+    Returns:
+        List of detected face summaries
+    """
+    with metrics.tracing(trace):
+        faces_detected, event_ids = run_pipeline(filepath, device_id, image_bytes, clip_path)
+
+    if trace is not None:
+        finish_trace(trace, filepath, device_id, event_ids)
+
+    return faces_detected
+
+def run_pipeline(filepath: Path, device_id: str, image_bytes: bytes = None, clip_path: Path = None):
+    """
+    The pipeline of process_upload()
+
+    Returns:
+        (detected face summaries, ids of the events written)
+    """
+    global latest_event_id
+    start = time.perf_counter()
+
+    if image_bytes is None:
+        with open(filepath, 'rb') as f:
+            image_bytes = f.read()
+
+    storage_state = disk_writer.status(filepath) if disk_writer else 'stored'
+
+    # FACE RECOGNITION PIPELINE
+    faces_detected = []
+    event_ids = []
+    event_id = None
+
+    if face_rec.enabled:
+        # Get all known embeddings (in-memory gallery cache)
+        with UPLOAD_STAGE_SECONDS.time(stage='gallery'):
+            known_embeddings = db.get_gallery()
+
+        # Process image (in a worker process if configured)
+        with UPLOAD_STAGE_SECONDS.time(stage='recognition'):
+            face_results = (recognition_pool or face_rec).process_image(image_bytes, known_embeddings)
+        FACES_TOTAL.inc(len(face_results))
+        metrics.annotate(faces=len(face_results), gallery_size=len(known_embeddings))
+
+        if face_results:
+            # Process each detected face
+            for face_result in face_results:
+                match = face_result['match_result']
+                person_id = match['person_id']
+                person_name = None
+                is_new_person = False
+                auto_create = match['status'] == 'UNKNOWN' and config['face_recognition']['auto_create_person']
+
+                # Encode the crop before the transaction takes the write lock
+                crop_jpeg = face_result['face_crop'].tobytes() if auto_create else None
+
+                # Event + new person are written as one atomic unit
+                with UPLOAD_STAGE_SECONDS.time(stage='event_write'), db.transaction():
+                    # Create event record
+                    event_id = db.create_event(
+                        image_path=str(filepath),
+                        person_id=person_id,
+                        confidence=match['confidence'] / 100.0,
+                        distance=match['distance'],
+                        margin=match['margin'],
+                        status=match['status'],
+                        device_id=device_id,
+                        storage_state=storage_state,
+                        clip_path=str(clip_path) if clip_path else None
+                    )
+                    event_ids.append(event_id)
+
+                    if auto_create:
+                        # Create new person
+                        person_id = db.create_person()
+                        is_new_person = True
+
+                        # Add sample (its crop file is written after the commit)
+                        face_crop_path = storage.face_crop_path(person_id, event_id, create=False)
+                        db.add_face_sample(
+                            person_id=person_id,
+                            embedding=face_result['embedding'],
+                            image_path=str(face_crop_path),
+                            quality_score=face_result['quality_score'],
+                            bbox=face_result['bbox']
+                        )
+
+                        # Update event with new person
+                        db.set_event_person(event_id, person_id)
+
+                latest_event_id = event_id
+
+                if is_new_person:
+                    try:
+                        write_face_crop(face_crop_path, crop_jpeg)
+                    except OSError as e:
+                        logger.error(f"Could not write face crop {face_crop_path}: {e}")
+                    person_name = db.get_person_name(person_id)
+                    logger.info(f"✨ Created new person: {person_name} (ID: {person_id})")
+
+                elif person_id:
+                    # Existing person matched
+                    person_name = db.get_person_name(person_id)
+
+                    # Auto-learning
+                    with UPLOAD_STAGE_SECONDS.time(stage='auto_learn'):
+                        auto_learn_face(person_id, face_result, event_id)
+
+                else:
+                    person_name = "Unknown"
+
+                faces_detected.append({
+                    'person_id': person_id,
+                    'person_name': person_name,
+                    'confidence': match['confidence'],
+                    'status': match['status'],
+                    'is_new': is_new_person
+                })
+
+                # Workflow automation
+                with UPLOAD_STAGE_SECONDS.time(stage='workflow'):
+                    workflow_engine.on_person_detected(
+                        person_name,
+                        match['confidence'],
+                        match['status'],
+                        filepath
+                    )
+
+                # Notification (only for first face)
+                if config['notifications']['enabled'] and len(faces_detected) == 1:
+                    with UPLOAD_STAGE_SECONDS.time(stage='notification'):
+                        show_notification(
+                            person_name,
+                            match['confidence'],
+                            match['status'],
+                            filepath,
+                            is_new_person
+                        )
+
+        else:
+            # No faces detected
+            with UPLOAD_STAGE_SECONDS.time(stage='event_write'):
+                event_id = db.create_event(
+                    image_path=str(filepath),
+                    status='NO_FACE',
+                    device_id=device_id,
+                    storage_state=storage_state,
+                    clip_path=str(clip_path) if clip_path else None
+                )
+            event_ids.append(event_id)
+            latest_event_id = event_id
+            logger.info("No faces detected in image")
+
+    else:
+        # Face recognition disabled
+        logger.debug("Face recognition disabled")
+
+    # The DiskWriter may have finished before the events existed
+    if event_id is not None and storage_state == 'pending':
+        final_state = disk_writer.status(filepath)
+        if final_state != 'pending':
+            db.set_image_storage_state(str(filepath), final_state)
+
+    UPLOAD_STAGE_SECONDS.observe(time.perf_counter() - start, stage='process')
+    return faces_detected, event_ids
+
+def ingest_job(filepath: Path, device_id: str, image_bytes: bytes = None, clip_path: Path = None,
+               trace: metrics.Trace = None, queued_at: float = None) -> dict:
+    """Ingest queue handler (async upload mode)"""
+    if queued_at is not None:
+        with metrics.tracing(trace):
+            UPLOAD_STAGE_SECONDS.observe(time.perf_counter() - queued_at, stage='queue_wait')
+    try:
+        faces_detected = process_upload(filepath, device_id, image_bytes, clip_path, trace)
+    finally:
+        db.release()
+    return {
+        'filename': filepath.name,
+        'faces_detected': len(faces_detected),
+        'faces': faces_detected
+    }
+
+if config.get('ingest', {}).get('mode') == 'async':
+    from ingest_queue import IngestQueue
+    ingest_queue = IngestQueue(
+        ingest_job,
+        max_size=config['ingest'].get('queue_size', 100),
+        workers=config['ingest'].get('workers', 2),
+        max_finished=config['ingest'].get('max_finished_jobs', 1000)
+    )
+    atexit.register(ingest_queue.shutdown)
+
+# Optional: motion detection on live stream frames (complements the PIR)
+motion_detector = None
+motion_queue = None
+if config.get('motion_detection', {}).get('enabled', False):
+    from motion_detector import MotionDetector
+    motion_detector = MotionDetector(config['motion_detection'])
+
+    # Triggered frames take the /upload pipeline; without async ingest
+    # they get their own small queue so stream ingest never waits
+    motion_queue = ingest_queue
+    if motion_queue is None:
+        from ingest_queue import IngestQueue
+        motion_queue = IngestQueue(ingest_job, max_size=config['motion_detection'].get('queue_size', 4), workers=1)
+        atexit.register(motion_queue.shutdown)
+
+# Queue and pool gauges for /metrics, read from the components' stats() at scrape time
+def queue_depths() -> dict:
+    depths = {}
+    if ingest_queue is not None:
+        depths[('ingest',)] = ingest_queue.stats()['depth']
+    if motion_queue is not None and motion_queue is not ingest_queue:
+        depths[('motion',)] = motion_queue.stats()['depth']
+    if db.writer is not None:
+        depths[('event_writer',)] = db.writer.stats()['pending_statements']
+    if disk_writer is not None:
+        depths[('disk_writer',)] = disk_writer.stats()['queued_files']
+    if face_rec.batcher is not None:
+        depths[('embedding_batcher',)] = face_rec.batcher.stats()['pending']
+    return depths
+
+def pool_stats(key: str) -> dict:
+    pools = {}
+    if face_rec.models is not None:
+        stats = face_rec.models.stats()
+        pools[('models',)] = stats['available' if key == 'available' else 'size']
+    if recognition_pool is not None:
+        stats = recognition_pool.stats()
+        pools[('workers',)] = stats['idle' if key == 'available' else 'workers']
+    stats = db.pool.stats()
+    pools[('db_connections',)] = stats['idle' if key == 'available' else 'open']
+    return pools
+
+metrics.gauge('facerec_queue_depth', 'Items waiting in background queues', queue_depths, ['queue'])
+metrics.gauge('facerec_pool_size', 'Model pairs / recognition worker processes / database connections',
+              lambda: pool_stats('size'), ['pool'])
+metrics.gauge('facerec_pool_available', 'Idle model pairs / recognition worker processes / database connections',
+              lambda: pool_stats('available'), ['pool'])
+metrics.gauge('facerec_disk_writer_queued_bytes', 'Image bytes not yet written to disk',
+              lambda: disk_writer.stats()['queued_bytes'] if disk_writer else None)
+metrics.gauge('facerec_gallery_samples', 'Face samples in the gallery cache', lambda: db.gallery.stats()['samples'])
+metrics.gauge('facerec_gallery_persons', 'Persons in the gallery cache', lambda: db.gallery.stats()['persons'])
+metrics.gauge('facerec_stream_viewers', 'Live stream viewers per camera',
+              lambda: {(device_id,): channel['viewers'] for device_id, channel in stream_hub.stats()['channels'].items()},
+              ['device_id'])
+metrics.gauge('facerec_clip_ring_bytes', 'Stream frames held for clip pre-roll',
+              lambda: clip_recorder.stats()['ring_bytes'] if clip_recorder else None)
+
+def publish_stream_frame(device_id: str, frame: bytes):
+    """Hand a live frame to the stream hub and the motion detector"""
+    global latest_image_path
+    stream_hub.publish(device_id, frame)
+    if clip_recorder is not None:
+        clip_recorder.add_frame(device_id, frame)
+
+    if motion_detector is not None and motion_detector.process(device_id, frame) is not None:
+        filepath = storage.image_path(device_id)
+        trace = start_trace(frame)
+        try:
+            with metrics.tracing(trace), UPLOAD_STAGE_SECONDS.time(stage='save'):
+                save_image(filepath, frame)
+        except OSError as e:
+            logger.error(f"Cannot save motion frame {filepath}: {e}")
+            return
+        latest_image_path = filepath
+        UPLOADS_TOTAL.inc(source='motion')
+        clip_path = clip_recorder.start(device_id) if clip_recorder else None
+        if motion_queue.submit(filepath=filepath, device_id=device_id, image_bytes=frame,
+                               clip_path=clip_path, trace=trace, queued_at=time.perf_counter()) is None:
+            logger.warning(f"Motion event from '{device_id}' dropped: recognition queue full")
+
 # ============================================================================
 # FLASK ROUTES - API
 # ============================================================================
@@ -271,9 +749,34 @@ def health():
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
         'face_recognition_enabled': face_rec.enabled,
-        'database_stats': stats
+        'database_stats': stats,
+        'gallery_cache': db.gallery.stats(),
+        'db_pool': db.pool.stats(),
+        'event_writer': db.writer.stats() if db.writer else None,
+        'model_pool': face_rec.models.stats() if face_rec.models else None,
+        'embedding_batcher': face_rec.batcher.stats() if face_rec.batcher else None,
+        'recognition_workers': recognition_pool.stats() if recognition_pool else None,
+        'ingest_queue': ingest_queue.stats() if ingest_queue else None,
+        'retention': retention_engine.stats() if retention_engine else None,
+        'disk_writer': disk_writer.stats() if disk_writer else None,
+        'motion_detector': motion_detector.stats() if motion_detector else None,
+        'clip_recorder': clip_recorder.stats() if clip_recorder else None,
+        'motion_queue': motion_queue.stats() if motion_queue and motion_queue is not ingest_queue else None,
+        'stream': stream_hub.stats(),
+        'stream_mosaic': stream_mosaic.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Pipeline latency histograms, counters and gauges (Prometheus text format)"""
+    metrics_config = config.get('metrics', {})
+    if not metrics_config.get('enabled', True):
+        return jsonify({'error': 'Metrics disabled'}), 404
+    if metrics_config.get('require_auth', False) and not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/client/config', methods=['GET'])
 def get_client_config():
     """
@@ -303,7 +806,7 @@ def get_client_config():
                 'jpeg_quality': 85,
                 'device_index': 0
             },
-            'streaming': {'enabled': False, 'fps': 5},
+            'streaming': {'enabled': False, 'fps': 5, 'persistent': True},
             'logging': {'level': 'INFO', 'file': './logs/client.log'}
         }
 
@@ -323,181 +826,318 @@ def upload():
         logger.error("No image in upload request")
         return jsonify({'error': 'No image provided'}), 400
 
+    start = time.perf_counter()
     image_file = request.files['image']
     device_id = request.form.get('device_id', 'ESP32-CAM')
+    UPLOADS_TOTAL.inc(source='upload')
 
-    # Generate filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{device_id}_{timestamp}.jpg"
-    filepath = STORAGE_DIR / filename
+    # Unique, date/device-sharded path
+    now = datetime.now()
+    timestamp = now.strftime('%Y%m%d_%H%M%S')
+    filepath = storage.image_path(device_id, now)
+    filename = filepath.name
 
-    # Save image
-    image_file.save(filepath)
-    logger.info(f"Image saved: {filepath}")
+    # Keep the bytes for recognition; the file is never read back
+    image_bytes = image_file.read()
+    trace = start_trace(image_bytes)
+    try:
+        with metrics.tracing(trace), UPLOAD_STAGE_SECONDS.time(stage='save'):
+            save_image(filepath, image_bytes)
+    except OSError as e:
+        logger.error(f"Cannot save image {filepath}: {e}")
+        return jsonify({'error': 'Cannot store image'}), 507
 
     # Update latest image reference
-    global latest_image_path, latest_event_id
+    global latest_image_path
     latest_image_path = filepath
 
-    # Read image bytes for processing
-    with open(filepath, 'rb') as f:
-        image_bytes = f.read()
+    # Pre-roll from the device's live stream + post-roll
+    clip_path = clip_recorder.start(device_id) if clip_recorder else None
+
+    # Async mode: recognition runs in the background, client polls the job
+    if ingest_queue is not None:
+        job_id = ingest_queue.submit(filepath=filepath, device_id=device_id, image_bytes=image_bytes,
+                                     clip_path=clip_path, trace=trace, queued_at=time.perf_counter())
+        if job_id is None:
+            return jsonify({'error': 'Ingest queue full, retry later'}), 503
+
+        UPLOAD_STAGE_SECONDS.observe(time.perf_counter() - start, stage='request')
+        return jsonify({
+            'status': 'accepted',
+            'job_id': job_id,
+            'status_url': f"/api/jobs/{job_id}",
+            'filename': filename,
+            'image_url': storage.url_for(str(filepath)),
+            'timestamp': timestamp
+        }), 202
+
+    faces_detected = process_upload(filepath, device_id, image_bytes, clip_path, trace)
+
+    UPLOAD_STAGE_SECONDS.observe(time.perf_counter() - start, stage='request')
+    return jsonify({
+        'status': 'success',
+        'filename': filename,
+        'image_url': storage.url_for(str(filepath)),
+        'timestamp': timestamp,
+        'faces_detected': len(faces_detected),
+        'faces': faces_detected
+    })
 
-    # FACE RECOGNITION PIPELINE
-    faces_detected = []
-    event_id = None
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and result of an asynchronous upload job"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
 
-    if face_rec.enabled:
-        # Get all known embeddings from DB
-        known_embeddings = db.get_all_embeddings()
+    if ingest_queue is None:
+        return jsonify({'error': 'Async ingest disabled'}), 404
 
-        # Process image
-        face_results = face_rec.process_image(image_bytes, known_embeddings)
+    job = ingest_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
 
-        if face_results:
-            # Process each detected face
-            for face_result in face_results:
-                match = face_result['match_result']
-                person_id = match['person_id']
-                person_name = None
-                is_new_person = False
+    return jsonify(job)
 
-                # Create event record
-                event_id = db.create_event(
-                    image_path=str(filepath),
-                    person_id=person_id,
-                    confidence=match['confidence'] / 100.0,
-                    distance=match['distance'],
-                    margin=match['margin'],
-                    status=match['status'],
-                    device_id=device_id
-                )
+@app.route('/api/persons', methods=['GET'])
+def api_persons():
+    """
+    Persons overview (sample/event counts, last seen, thumbnail)
 
-                latest_event_id = event_id
+    Query parameters: sort (created|name|last_seen|samples|events),
+    order (asc|desc), limit, cursor (next_cursor of the previous page)
+    """
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
 
-                if match['status'] == 'UNKNOWN' and config['face_recognition']['auto_create_person']:
-                    # Create new person
-                    person_id = db.create_person()
-                    person = db.get_person(person_id)
-                    person_name = person['name']
-                    is_new_person = True
+    try:
+        limit, after = page_args()
+        persons, next_key = db.get_persons_overview(
+            sort=request.args.get('sort', 'created'),
+            descending=request.args.get('order', 'desc') != 'asc',
+            limit=limit,
+            after=after
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-                    # Save face crop and add sample
-                    face_crop_path = save_face_crop(person_id, face_result['face_crop'], event_id)
-                    db.add_face_sample(
-                        person_id=person_id,
-                        embedding=face_result['embedding'],
-                        image_path=str(face_crop_path),
-                        quality_score=face_result['quality_score'],
-                        bbox=face_result['bbox']
-                    )
+    return jsonify({
+        'persons': persons,
+        'next_cursor': encode_cursor(next_key) if next_key else None
+    })
 
-                    # Update event with new person
-                    db.conn.execute(
-                        "UPDATE event SET person_id = ? WHERE id = ?",
-                        (person_id, event_id)
-                    )
-                    db.conn.commit()
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """
+    Event history, newest first
 
-                    logger.info(f"✨ Created new person: {person_name} (ID: {person_id})")
+    Query parameters: since, until (ISO 8601), device_id, status,
+    person_id, limit, cursor (next_cursor of the previous page)
+    """
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
 
-                elif person_id:
-                    # Existing person matched
-                    person = db.get_person(person_id)
-                    person_name = person['name']
+    try:
+        limit, after = page_args()
+        events, next_key = db.query_events(limit=limit, after=after, **event_filter_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-                    # Auto-learning
-                    auto_learn_face(person_id, face_result, event_id)
+    return jsonify({
+        'events': events,
+        'next_cursor': encode_cursor(next_key) if next_key else None
+    })
 
-                else:
-                    person_name = "Unknown"
+@app.route('/api/events/<int:event_id>', methods=['GET'])
+def api_event(event_id):
+    """One event with its pipeline trace (null if not traced)"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
 
-                faces_detected.append({
-                    'person_id': person_id,
-                    'person_name': person_name,
-                    'confidence': match['confidence'],
-                    'status': match['status'],
-                    'is_new': is_new_person
-                })
+    event = db.get_event(event_id)
+    if event is None:
+        return jsonify({'error': 'Event not found'}), 404
 
-                # Workflow automation
-                workflow_engine.on_person_detected(
-                    person_name,
-                    match['confidence'],
-                    match['status'],
-                    filepath
-                )
+    event['trace'] = db.get_event_trace(event_id)
+    return jsonify(event)
 
-                # Notification (only for first face)
-                if config['notifications']['enabled'] and len(faces_detected) == 1:
-                    show_notification(
-                        person_name,
-                        match['confidence'],
-                        match['status'],
-                        filepath,
-                        is_new_person
-                    )
+@app.route('/api/retention', methods=['GET'])
+def retention_status():
+    """Progress of the current retention pass and bytes reclaimed so far"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
 
-        else:
-            # No faces detected
-            event_id = db.create_event(
-                image_path=str(filepath),
-                status='NO_FACE',
-                device_id=device_id
-            )
-            latest_event_id = event_id
-            logger.info("No faces detected in image")
+    if retention_engine is None:
+        return jsonify({'error': 'Retention disabled'}), 404
 
-    else:
-        # Face recognition disabled
-        logger.debug("Face recognition disabled")
+    return jsonify(retention_engine.stats())
 
-    return jsonify({
-        'status': 'success',
-        'filename': filename,
-        'timestamp': timestamp,
-        'faces_detected': len(faces_detected),
-        'faces': faces_detected
-    })
+@app.route('/api/retention/run', methods=['POST'])
+def retention_run():
+    """Start a retention pass now"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    if retention_engine is None:
+        return jsonify({'error': 'Retention disabled'}), 404
+
+    retention_engine.trigger()
+    return jsonify({'status': 'triggered'}), 202
+
+@app.route('/api/stats/verify', methods=['GET'])
+def verify_stats():
+    """Compare the statistics counters with the real tables"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify(db.verify_stats())
+
+@app.route('/api/stats/rebuild', methods=['POST'])
+def rebuild_stats():
+    """Recount the statistics counters from the real tables"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    return jsonify(db.rebuild_stats())
 
 @app.route('/stream_frame', methods=['POST'])
 def stream_frame():
-    """Receive streaming frame from ESP32"""
+    """
+    Receive streaming frame from a camera
+
+    The device is taken from the X-Device-ID header or the device_id
+    query parameter (one stream channel per device).
+    """
     if not check_auth():
         return jsonify({'error': 'Unauthorized'}), 401
 
-    global latest_frame
+    device_id = (request.headers.get('X-Device-ID') or request.args.get('device_id') or 'default')[:64]
+
+    max_frame_bytes = config['stream'].get('max_frame_kb', 512) * 1024
+    if request.content_length and request.content_length > max_frame_bytes:
+        return jsonify({'error': 'Frame too large'}), 413
+
     frame_data = request.get_data()
 
     if len(frame_data) == 0:
         return jsonify({'error': 'Empty frame'}), 400
+    if len(frame_data) > max_frame_bytes:
+        return jsonify({'error': 'Frame too large'}), 413
 
-    with frame_lock:
-        latest_frame = frame_data
+    publish_stream_frame(device_id, frame_data)
 
     return jsonify({'status': 'ok'})
 
-@app.route('/stream', methods=['GET'])
-def stream():
-    """MJPEG live stream endpoint"""
-    token = request.args.get('token')
-    if config['security']['require_auth_for_stream'] and token != AUTH_TOKEN:
+@app.route('/stream_ingest', methods=['POST'])
+def stream_ingest():
+    """
+    Receive many stream frames over one connection
+
+    Body: continuous multipart stream (usually chunked), one JPEG per part
+    with a Content-Length header each (see read_mjpeg_parts). Device as
+    for /stream_frame. Answers when the sender ends the body.
+    """
+    if not check_auth():
         return jsonify({'error': 'Unauthorized'}), 401
 
+    device_id = (request.headers.get('X-Device-ID') or request.args.get('device_id') or 'default')[:64]
+    max_frame_bytes = config['stream'].get('max_frame_kb', 512) * 1024
+
+    frames = 0
+    logger.info(f"Stream ingest connected: {device_id}")
+    try:
+        for frame in read_mjpeg_parts(request.stream, max_frame_bytes):
+            if frame:
+                publish_stream_frame(device_id, frame)
+                frames += 1
+    except ValueError as e:
+        logger.warning(f"Stream ingest from {device_id} aborted after {frames} frames: {e}")
+        return jsonify({'error': str(e), 'frames': frames}), 400
+    finally:
+        logger.info(f"Stream ingest closed: {device_id} ({frames} frames)")
+
+    return jsonify({'status': 'ok', 'frames': frames})
+
+def stream_authorized() -> bool:
+    """Token check for the MJPEG streams (security.require_auth_for_stream)"""
+    return not config['security']['require_auth_for_stream'] or request.args.get('token') == AUTH_TOKEN
+
+def stream_response(channel_for):
+    """
+    MJPEG response for a viewer (token / fps / quality query parameters)
+
+    Args:
+        channel_for: Returns the FrameBroadcaster to watch (may block)
+    """
+    if not stream_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    fps = config['stream'].get('target_fps', 10)
+    try:
+        requested = float(request.args.get('fps', 0))
+    except ValueError:
+        return jsonify({'error': 'Invalid fps'}), 400
+    if requested > 0:
+        fps = min(fps, requested) if fps > 0 else requested
+
+    # Rendition (stream.renditions), default: frames as sent by the camera
+    rendition = request.args.get('quality') or None
+    if rendition is not None and rendition not in stream_hub.renditions:
+        return jsonify({'error': f"Unknown quality, use one of: {', '.join(stream_hub.renditions)}"}), 400
+
     def generate():
-        while True:
-            with frame_lock:
-                if latest_frame is not None:
-                    frame = latest_frame
-                else:
-                    time.sleep(0.1)
-                    continue
+        channel = channel_for()
+        if channel is None:
+            return
+        for frame in channel.frames(fps, rendition):
+            yield mjpeg_part(frame)
+
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    """
+    MJPEG live stream endpoint
 
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(0.1)
+    Query parameters: token, device_id (default: the most recently active
+    camera), fps (optional, capped at stream.target_fps), quality
+    (rendition from stream.renditions, default: original frames)
+    """
+    device_id = request.args.get('device_id')
+    if device_id:
+        return stream_device(device_id)
 
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    if not stream_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    if stream_hub.wait_channel(timeout=0) is None:
+        return jsonify({'error': 'No camera connected'}), 404
+    return stream_response(lambda: stream_hub.wait_channel(timeout=0))
+
+@app.route('/stream/<path:device_id>', methods=['GET'])
+def stream_device(device_id):
+    """MJPEG live stream of one camera"""
+    if not stream_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    if stream_hub.channel(device_id) is None:
+        return jsonify({'error': 'Unknown device'}), 404
+    return stream_response(lambda: stream_hub.channel(device_id))
+
+@app.route('/stream_mosaic', methods=['GET'])
+def stream_mosaic_view():
+    """MJPEG stream of all cameras tiled into one picture (stream.mosaic.fps)"""
+    return stream_response(lambda: stream_mosaic.broadcaster)
+
+@app.route('/api/stream/devices', methods=['GET'])
+def api_stream_devices():
+    """Stream channels (most recently active first) with viewer/frame counters"""
+    if not check_auth():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    stats = stream_hub.stats()
+    return jsonify({
+        'devices': [dict(stats['channels'][device_id], device_id=device_id, url=f"/stream/{device_id}")
+                    for device_id in stream_hub.devices() if device_id in stats['channels']],
+        'max_devices': stats['max_devices']
+    })
 
 @app.route('/latest', methods=['GET'])
 def latest():
@@ -556,7 +1196,8 @@ def latest():
 
         {faces_html}
 
-        <img src="/image/{Path(event['image_path']).name}" alt="Latest capture">
+        <img src="{storage.url_for(event['image_path'])}" alt="Latest capture">
+        {f'<p><a href="{storage.url_for(event["clip_path"], route="clip")}">🎬 Clip (vorher/nachher)</a></p>' if event.get('clip_path') else ''}
 
         <p><a href="/">← Dashboard</a> | <a href="/persons">Personen verwalten</a></p>
     </body>
@@ -564,16 +1205,39 @@ def latest():
     """
     return html
 
-@app.route('/image/<filename>', methods=['GET'])
-def get_image(filename):
-    """Serve stored image"""
-    filepath = STORAGE_DIR / filename
-    if not filepath.exists():
-        return "Image not found", 404
+@app.route('/image/<path:key>', methods=['GET'])
+def get_image(key):
+    """Serve stored image (captured image or face crop) by storage key"""
+    filepath = storage.resolve(key)
+    if filepath is None:
+        # Not on disk yet: still queued in the DiskWriter?
+        path = storage.locate(key)
+        pending = disk_writer.get(path) if disk_writer and path else None
+        if pending is None:
+            return "Image not found", 404
+        return Response(pending, mimetype='image/jpeg')
 
     with open(filepath, 'rb') as f:
         return Response(f.read(), mimetype='image/jpeg')
 
+@app.route('/clip/<path:key>', methods=['GET'])
+def get_clip(key):
+    """Play an event clip as MJPEG stream at its recorded pace"""
+    filepath = storage.resolve(key) if 'clips' in storage.areas else None
+    if filepath is None or not key.startswith('clips/'):
+        return "Clip not found", 404
+
+    def generate():
+        started = time.monotonic()
+        for ms, frame in iter_clip_frames(filepath):
+            if ms is not None:
+                delay = ms / 1000.0 - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield mjpeg_part(frame)
+
+    return Response(generate(), mimetype=f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+
 # ============================================================================
 # FLASK ROUTES - WEB UI
 # ============================================================================
@@ -609,10 +1273,12 @@ def index():
                 </div>
             </div>
 
-            <h2>Live Stream (~10 fps)</h2>
+            <h2>Live Stream (~{config['stream'].get('target_fps', 10)} fps)</h2>
             <div class="stream-box">
-                <img src="/stream?token={AUTH_TOKEN}" alt="Live Stream" style="width:100%">
+                <img src="{'/stream_mosaic' if len(stream_hub.devices()) > 1 else '/stream'}?token={AUTH_TOKEN}" alt="Live Stream" style="width:100%">
             </div>
+            <p>{' | '.join(f'<a href="/stream/{escape(quote(device, safe=""))}?token={AUTH_TOKEN}">{escape(device)}</a>'
+                           for device in stream_hub.devices())}</p>
 
             <h2>Quick Links</h2>
             <a href="/latest" class="button">📸 Latest Event</a>
@@ -652,7 +1318,7 @@ def config_page():
                 'jpeg_quality': 85,
                 'device_index': 0
             },
-            'streaming': {'enabled': False, 'fps': 5},
+            'streaming': {'enabled': False, 'fps': 5, 'persistent': True},
             'logging': {'level': 'INFO', 'file': './logs/client.log'}
         }
 
@@ -740,14 +1406,25 @@ def config_page():
 
 @app.route('/persons', methods=['GET'])
 def persons_list():
-    """List all persons"""
-    persons = db.get_all_persons(include_merged=False)
-
-    # Get sample counts
-    for person in persons:
-        person['sample_count'] = db.count_face_samples(person['id'])
+    """List persons (one page, sortable)"""
+    sort = request.args.get('sort', 'created')
+    order = request.args.get('order', 'desc')
 
-    return render_template('persons.html', persons=persons)
+    try:
+        limit, after = page_args()
+        persons, next_key = db.get_persons_overview(sort=sort, descending=order != 'asc', limit=limit, after=after)
+    except ValueError:
+        return "Invalid sort or cursor", 400
+
+    return render_template(
+        'persons.html',
+        persons=persons,
+        all_persons=db.get_all_persons(include_merged=False),
+        total=db.get_stats()['total_persons'],
+        sort=sort,
+        order=order,
+        next_cursor=encode_cursor(next_key) if next_key else None
+    )
 
 @app.route('/persons/<int:person_id>', methods=['GET'])
 def person_detail(person_id):
@@ -802,58 +1479,46 @@ def delete_person(person_id):
 
 @app.route('/events', methods=['GET'])
 def events_list():
-    """Event history"""
-    events = db.get_events(limit=100)
+    """Event history (filterable, paginated)"""
+    try:
+        limit, after = page_args(default_limit=100)
+        filters = event_filter_args()
+        events, next_key = db.query_events(limit=limit, after=after, **filters)
+    except ValueError:
+        return "Invalid filter or cursor", 400
+
+    # Filters as query string for the "older events" link
+    args = {key: value for key, value in request.args.items() if key != 'cursor'}
+    if next_key:
+        args['cursor'] = encode_cursor(next_key)
+
+    return render_template(
+        'events.html',
+        events=events,
+        filters=request.args,
+        devices=sorted(db.get_stats()['events_by_device']),
+        next_url=url_for('events_list', **args) if next_key else None
+    )
 
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Event History</title>
-        <link rel="stylesheet" href="/static/style.css">
-    </head>
-    <body>
-        <div class="container">
-            <h1>📋 Event History</h1>
-            <table>
-                <tr>
-                    <th>Time</th>
-                    <th>Person</th>
-                    <th>Confidence</th>
-                    <th>Status</th>
-                    <th>Device</th>
-                </tr>
-    """
+@app.route('/events/<int:event_id>', methods=['GET'])
+def event_detail(event_id):
+    """Event detail page with its pipeline trace"""
+    event = db.get_event(event_id)
 
-    for event in events:
-        person_name = event.get('person_name') or 'Unknown'
-        confidence = f"{event['confidence'] * 100:.0f}%" if event['confidence'] else '-'
-        status_emoji = {'GREEN': '✅', 'YELLOW': '⚠️', 'UNKNOWN': '❓', 'NO_FACE': '🚫'}.get(event['status'], '❓')
-
-        html += f"""
-                <tr>
-                    <td>{event['timestamp']}</td>
-                    <td>{person_name}</td>
-                    <td>{confidence}</td>
-                    <td>{status_emoji} {event['status']}</td>
-                    <td>{event['device_id'] or '-'}</td>
-                </tr>
-        """
+    if not event:
+        return "Event not found", 404
 
-    html += """
-            </table>
-            <p><a href="/">← Dashboard</a></p>
-        </div>
-    </body>
-    </html>
-    """
-    return html
+    return render_template('event_detail.html', event=event, trace=db.get_event_trace(event_id))
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
 if __name__ == '__main__':
+    # Service stop (systemctl stop, docker stop) sends SIGTERM, which would end
+    # the process without atexit handlers: queued writes would be lost
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     logger.info("=" * 60)
     logger.info("ESP32 Motion Detector Server with Face Recognition")
     logger.info("=" * 60)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Event Writes With and Without Group Commit
+======================================================
+Simulates concurrent uploads against a temporary database: every upload
+writes its event in one transaction; every Nth upload (--new-every, default
+5) is an unknown face that also creates a person, a face sample and
+updates the event.
+
+Usage:
+    python bench_event_writer.py [--threads 8] [--uploads 500] [--new-every 5]
+"""
+
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from database import Database
+
+
+def run(group_commit: dict, threads: int, uploads: int, new_every: int) -> float:
+    """Returns events per second"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / 'bench.db'), group_commit=group_commit)
+        embedding = np.random.default_rng(0).standard_normal(128).astype(np.float32)
+
+        def client(n):
+            for i in range(uploads):
+                with db.transaction():
+                    event_id = db.create_event(image_path=f'captured_images/{n}_{i}.jpg', status='UNKNOWN')
+                    if new_every and i % new_every == 0:
+                        person_id = db.create_person()
+                        db.add_face_sample(person_id, embedding, f'faces_db/{n}_{i}.jpg', 0.8, [0, 0, 100, 100])
+                        db.set_event_person(event_id, person_id)
+
+        workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        db.close()  # Includes the final flush
+        elapsed = time.perf_counter() - start
+
+        check = Database(str(Path(tmp) / 'bench.db'))
+        assert check.get_stats()['total_events'] == threads * uploads
+        check.close()
+
+    return threads * uploads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--uploads', type=int, default=500, help='Uploads per thread')
+    parser.add_argument('--new-every', type=int, default=5, help='Every Nth upload creates a person (0 = never)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    baseline = run({'enabled': False}, args.threads, args.uploads, args.new_every)
+    print(f"per-request commits: {baseline:8.0f} events/s")
+
+    for interval in (10, 50, 100):
+        rate = run({'enabled': True, 'flush_interval_ms': interval, 'max_batch': 500}, args.threads, args.uploads, args.new_every)
+        print(f"group commit {interval:3d} ms: {rate:8.0f} events/s ({rate / baseline:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
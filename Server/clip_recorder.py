@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Clip Recorder - Pre/Post-Event Clips from the Live Stream
+=========================================================
+Keeps the last seconds of every camera's stream frames in a bounded
+in-memory ring. When a motion event arrives (/upload or the server-side
+motion detector), the pre-roll from the ring and the following post-roll
+frames are written to one clip file, which is linked to the event row.
+
+Clip file (.mjpeg): the JPEG frames back to back - playable by most MJPEG
+tools - followed by a trailer with a JSON index:
+
+    <jpeg><jpeg>...<index json><8 byte little-endian json length>CLIPIDX1
+
+The index lists (offset, length, ms since clip start) per frame and is
+written when the clip is closed. A clip cut short by a crash has no
+trailer; its frames are then found by scanning for JPEG markers.
+
+Frames are appended to the open file by a writer thread as they arrive,
+so a clip is never held in memory as a whole.
+"""
+
+import json
+import logging
+import queue
+import struct
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLIP_MAGIC = b'CLIPIDX1'
+_TRAILER = struct.Struct('<Q')
+
+# JPEG start/end of image markers (fallback scan for clips without index)
+_SOI = b'\xff\xd8'
+_EOI = b'\xff\xd9'
+_SCAN_CHUNK = 1024 * 1024
+_SCAN_MAX_FRAME = 16 * 1024 * 1024  # Longer "frames" are treated as garbage
+
+
+class _Recording:
+    """One clip being written (file handle owned by the writer thread)"""
+
+    def __init__(self, path: Path, device_id: str, end_at: float, max_end_at: float):
+        self.path = path
+        self.device_id = device_id
+        self.started = time.monotonic()
+        self.started_at = datetime.now().isoformat()
+        self.end_at = end_at
+        self.max_end_at = max_end_at
+        self.triggers = 1
+        self.file = None
+        self.offset = 0
+        self.index: List[Tuple[int, int, int]] = []
+        self.closed = False
+
+
+class ClipRecorder:
+    """
+    Per-device frame ring + clip writer
+
+    Args:
+        storage: ImageStorage with a 'clips' area
+        pre_roll_s: Seconds of stream kept before the event
+        post_roll_s: Seconds recorded after the (last) event
+        max_memory_mb: Memory for all rings together; the device with the
+            largest ring gives up its oldest frame first
+        max_devices: Rings kept (least recently seen device dropped)
+        max_clip_s: Longest clip; further events start a new clip
+        queue_size: Frames waiting for the writer (dropped beyond)
+    """
+
+    def __init__(self, storage, pre_roll_s: float = 5.0, post_roll_s: float = 10.0,
+                 max_memory_mb: float = 64, max_devices: int = 16, max_clip_s: float = 60.0,
+                 queue_size: int = 256):
+        self.storage = storage
+        self.pre_roll_s = pre_roll_s
+        self.post_roll_s = post_roll_s
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_devices = max(1, max_devices)
+        self.max_clip_s = max_clip_s
+
+        self._lock = Lock()
+        self._rings: 'OrderedDict[str, Deque[Tuple[float, bytes]]]' = OrderedDict()
+        self._ring_bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._active: Dict[str, _Recording] = {}  # device_id -> recording accepting frames
+
+        self._ops = queue.Queue(maxsize=queue_size)
+        self._stopping = False
+
+        # Statistics
+        self.clips_started = 0
+        self.clips_skipped = 0
+        self.clips_written = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.write_errors = 0
+
+        self._thread = Thread(target=self._run, name="clip-writer", daemon=True)
+        self._thread.start()
+
+        logger.info(f"Clip recorder started ({pre_roll_s}s pre-roll, {post_roll_s}s post-roll, "
+                    f"{max_memory_mb} MB ring memory)")
+
+    # ------------------------------------------------------------------
+    # Ring
+    # ------------------------------------------------------------------
+
+    def add_frame(self, device_id: str, frame: bytes):
+        """Keep a live frame in the device's ring (and in its running clip)"""
+        now = time.monotonic()
+        with self._lock:
+            ring = self._rings.get(device_id)
+            if ring is None:
+                ring = self._rings[device_id] = deque()
+                self._ring_bytes[device_id] = 0
+                while len(self._rings) > self.max_devices:
+                    old_device, old_ring = self._rings.popitem(last=False)
+                    self._total_bytes -= self._ring_bytes.pop(old_device)
+            self._rings.move_to_end(device_id)
+
+            ring.append((now, frame))
+            self._ring_bytes[device_id] += len(frame)
+            self._total_bytes += len(frame)
+
+            # Older than the pre-roll: no longer needed
+            while ring and now - ring[0][0] > self.pre_roll_s:
+                self._drop_oldest(device_id)
+
+            # Memory cap over all rings
+            while self._total_bytes > self.max_bytes:
+                largest = max(self._ring_bytes, key=self._ring_bytes.get)
+                if not self._rings[largest]:
+                    break
+                self._drop_oldest(largest)
+
+            recording = self._active.get(device_id)
+            if recording is not None and now > recording.end_at:
+                del self._active[device_id]
+                recording = None
+
+        if recording is not None:
+            self._queue(('frame', recording, now, frame))
+
+    def _drop_oldest(self, device_id: str):
+        """Drop a device's oldest ring frame (lock held by caller)"""
+        _, frame = self._rings[device_id].popleft()
+        self._ring_bytes[device_id] -= len(frame)
+        self._total_bytes -= len(frame)
+
+    def _queue(self, op) -> bool:
+        try:
+            self._ops.put_nowait(op)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.frames_dropped += 1
+            return False
+
+    # ------------------------------------------------------------------
+    # Clips
+    # ------------------------------------------------------------------
+
+    def start(self, device_id: str) -> Optional[Path]:
+        """
+        Start a clip for a motion event (or extend the device's running one)
+
+        Returns:
+            Clip path to store with the event, or None if the device has
+            no recent stream frames or the writer queue is full
+        """
+        now = time.monotonic()
+        with self._lock:
+            recording = self._active.get(device_id)
+            if recording is not None and now <= recording.end_at:
+                recording.end_at = min(now + self.post_roll_s, recording.max_end_at)
+                recording.triggers += 1
+                return recording.path
+
+            ring = self._rings.get(device_id)
+            pre_roll = [(t, frame) for t, frame in ring if now - t <= self.pre_roll_s] if ring else []
+            if not pre_roll:
+                return None
+
+            path = self.storage.clip_path(device_id)
+            recording = _Recording(path, device_id, now + self.post_roll_s, pre_roll[0][0] + self.max_clip_s)
+            recording.started = pre_roll[0][0]
+
+            # Queued under the lock add_frame checks _active with, so no
+            # frame of this clip can reach the writer before its 'open'.
+            # Never block the upload; a clip without its pre-roll is useless.
+            try:
+                self._ops.put_nowait(('open', recording, pre_roll))
+            except queue.Full:
+                self.clips_skipped += 1
+                logger.warning(f"Clip skipped, writer queue full: {device_id}")
+                return None
+            self._active[device_id] = recording
+            self.clips_started += 1
+
+        logger.info(f"Clip started: {path} ({len(pre_roll)} pre-roll frames)")
+        return path
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _write(self, recording: _Recording, timestamp: float, frame: bytes):
+        if recording.file is None:
+            return
+        try:
+            recording.file.write(frame)
+        except OSError as e:
+            logger.error(f"Clip write failed ({recording.path}): {e}")
+            with self._lock:
+                self.write_errors += 1
+            self._finish(recording)
+            return
+        recording.index.append((recording.offset, len(frame), int((timestamp - recording.started) * 1000)))
+        recording.offset += len(frame)
+        with self._lock:
+            self.frames_written += 1
+
+    def _finish(self, recording: _Recording):
+        """Write the index trailer and close the clip"""
+        recording.closed = True
+        if recording.file is None:
+            return
+        try:
+            index = json.dumps({
+                'device_id': recording.device_id,
+                'started_at': recording.started_at,
+                'triggers': recording.triggers,
+                'frames': recording.index
+            }, separators=(',', ':')).encode()
+            recording.file.write(index + _TRAILER.pack(len(index)) + CLIP_MAGIC)
+            recording.file.close()
+            with self._lock:
+                self.clips_written += 1
+            logger.info(f"Clip written: {recording.path} ({len(recording.index)} frames)")
+        except OSError as e:
+            logger.error(f"Clip close failed ({recording.path}): {e}")
+            with self._lock:
+                self.write_errors += 1
+        recording.file = None
+
+    def _run(self):
+        open_recordings: List[_Recording] = []
+        while True:
+            try:
+                op = self._ops.get(timeout=0.5)
+            except queue.Empty:
+                op = None
+
+            if op is not None:
+                kind, recording = op[0], op[1]
+                if kind == 'open':
+                    try:
+                        recording.path.parent.mkdir(parents=True, exist_ok=True)
+                        recording.file = open(recording.path, 'wb')
+                        open_recordings.append(recording)
+                        for timestamp, frame in op[2]:
+                            self._write(recording, timestamp, frame)
+                    except OSError as e:
+                        logger.error(f"Cannot create clip {recording.path}: {e}")
+                        with self._lock:
+                            self.write_errors += 1
+                        recording.closed = True
+                elif kind == 'frame' and not recording.closed:
+                    self._write(recording, op[2], op[3])
+
+            # Close clips whose post-roll is over
+            now = time.monotonic()
+            for recording in [r for r in open_recordings if self._stopping or r.closed or now > r.end_at + 1.0]:
+                if not recording.closed:
+                    self._finish(recording)
+                open_recordings.remove(recording)
+
+            if self._stopping and op is None and not open_recordings:
+                break
+
+    # ------------------------------------------------------------------
+    # Status / shutdown
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'ring_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'ring_frames': {device_id: len(ring) for device_id, ring in self._rings.items()},
+                'recording': list(self._active),
+                'clips_started': self.clips_started,
+                'clips_skipped': self.clips_skipped,
+                'clips_written': self.clips_written,
+                'frames_written': self.frames_written,
+                'frames_dropped': self.frames_dropped,
+                'write_errors': self.write_errors
+            }
+
+    def close(self, timeout: float = 10.0):
+        """Close all running clips (post-roll is cut short) and stop"""
+        self._stopping = True
+        self._thread.join(timeout)
+
+
+# ----------------------------------------------------------------------
+# Reading clips
+# ----------------------------------------------------------------------
+
+def read_clip_index(path: Path) -> Dict:
+    """
+    Index of a clip file ({'frames': [(offset, length, ms), ...], ...})
+
+    Clips without trailer (interrupted recording) are scanned for JPEG
+    markers in chunks; their frames then have no timing (ms = None).
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
+        tail_size = _TRAILER.size + len(CLIP_MAGIC)
+        if size >= tail_size:
+            f.seek(size - tail_size)
+            tail = f.read(tail_size)
+            if tail.endswith(CLIP_MAGIC):
+                (index_length,) = _TRAILER.unpack(tail[:_TRAILER.size])
+                f.seek(size - tail_size - index_length)
+                return json.loads(f.read(index_length))
+
+        f.seek(0)
+        return {'frames': _scan_frames(f)}
+
+
+def _scan_frames(f) -> List[Tuple[int, int, None]]:
+    """(offset, length, None) of the JPEGs in a file, read chunk by chunk"""
+    frames = []
+    data = b''
+    base = 0       # File offset of data[0]
+    start = -1     # Position of the current frame's SOI in data (-1 = none)
+    search = 0     # Where to continue looking for the next marker
+    while True:
+        chunk = f.read(_SCAN_CHUNK)
+        if not chunk:
+            break
+        data += chunk
+
+        while True:
+            if start < 0:
+                start = data.find(_SOI, search)
+                if start < 0:
+                    search = max(search, len(data) - 1)  # Marker may span chunks
+                    break
+                search = start + 2
+            end = data.find(_EOI, search)
+            if end < 0:
+                if len(data) - start > _SCAN_MAX_FRAME:
+                    start = -1  # No end in sight: look for the next SOI
+                    continue
+                search = max(search, len(data) - 1)
+                break
+            frames.append((base + start, end + 2 - start, None))
+            start = -1
+            search = end + 2
+
+        # Keep only the unfinished frame (or the bytes not searched yet)
+        keep = start if start >= 0 else search
+        data = data[keep:]
+        base += keep
+        search -= keep
+        if start >= 0:
+            start = 0
+    return frames
+
+
+def iter_clip_frames(path: Path) -> Iterator[Tuple[Optional[int], bytes]]:
+    """(ms since clip start, JPEG bytes) of every frame in a clip"""
+    index = read_clip_index(path)
+    with open(path, 'rb') as f:
+        for offset, length, ms in index['frames']:
+            f.seek(offset)
+            yield ms, f.read(length)
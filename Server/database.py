@@ -6,28 +6,557 @@ Manages persons, face samples, and events.
 """
 
 import sqlite3
+import base64
 import json
 import logging
-from datetime import datetime
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 import numpy as np
 
+import metrics
+from face_gallery import FaceGallery, GalleryCache
+
 logger = logging.getLogger(__name__)
 
+# begin: waiting for the SQLite write lock, sync_wait: read-your-writes
+# wait for the EventWriter
+DB_SECONDS = metrics.histogram(
+    'facerec_db_seconds',
+    'Latency of SQLite transaction steps (begin, commit, sync_wait)',
+    ['op'],
+    trace_prefix='db_'
+)
+EVENTS_TOTAL = metrics.counter('facerec_events_total', 'Events written, by match status', ['status'])
+PERSONS_CREATED_TOTAL = metrics.counter('facerec_persons_created_total', 'Persons created')
+
+# Per-connection tuning (journal_mode=WAL is persistent and set once in _init_db)
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",   # Safe with WAL, no fsync per commit
+    "PRAGMA busy_timeout = 5000",    # Wait for the writer lock instead of failing
+    "PRAGMA cache_size = -8000",     # 8 MB page cache
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def _bump(key: str, delta: int) -> str:
+    """Trigger statement adding delta to a stats_counter row"""
+    return (f"INSERT INTO stats_counter (key, value) VALUES ({key}, {delta}) "
+            f"ON CONFLICT(key) DO UPDATE SET value = value + {delta};")
+
+
+# Materialized statistics: counters kept up to date by triggers, so
+# get_stats() never scans the tables. Keys: persons, samples, events,
+# status:<status>, device:<device_id>.
+STATS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS stats_person_insert AFTER INSERT ON person
+        WHEN NEW.is_merged_into IS NULL
+        BEGIN {_bump("'persons'", 1)} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_person_delete AFTER DELETE ON person
+        WHEN OLD.is_merged_into IS NULL
+        BEGIN {_bump("'persons'", -1)} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_person_merge AFTER UPDATE OF is_merged_into ON person
+        WHEN OLD.is_merged_into IS NULL AND NEW.is_merged_into IS NOT NULL
+        BEGIN {_bump("'persons'", -1)} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_person_unmerge AFTER UPDATE OF is_merged_into ON person
+        WHEN OLD.is_merged_into IS NOT NULL AND NEW.is_merged_into IS NULL
+        BEGIN {_bump("'persons'", 1)} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_sample_insert AFTER INSERT ON face_sample
+        BEGIN {_bump("'samples'", 1)} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_sample_delete AFTER DELETE ON face_sample
+        BEGIN {_bump("'samples'", -1)} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_event_insert AFTER INSERT ON event
+        BEGIN
+            {_bump("'events'", 1)}
+            {_bump("'status:' || COALESCE(NEW.status, '')", 1)}
+            {_bump("'device:' || COALESCE(NEW.device_id, '')", 1)}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_event_delete AFTER DELETE ON event
+        BEGIN
+            {_bump("'events'", -1)}
+            {_bump("'status:' || COALESCE(OLD.status, '')", -1)}
+            {_bump("'device:' || COALESCE(OLD.device_id, '')", -1)}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_event_status AFTER UPDATE OF status ON event
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            {_bump("'status:' || COALESCE(OLD.status, '')", -1)}
+            {_bump("'status:' || COALESCE(NEW.status, '')", 1)}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stats_event_device AFTER UPDATE OF device_id ON event
+        WHEN OLD.device_id IS NOT NEW.device_id
+        BEGIN
+            {_bump("'device:' || COALESCE(OLD.device_id, '')", -1)}
+            {_bump("'device:' || COALESCE(NEW.device_id, '')", 1)}
+        END""",
+)
+
+# Per-person aggregates for the persons overview, kept up to date by
+# triggers: sample/event counts, last event timestamp and best sample
+# (highest quality). last_seen is '' until the person has an event.
+BEST_SAMPLE = "(SELECT id FROM face_sample WHERE person_id = {pid} ORDER BY quality_score DESC, id DESC LIMIT 1)"
+LAST_SEEN = "COALESCE((SELECT MAX(timestamp) FROM event WHERE person_id = {pid}), '')"
+
+PERSON_STATS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS person_stats_insert AFTER INSERT ON person
+        BEGIN INSERT OR IGNORE INTO person_stats (person_id) VALUES (NEW.id); END""",
+    """CREATE TRIGGER IF NOT EXISTS person_stats_delete AFTER DELETE ON person
+        BEGIN DELETE FROM person_stats WHERE person_id = OLD.id; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS person_stats_sample_insert AFTER INSERT ON face_sample
+        BEGIN
+            UPDATE person_stats SET sample_count = sample_count + 1,
+                best_sample_id = {BEST_SAMPLE.format(pid='NEW.person_id')}
+            WHERE person_id = NEW.person_id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS person_stats_sample_delete AFTER DELETE ON face_sample
+        BEGIN
+            UPDATE person_stats SET sample_count = sample_count - 1,
+                best_sample_id = {BEST_SAMPLE.format(pid='OLD.person_id')}
+            WHERE person_id = OLD.person_id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS person_stats_sample_move AFTER UPDATE OF person_id ON face_sample
+        WHEN OLD.person_id IS NOT NEW.person_id
+        BEGIN
+            UPDATE person_stats SET sample_count = sample_count - 1,
+                best_sample_id = {BEST_SAMPLE.format(pid='OLD.person_id')}
+            WHERE person_id = OLD.person_id;
+            UPDATE person_stats SET sample_count = sample_count + 1,
+                best_sample_id = {BEST_SAMPLE.format(pid='NEW.person_id')}
+            WHERE person_id = NEW.person_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS person_stats_event_insert AFTER INSERT ON event
+        WHEN NEW.person_id IS NOT NULL
+        BEGIN
+            UPDATE person_stats SET event_count = event_count + 1,
+                last_seen = MAX(last_seen, COALESCE(NEW.timestamp, ''))
+            WHERE person_id = NEW.person_id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS person_stats_event_delete AFTER DELETE ON event
+        WHEN OLD.person_id IS NOT NULL
+        BEGIN
+            UPDATE person_stats SET event_count = event_count - 1,
+                last_seen = {LAST_SEEN.format(pid='OLD.person_id')}
+            WHERE person_id = OLD.person_id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS person_stats_event_move AFTER UPDATE OF person_id ON event
+        WHEN OLD.person_id IS NOT NEW.person_id
+        BEGIN
+            UPDATE person_stats SET event_count = event_count - 1,
+                last_seen = {LAST_SEEN.format(pid='OLD.person_id')}
+            WHERE person_id = OLD.person_id;
+            UPDATE person_stats SET event_count = event_count + 1,
+                last_seen = MAX(last_seen, COALESCE(NEW.timestamp, ''))
+            WHERE person_id = NEW.person_id;
+        END""",
+)
+
+PERSON_STATS_RECOUNT = f"""
+    SELECT p.id,
+        (SELECT COUNT(*) FROM face_sample WHERE person_id = p.id),
+        (SELECT COUNT(*) FROM event WHERE person_id = p.id),
+        {LAST_SEEN.format(pid='p.id')},
+        {BEST_SAMPLE.format(pid='p.id')}
+    FROM person p
+"""
+
+# Sort keys of the persons overview -> (sort column, tie-breaker column)
+PERSON_SORT_COLUMNS = {
+    'created': ('p.created_at', 'p.id'),
+    'name': ('p.name', 'p.id'),
+    'last_seen': ('ps.last_seen', 'ps.person_id'),
+    'samples': ('ps.sample_count', 'ps.person_id'),
+    'events': ('ps.event_count', 'ps.person_id'),
+}
+
+
+def encode_cursor(values: Tuple) -> str:
+    """Opaque keyset-pagination cursor for the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Inverse of encode_cursor (ValueError if malformed)"""
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+# The same counters computed from the real tables (rebuild/verify)
+STATS_RECOUNT = """
+    SELECT 'persons', COUNT(*) FROM person WHERE is_merged_into IS NULL
+    UNION ALL SELECT 'samples', COUNT(*) FROM face_sample
+    UNION ALL SELECT 'events', COUNT(*) FROM event
+    UNION ALL SELECT 'status:' || COALESCE(status, ''), COUNT(*) FROM event GROUP BY status
+    UNION ALL SELECT 'device:' || COALESCE(device_id, ''), COUNT(*) FROM event GROUP BY device_id
+"""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of sqlite3 connections
+
+    Connections are opened (and tuned) lazily, up to size, and then
+    reused; acquire() waits while all of them are checked out.
+    """
+
+    def __init__(self, db_path: Path, size: int = 8, timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()  # Most recently used first (warm page cache)
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.waits = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are explicit (Database.transaction)
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Dict-like access
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Check out a connection
+
+        Raises:
+            sqlite3.OperationalError: No connection became free within timeout
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            if len(self._connections) < self.size:
+                conn = self._connect()
+                self._connections.append(conn)
+                return conn
+            self.waits += 1
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No database connection free within {self.timeout:.0f}s (pool size {self.size})")
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a checked-out connection"""
+        if conn.in_transaction:
+            # Left behind by a thread that ended inside a transaction
+            conn.execute("ROLLBACK")
+        with self._lock:
+            if self._closed:
+                conn.close()
+                return
+        self._idle.put(conn)
+
+    def close(self):
+        """Close all connections (checked-out ones are closed on release)"""
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        return len(connections)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            opened = len(self._connections)
+        idle = self._idle.qsize()
+        return {
+            'size': self.size,
+            'open': opened,
+            'idle': idle,
+            'in_use': opened - idle,
+            'waits': self.waits
+        }
+
+
+class _ThreadState:
+    """One thread's transaction state and its connection, while checked out"""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.conn = None
+        self.depth = 0
+        self.begun = False
+        self.after_commit = []
+        # Group commit: writes queued inside the open transaction, the
+        # writer sequence number of this thread's last write per table, and
+        # this thread's groups whose outcome was not checked yet
+        self.queued_writes = []
+        self.write_seq = {}
+        self.unchecked_seqs = set()
+
+    def release(self):
+        """Return the connection to the pool (kept while a transaction is open)"""
+        if self.conn is not None and not self.depth:
+            conn, self.conn = self.conn, None
+            self.pool.release(conn)
+
+    def __del__(self):
+        # Thread ended while holding a connection
+        if self.conn is not None:
+            try:
+                self.pool.release(self.conn)
+            except sqlite3.Error:
+                pass
+
+
 class Database:
-    """SQLite database for face recognition system"""
+    """
+    SQLite database for face recognition system
 
-    def __init__(self, db_path: str = "faces.db"):
+    Threads check out connections from a bounded pool (WAL mode, so
+    dashboard readers never block ingest writers). A thread keeps its
+    connection until its transaction ends or it calls release().
+    Multi-statement writes run inside transaction() and are atomic.
+
+    With group commit enabled, event and face-sample writes go through an
+    EventWriter and are committed in batches; ids are allocated here so
+    callers still get them immediately.
+    """
+
+    def __init__(self, db_path: str = "faces.db", index_config: Optional[Dict] = None,
+                 group_commit: Optional[Dict] = None, pool_size: int = 8):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = None
+        self.pool = ConnectionPool(self.db_path, pool_size)
+        self._local = threading.local()
+        self.gallery = GalleryCache(index_config)
+        self.writer = None
         self._init_db()
+        self._load_gallery()
+
+        group_commit = group_commit or {}
+        if group_commit.get('enabled', False):
+            self._start_writer(group_commit)
+        self.release()
+
+    # ========================================================================
+    # CONNECTIONS AND TRANSACTIONS
+    # ========================================================================
+
+    def _thread_state(self) -> _ThreadState:
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            state = _ThreadState(self.pool)
+            self._local.state = state
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        Connection of the calling thread (starts the pending transaction, if any)
+
+        Checked out from the pool on first use and kept until the
+        transaction ends or release() is called.
+        """
+        state = self._thread_state()
+        if state.conn is None:
+            state.conn = self.pool.acquire()
+        if state.depth and not state.begun:
+            with DB_SECONDS.time(op='begin'):
+                state.conn.execute("BEGIN IMMEDIATE")
+            state.begun = True
+        return state.conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed writes as one atomic unit
+
+        Nested use joins the outer transaction. Callbacks registered with
+        _after_commit() (e.g. gallery cache updates) only run once the
+        outermost transaction has committed. Writes queued for the
+        EventWriter are submitted as one group on commit; the callbacks
+        then run when the EventWriter has committed that group (not at
+        all if it is dropped).
+
+        The SQLite transaction (and its write lock) only starts with the
+        first statement on self.conn, so a transaction holding nothing but
+        queued writes never competes with the EventWriter for the lock.
+
+        Raises:
+            WriteFailedError: An earlier queued write group of this thread
+                was dropped by the EventWriter
+        """
+        state = self._thread_state()
+        if state.depth == 0 and self.writer is not None:
+            # Report write groups of this thread that the EventWriter dropped
+            self._check_writes(state)
+        state.depth += 1
+
+        try:
+            yield
+        except BaseException:
+            state.depth -= 1
+            if state.depth == 0:
+                if state.begun:
+                    state.conn.execute("ROLLBACK")
+                    state.begun = False
+                state.after_commit.clear()
+                state.queued_writes.clear()
+                state.release()
+            raise
+
+        state.depth -= 1
+        if state.depth == 0:
+            if state.begun:
+                with DB_SECONDS.time(op='commit'):
+                    state.conn.execute("COMMIT")
+                state.begun = False
+            state.release()
+            callbacks, state.after_commit = state.after_commit, []
+            if state.queued_writes:
+                # Queued writes of this transaction commit together in one batch
+                queued, state.queued_writes = state.queued_writes, []
+                seq = self.writer.submit([(sql, params) for _, sql, params in queued], on_commit=callbacks)
+                state.unchecked_seqs.add(seq)
+                for table, _, _ in queued:
+                    state.write_seq[table] = seq
+            else:
+                for callback in callbacks:
+                    callback()
+
+    def release(self):
+        """
+        Return the calling thread's connection to the pool
+
+        Call when a thread is done with the database for now (end of a
+        request or job); no-op inside a transaction.
+        """
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            state.release()
+
+    def _after_commit(self, callback):
+        """Run callback after the current transaction commits (now if none is open)"""
+        state = self._thread_state()
+        if state.depth:
+            state.after_commit.append(callback)
+        else:
+            callback()
+
+    # ========================================================================
+    # GROUP COMMIT
+    # ========================================================================
+
+    def _start_writer(self, group_commit: Dict):
+        """Start the EventWriter and take over id allocation for its tables"""
+        from event_writer import EventWriter
+
+        cursor = self.conn.cursor()
+        self._next_ids = {}
+        for table in ('person', 'event', 'face_sample'):
+            cursor.execute(f"SELECT MAX(id) FROM {table}")
+            max_id = cursor.fetchone()[0] or 0
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+            row = cursor.fetchone()
+            # AUTOINCREMENT never reuses ids, not even those of deleted rows
+            self._next_ids[table] = max(max_id, row[0] if row else 0) + 1
+        cursor.execute("SELECT COUNT(*) FROM person WHERE name LIKE 'Unbekannt #%'")
+        self._unknown_names = cursor.fetchone()[0]
+        self._id_lock = threading.Lock()
+
+        self.writer = EventWriter(
+            self.db_path,
+            flush_interval_ms=group_commit.get('flush_interval_ms', 100),
+            max_batch=group_commit.get('max_batch', 500)
+        )
+
+    def _allocate_id(self, table: str) -> int:
+        with self._id_lock:
+            row_id = self._next_ids[table]
+            self._next_ids[table] += 1
+        return row_id
+
+    def _queue_write(self, table: str, sql: str, params: tuple):
+        """
+        Hand a write to the EventWriter (with the open transaction, if any)
+
+        A write outside a transaction is fire-and-forget (e.g. DiskWriter
+        callbacks, whose thread never reads back): its outcome is not
+        tracked for WriteFailedError; the EventWriter logs and counts it
+        if it is dropped.
+        """
+        state = self._thread_state()
+        if state.depth:
+            state.queued_writes.append((table, sql, params))
+        else:
+            state.write_seq[table] = self.writer.submit([(sql, params)])
+
+    def _sync_writes(self, *tables: str):
+        """
+        Read-your-writes: wait until this thread's queued writes to the
+        given tables (all tables if none given) are committed
+
+        Raises:
+            WriteFailedError: One of this thread's queued write groups was
+                dropped by the EventWriter (reported once)
+        """
+        if self.writer is None:
+            return
+        state = self._thread_state()
+        seqs = [state.write_seq.get(t, 0) for t in tables] if tables else list(state.write_seq.values())
+        seq = max(seqs, default=0)
+        if seq > self.writer.completed_seq:
+            if state.begun:
+                # This connection holds the write lock the writer needs; read
+                # (and thereby sync) before the transaction's first statement.
+                logger.warning("Read inside a started transaction cannot wait for queued writes")
+                return
+            with DB_SECONDS.time(op='sync_wait'):
+                self.writer.wait(seq)
+        self._check_writes(state)
+
+    def _check_writes(self, state: _ThreadState):
+        """Raise for dropped groups among this thread's finished writes"""
+        completed_seq = self.writer.completed_seq
+        done = {seq for seq in state.unchecked_seqs if seq <= completed_seq}
+        if done:
+            state.unchecked_seqs -= done
+            self.writer.check(done)
+
+    def _flush_writes(self):
+        """
+        Commit all queued writes of every thread (before bulk updates/deletes)
+
+        Raises:
+            WriteFailedError: One of this thread's queued write groups was
+                dropped by the EventWriter (reported once)
+        """
+        if self.writer is None:
+            return
+        state = self._thread_state()
+        if state.begun:
+            # The writer needs the write lock this transaction holds
+            logger.warning("Flush inside a started transaction skipped")
+            return
+        self.writer.flush()
+        self._check_writes(state)
 
     def _init_db(self):
         """Initialize database schema"""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row  # Dict-like access
+        # Free pages can be returned to the OS in small steps (see
+        # incremental_vacuum). Only takes effect on a new database file;
+        # existing ones need a one-time VACUUM.
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        # WAL: readers and the writer don't block each other
+        self.conn.execute("PRAGMA journal_mode = WAL")
 
         cursor = self.conn.cursor()
 
@@ -69,50 +598,203 @@ class Database:
                 status TEXT,
                 image_path TEXT NOT NULL,
                 device_id TEXT,
+                storage_state TEXT NOT NULL DEFAULT 'stored',
+                clip_path TEXT,
                 FOREIGN KEY (person_id) REFERENCES person(id)
             )
         """)
 
+        # storage_state: 'pending' while the image is still being written
+        # by the DiskWriter, 'failed' if that write failed
+        # clip_path: pre/post-roll clip of the event (ClipRecorder)
+        cursor.execute("PRAGMA table_info(event)")
+        event_columns = {row['name'] for row in cursor.fetchall()}
+        if 'storage_state' not in event_columns:
+            cursor.execute("ALTER TABLE event ADD COLUMN storage_state TEXT NOT NULL DEFAULT 'stored'")
+        if 'clip_path' not in event_columns:
+            cursor.execute("ALTER TABLE event ADD COLUMN clip_path TEXT")
+
+        # Pipeline trace per event (metrics.trace): compact JSON, kept out of
+        # the event row so event lists stay narrow; removed with its event
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS event_trace (
+                event_id INTEGER PRIMARY KEY,
+                trace TEXT NOT NULL
+            )
+        """)
+        # Kept for events moved to event_archive (retention archives them
+        # before the delete). Re-created so older databases get this version.
+        cursor.execute("DROP TRIGGER IF EXISTS event_trace_delete")
+        cursor.execute("""
+            CREATE TRIGGER event_trace_delete AFTER DELETE ON event
+            WHEN NOT EXISTS (SELECT 1 FROM event_archive WHERE id = OLD.id) BEGIN
+                DELETE FROM event_trace WHERE event_id = OLD.id;
+            END
+        """)
+
+        # Pruned events (retention with event_action: archive)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS event_archive (
+                id INTEGER PRIMARY KEY,
+                timestamp TIMESTAMP,
+                person_id INTEGER,
+                confidence REAL,
+                distance REAL,
+                margin REAL,
+                status TEXT,
+                image_path TEXT NOT NULL,
+                device_id TEXT,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                storage_state TEXT NOT NULL DEFAULT 'removed',
+                clip_path TEXT
+            )
+        """)
+
+        # storage_state: 'removed' - retention deletes the image and clip
+        # files of the events it archives
+        cursor.execute("PRAGMA table_info(event_archive)")
+        archive_columns = {row['name'] for row in cursor.fetchall()}
+        if 'storage_state' not in archive_columns:
+            cursor.execute("ALTER TABLE event_archive ADD COLUMN storage_state TEXT NOT NULL DEFAULT 'removed'")
+        if 'clip_path' not in archive_columns:
+            cursor.execute("ALTER TABLE event_archive ADD COLUMN clip_path TEXT")
+
         # Indexes
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_person_name ON person(name)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_person ON face_sample(person_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_person ON event(person_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_timestamp ON event(timestamp DESC)")
 
-        self.conn.commit()
+        # Statistics counters (maintained by STATS_TRIGGERS / PERSON_STATS_TRIGGERS)
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('stats_counter', 'person_stats')")
+        counters_exist = cursor.fetchone()[0] == 2
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stats_counter (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS person_stats (
+                person_id INTEGER PRIMARY KEY,
+                sample_count INTEGER NOT NULL DEFAULT 0,
+                event_count INTEGER NOT NULL DEFAULT 0,
+                last_seen TEXT NOT NULL DEFAULT '',
+                best_sample_id INTEGER
+            )
+        """)
+        for trigger in STATS_TRIGGERS + PERSON_STATS_TRIGGERS:
+            cursor.execute(trigger)
+
+        # Keyset pagination of the persons overview
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_person_created ON person(created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_person_stats_last_seen ON person_stats(last_seen)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_person_stats_samples ON person_stats(sample_count)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_person_stats_events ON person_stats(event_count)")
+        # Per-person last_seen recount (MAX(timestamp) per person) and
+        # filtered, keyset-paginated event queries (see query_events)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_person_timestamp ON event(person_id, timestamp)")
+        # Ascending on purpose: scanned backwards, the implicit rowid column
+        # is descending too, so ORDER BY timestamp DESC, id DESC needs no sort
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_time_id ON event(timestamp, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_device_timestamp ON event(device_id, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_status_timestamp ON event(status, timestamp)")
+        # Retention: "is this file still referenced?"
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_image ON event(image_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_face_image ON face_sample(image_path)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_clip ON event(clip_path) WHERE clip_path IS NOT NULL")
+
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            logger.info("Database predates incremental auto-vacuum; run 'PRAGMA auto_vacuum = INCREMENTAL; VACUUM;' "
+                        "once while the server is stopped to let retention shrink the file")
+
         logger.info(f"Database initialized at {self.db_path}")
 
+        if not counters_exist:
+            # Existing database from before the counters: count once
+            self.rebuild_stats()
+
+    def _load_gallery(self) -> FaceGallery:
+        """Load all active face samples and person names into the gallery cache"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT fs.id, fs.person_id, fs.embedding
+            FROM face_sample fs
+            JOIN person p ON fs.person_id = p.id
+            WHERE p.is_merged_into IS NULL
+        """)
+        samples = [
+            (row[0], row[1], np.frombuffer(row[2], dtype=np.float32))
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute("SELECT id, name FROM person WHERE is_merged_into IS NULL")
+        names = {row[0]: row[1] for row in cursor.fetchall()}
+
+        return self.gallery.load(samples, names)
+
     # ========================================================================
     # PERSON OPERATIONS
     # ========================================================================
 
     def create_person(self, name: Optional[str] = None) -> int:
         """Create new person (auto-name if None)"""
-        cursor = self.conn.cursor()
+        with self.transaction():
+            if self.writer:
+                # Queued like the event and sample written with it, so they
+                # are committed (or dropped) together
+                person_id = self._allocate_id('person')
+                if name is None:
+                    with self._id_lock:
+                        self._unknown_names += 1
+                        name = f"Unbekannt #{self._unknown_names}"
+                now = datetime.now()
+                self._queue_write(
+                    'person',
+                    "INSERT INTO person (id, name, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (person_id, name, now, now)
+                )
+            else:
+                cursor = self.conn.cursor()
 
-        if name is None:
-            # Auto-generate name
-            cursor.execute("SELECT COUNT(*) FROM person WHERE name LIKE 'Unbekannt #%'")
-            count = cursor.fetchone()[0]
-            name = f"Unbekannt #{count + 1}"
+                if name is None:
+                    # Auto-generate name
+                    cursor.execute("SELECT COUNT(*) FROM person WHERE name LIKE 'Unbekannt #%'")
+                    count = cursor.fetchone()[0]
+                    name = f"Unbekannt #{count + 1}"
 
-        cursor.execute(
-            "INSERT INTO person (name, created_at, updated_at) VALUES (?, ?, ?)",
-            (name, datetime.now(), datetime.now())
-        )
-        self.conn.commit()
+                cursor.execute(
+                    "INSERT INTO person (name, created_at, updated_at) VALUES (?, ?, ?)",
+                    (name, datetime.now(), datetime.now())
+                )
+                person_id = cursor.lastrowid
+
+            self._after_commit(lambda: self.gallery.set_name(person_id, name))
+            self._after_commit(PERSONS_CREATED_TOTAL.inc)
 
-        person_id = cursor.lastrowid
         logger.info(f"Created person: {name} (ID: {person_id})")
         return person_id
 
     def get_person(self, person_id: int) -> Optional[Dict]:
         """Get person by ID"""
+        self._sync_writes('person')
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM person WHERE id = ? AND is_merged_into IS NULL", (person_id,))
         row = cursor.fetchone()
         return dict(row) if row else None
 
+    def get_person_name(self, person_id: int) -> Optional[str]:
+        """Get person name by ID (served from the gallery cache)"""
+        name = self.gallery.get_name(person_id)
+        if name is None:
+            person = self.get_person(person_id)
+            if person:
+                name = person['name']
+                self.gallery.set_name(person_id, name)
+        return name
+
     def get_all_persons(self, include_merged: bool = False) -> List[Dict]:
         """Get all persons"""
         cursor = self.conn.cursor()
@@ -124,57 +806,131 @@ class Database:
 
         return [dict(row) for row in cursor.fetchall()]
 
+    def get_persons_overview(
+        self,
+        sort: str = 'created',
+        descending: bool = True,
+        limit: int = 50,
+        after: Optional[Tuple] = None
+    ) -> Tuple[List[Dict], Optional[Tuple]]:
+        """
+        Active persons with sample count, event count, last-seen timestamp
+        and best sample (thumbnail) in one query, keyset-paginated
+
+        Args:
+            sort: created | name | last_seen | samples | events
+            descending: Sort direction
+            limit: Page size
+            after: Keyset of the previous page's last row (see return value)
+
+        Returns:
+            (persons, keyset of the last row or None if this is the last page)
+        """
+        if sort not in PERSON_SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        column, tie_breaker = PERSON_SORT_COLUMNS[sort]
+        direction = 'DESC' if descending else 'ASC'
+
+        where = "p.is_merged_into IS NULL"
+        params = []
+        if after is not None:
+            where += f" AND ({column}, {tie_breaker}) {'<' if descending else '>'} (?, ?)"
+            params.extend(after)
+
+        self._sync_writes()
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT p.id, p.name, p.created_at, p.updated_at,
+                   ps.sample_count, ps.event_count, ps.last_seen,
+                   ps.best_sample_id, fs.image_path AS thumbnail_path,
+                   {column} AS sort_value
+            FROM person_stats ps
+            JOIN person p ON p.id = ps.person_id
+            LEFT JOIN face_sample fs ON fs.id = ps.best_sample_id
+            WHERE {where}
+            ORDER BY {column} {direction}, {tie_breaker} {direction}
+            LIMIT ?
+        """, params + [limit + 1])
+
+        persons = [dict(row) for row in cursor.fetchall()]
+        has_more = len(persons) > limit
+        persons = persons[:limit]
+
+        for person in persons:
+            person['last_seen'] = person['last_seen'] or None
+
+        next_key = None
+        if has_more:
+            next_key = (persons[-1].pop('sort_value'), persons[-1]['id'])
+        for person in persons:
+            person.pop('sort_value', None)
+
+        return persons, next_key
+
     def update_person_name(self, person_id: int, new_name: str) -> bool:
         """Update person name"""
+        # The person may still be queued (auto-created with group commit)
+        self._flush_writes()
         cursor = self.conn.cursor()
         cursor.execute(
             "UPDATE person SET name = ?, updated_at = ? WHERE id = ?",
             (new_name, datetime.now(), person_id)
         )
-        self.conn.commit()
+        if cursor.rowcount > 0:
+            self._after_commit(lambda: self.gallery.set_name(person_id, new_name))
         logger.info(f"Updated person {person_id} name to '{new_name}'")
         return cursor.rowcount > 0
 
     def merge_persons(self, from_id: int, into_id: int) -> bool:
-        """Merge person from_id into person into_id"""
-        cursor = self.conn.cursor()
+        """Merge person from_id into person into_id (atomic)"""
+        # Queued events/samples of this person must be in the table first
+        self._flush_writes()
 
-        # Move all face samples
-        cursor.execute(
-            "UPDATE face_sample SET person_id = ? WHERE person_id = ?",
-            (into_id, from_id)
-        )
+        with self.transaction():
+            cursor = self.conn.cursor()
 
-        # Update events
-        cursor.execute(
-            "UPDATE event SET person_id = ? WHERE person_id = ?",
-            (into_id, from_id)
-        )
+            # Move all face samples
+            cursor.execute(
+                "UPDATE face_sample SET person_id = ? WHERE person_id = ?",
+                (into_id, from_id)
+            )
 
-        # Mark source person as merged
-        cursor.execute(
-            "UPDATE person SET is_merged_into = ?, updated_at = ? WHERE id = ?",
-            (into_id, datetime.now(), from_id)
-        )
+            # Update events
+            cursor.execute(
+                "UPDATE event SET person_id = ? WHERE person_id = ?",
+                (into_id, from_id)
+            )
+
+            # Mark source person as merged
+            cursor.execute(
+                "UPDATE person SET is_merged_into = ?, updated_at = ? WHERE id = ?",
+                (into_id, datetime.now(), from_id)
+            )
+
+            self._after_commit(lambda: self.gallery.merge_person(from_id, into_id))
 
-        self.conn.commit()
         logger.info(f"Merged person {from_id} into {into_id}")
         return True
 
     def delete_person(self, person_id: int) -> bool:
-        """Delete person and all associated data"""
-        cursor = self.conn.cursor()
+        """Delete person and all associated data (atomic)"""
+        # Queued events/samples of this person must be in the table first
+        self._flush_writes()
 
-        # Delete face samples
-        cursor.execute("DELETE FROM face_sample WHERE person_id = ?", (person_id,))
+        with self.transaction():
+            cursor = self.conn.cursor()
 
-        # Delete events (or set person_id to NULL if you want to keep history)
-        cursor.execute("DELETE FROM event WHERE person_id = ?", (person_id,))
+            # Delete face samples
+            cursor.execute("DELETE FROM face_sample WHERE person_id = ?", (person_id,))
 
-        # Delete person
-        cursor.execute("DELETE FROM person WHERE id = ?", (person_id,))
+            # Delete events (or set person_id to NULL if you want to keep history)
+            cursor.execute("DELETE FROM event WHERE person_id = ?", (person_id,))
+
+            # Delete person
+            cursor.execute("DELETE FROM person WHERE id = ?", (person_id,))
+
+            self._after_commit(lambda: self.gallery.remove_person(person_id))
 
-        self.conn.commit()
         logger.info(f"Deleted person {person_id}")
         return cursor.rowcount > 0
 
@@ -191,28 +947,40 @@ class Database:
         bbox: Optional[List[int]] = None
     ) -> int:
         """Add face sample to person"""
-        cursor = self.conn.cursor()
-
         # Convert embedding to blob
         embedding_blob = embedding.tobytes()
 
         # Convert bbox to JSON
         bbox_json = json.dumps(bbox) if bbox else None
 
-        cursor.execute(
-            """INSERT INTO face_sample
-               (person_id, embedding, image_path, quality_score, bbox, created_at)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (person_id, embedding_blob, image_path, quality_score, bbox_json, datetime.now())
-        )
-        self.conn.commit()
+        # Own transaction (if none is open), so the cache update waits for the commit
+        with self.transaction():
+            if self.writer:
+                sample_id = self._allocate_id('face_sample')
+                self._queue_write(
+                    'face_sample',
+                    """INSERT INTO face_sample
+                       (id, person_id, embedding, image_path, quality_score, bbox, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (sample_id, person_id, embedding_blob, image_path, quality_score, bbox_json, datetime.now())
+                )
+            else:
+                cursor = self.conn.cursor()
+                cursor.execute(
+                    """INSERT INTO face_sample
+                       (person_id, embedding, image_path, quality_score, bbox, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (person_id, embedding_blob, image_path, quality_score, bbox_json, datetime.now())
+                )
+                sample_id = cursor.lastrowid
 
-        sample_id = cursor.lastrowid
+            self._after_commit(lambda: self.gallery.add_sample(sample_id, person_id, embedding))
         logger.debug(f"Added face sample {sample_id} for person {person_id}")
         return sample_id
 
     def get_face_samples(self, person_id: int) -> List[Dict]:
         """Get all face samples for person"""
+        self._sync_writes('face_sample')
         cursor = self.conn.cursor()
         cursor.execute(
             "SELECT * FROM face_sample WHERE person_id = ? ORDER BY created_at DESC",
@@ -248,21 +1016,38 @@ class Database:
 
         return embeddings
 
+    def get_gallery(self):
+        """Get all active embeddings as a searchable FaceGallery/IVFIndex (served from cache)"""
+        gallery = self.gallery.snapshot()
+        if gallery is None:
+            gallery = self._load_gallery()
+        return gallery
+
     def delete_face_sample(self, sample_id: int) -> bool:
         """Delete face sample"""
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM face_sample WHERE id = ?", (sample_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        # Own transaction (if none is open), so the cache update waits for the commit
+        with self.transaction():
+            self._after_commit(lambda: self.gallery.remove_sample(sample_id))
+            if self.writer:
+                # Queued with the open transaction's other writes (e.g. the
+                # sample replacing this one), so both commit or neither
+                self._queue_write('face_sample', "DELETE FROM face_sample WHERE id = ?", (sample_id,))
+                return True
+
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM face_sample WHERE id = ?", (sample_id,))
+            return cursor.rowcount > 0
 
     def count_face_samples(self, person_id: int) -> int:
-        """Count face samples for person"""
+        """Count face samples for person (including all queued ones)"""
+        self._flush_writes()
         cursor = self.conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM face_sample WHERE person_id = ?", (person_id,))
         return cursor.fetchone()[0]
 
     def get_oldest_face_sample(self, person_id: int) -> Optional[int]:
         """Get ID of oldest face sample (for replacement)"""
+        self._sync_writes('face_sample')
         cursor = self.conn.cursor()
         cursor.execute(
             "SELECT id FROM face_sample WHERE person_id = ? ORDER BY created_at ASC LIMIT 1",
@@ -283,21 +1068,101 @@ class Database:
         distance: float = 999.0,
         margin: float = 0.0,
         status: str = "UNKNOWN",
-        device_id: str = "ESP32-CAM"
+        device_id: str = "ESP32-CAM",
+        storage_state: str = "stored",
+        clip_path: Optional[str] = None
     ) -> int:
-        """Create event record"""
+        """Create event record (storage_state 'pending' if the image is not written yet)"""
+        # Own transaction (if none is open), so the counter waits for the commit
+        with self.transaction():
+            self._after_commit(lambda: EVENTS_TOTAL.inc(status=status))
+
+            if self.writer:
+                event_id = self._allocate_id('event')
+                self._queue_write(
+                    'event',
+                    """INSERT INTO event
+                       (id, timestamp, person_id, confidence, distance, margin, status, image_path, device_id,
+                        storage_state, clip_path)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (event_id, datetime.now(), person_id, confidence, distance, margin, status, image_path,
+                     device_id, storage_state, clip_path)
+                )
+                return event_id
+
+            cursor = self.conn.cursor()
+            cursor.execute(
+                """INSERT INTO event
+                   (timestamp, person_id, confidence, distance, margin, status, image_path, device_id,
+                    storage_state, clip_path)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (datetime.now(), person_id, confidence, distance, margin, status, image_path, device_id,
+                 storage_state, clip_path)
+            )
+            return cursor.lastrowid
+
+    def set_image_storage_state(self, image_path: str, storage_state: str):
+        """Resolve 'pending' events of an image once the DiskWriter is done with it"""
+        sql = "UPDATE event SET storage_state = ? WHERE image_path = ? AND storage_state = 'pending'"
+        if self.writer:
+            self._queue_write('event', sql, (storage_state, image_path))
+            return
+
+        with self.transaction():
+            self.conn.execute(sql, (storage_state, image_path))
+
+    def get_pending_image_paths(self) -> List[str]:
+        """Images of events still marked 'pending' (checked after a restart)"""
+        self._sync_writes('event')
         cursor = self.conn.cursor()
-        cursor.execute(
-            """INSERT INTO event
-               (timestamp, person_id, confidence, distance, margin, status, image_path, device_id)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (datetime.now(), person_id, confidence, distance, margin, status, image_path, device_id)
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+        cursor.execute("SELECT DISTINCT image_path FROM event WHERE storage_state = 'pending'")
+        return [row[0] for row in cursor.fetchall()]
+
+    def set_event_person(self, event_id: int, person_id: int) -> bool:
+        """Assign person to event (e.g. after auto-creating the person)"""
+        if self.writer:
+            self._queue_write('event', "UPDATE event SET person_id = ? WHERE id = ?", (person_id, event_id))
+            return True
+
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE event SET person_id = ? WHERE id = ?", (person_id, event_id))
+        return cursor.rowcount > 0
+
+    def add_event_trace(self, event_ids: List[int], trace: Dict):
+        """Store an upload's pipeline trace with each of its events"""
+        data = json.dumps(trace, separators=(',', ':'))
+        sql = "INSERT OR REPLACE INTO event_trace (event_id, trace) VALUES (?, ?)"
+        with self.transaction():
+            for event_id in event_ids:
+                if self.writer:
+                    self._queue_write('event_trace', sql, (event_id, data))
+                else:
+                    self.conn.execute(sql, (event_id, data))
+
+    def get_event_trace(self, event_id: int) -> Optional[Dict]:
+        """Pipeline trace of an event (None if it was not traced)"""
+        self._sync_writes('event_trace')
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT trace FROM event_trace WHERE event_id = ?", (event_id,))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_event(self, event_id: int) -> Optional[Dict]:
+        """Get event by ID (with person name)"""
+        self._sync_writes('event')
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT e.*, p.name as person_name
+            FROM event e
+            LEFT JOIN person p ON e.person_id = p.id
+            WHERE e.id = ?
+        """, (event_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
 
     def get_latest_event(self) -> Optional[Dict]:
         """Get latest event"""
+        self._sync_writes('event')
         cursor = self.conn.cursor()
         cursor.execute("""
             SELECT e.*, p.name as person_name
@@ -311,65 +1176,303 @@ class Database:
 
     def get_events(self, limit: int = 50, person_id: Optional[int] = None) -> List[Dict]:
         """Get events (optionally filtered by person)"""
+        events, _ = self.query_events(limit=limit, person_id=person_id)
+        return events
+
+    def query_events(
+        self,
+        limit: int = 50,
+        after: Optional[Tuple] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        device_id: Optional[str] = None,
+        status: Optional[str] = None,
+        person_id: Optional[int] = None
+    ) -> Tuple[List[Dict], Optional[Tuple]]:
+        """
+        Events newest first, filtered and keyset-paginated
+
+        Pages are positioned with (timestamp, id) of the previous page's
+        last row, so every page is an index range scan of `limit` rows,
+        no matter how deep the page is.
+
+        Args:
+            limit: Page size
+            after: Keyset of the previous page's last row (see return value)
+            since: Only events at or after this time
+            until: Only events before this time
+            device_id, status, person_id: Exact-match filters
+
+        Returns:
+            (events, keyset of the last row or None if this is the last page)
+        """
+        conditions = []
+        params = []
+
+        if person_id is not None:
+            conditions.append("e.person_id = ?")
+            params.append(person_id)
+        if device_id is not None:
+            conditions.append("e.device_id = ?")
+            params.append(device_id)
+        if status is not None:
+            conditions.append("e.status = ?")
+            params.append(status)
+        if since is not None:
+            conditions.append("e.timestamp >= ?")
+            params.append(since)
+        if after is not None:
+            # Implies `until` (the previous page already respected it); a
+            # second upper bound could make SQLite range-scan from `until`
+            conditions.append("(e.timestamp, e.id) < (?, ?)")
+            params.extend(after)
+        elif until is not None:
+            conditions.append("e.timestamp < ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        self._sync_writes('event')
         cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT e.*, p.name as person_name
+            FROM event e
+            LEFT JOIN person p ON e.person_id = p.id
+            {where}
+            ORDER BY e.timestamp DESC, e.id DESC
+            LIMIT ?
+        """, params + [limit + 1])
 
-        if person_id:
-            cursor.execute("""
-                SELECT e.*, p.name as person_name
-                FROM event e
-                LEFT JOIN person p ON e.person_id = p.id
-                WHERE e.person_id = ?
-                ORDER BY e.timestamp DESC
-                LIMIT ?
-            """, (person_id, limit))
-        else:
-            cursor.execute("""
-                SELECT e.*, p.name as person_name
-                FROM event e
-                LEFT JOIN person p ON e.person_id = p.id
-                ORDER BY e.timestamp DESC
-                LIMIT ?
-            """, (limit,))
+        events = [dict(row) for row in cursor.fetchall()]
+        next_key = None
+        if len(events) > limit:
+            events = events[:limit]
+            next_key = (events[-1]['timestamp'], events[-1]['id'])
 
-        return [dict(row) for row in cursor.fetchall()]
+        return events, next_key
+
+    # ========================================================================
+    # RETENTION
+    # ========================================================================
+
+    def get_retention_cutoff(self, max_age_days: int = 0, max_images: int = 0) -> Optional[Tuple]:
+        """
+        Keyset (timestamp, id) below which events are expired
+
+        Args:
+            max_age_days: Events older than this expire (0 = no age limit)
+            max_images: Only the events of the newest max_images images are
+                kept (0 = no limit); an upload with several faces is one
+                image with one event per face
+
+        Returns:
+            (timestamp, id) of the first expired event, or None if nothing expires
+        """
+        cutoffs = []
+        cursor = self.conn.cursor()
+
+        if max_age_days > 0:
+            cursor.execute(
+                "SELECT timestamp, id FROM event WHERE timestamp < ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+                (datetime.now() - timedelta(days=max_age_days),)
+            )
+            row = cursor.fetchone()
+            if row:
+                cutoffs.append((row[0], row[1]))
+
+        if max_images > 0:
+            # Images are ranked by their last event id, which pruning never
+            # changes (parallel uploads interleave their events). Everything
+            # before the oldest event of a kept image expires; events of
+            # expired images interleaved with kept ones wait for a later pass.
+            cursor.execute("SELECT COUNT(DISTINCT image_path) FROM event")
+            if cursor.fetchone()[0] > max_images:
+                cursor.execute("""
+                    SELECT timestamp, id FROM event WHERE image_path IN (
+                        SELECT image_path FROM event GROUP BY image_path ORDER BY MAX(id) DESC LIMIT ?
+                    )
+                    ORDER BY timestamp, id LIMIT 1
+                """, (max_images,))
+                oldest_kept = cursor.fetchone()
+                cursor.execute(
+                    "SELECT timestamp, id FROM event WHERE (timestamp, id) < (?, ?) "
+                    "ORDER BY timestamp DESC, id DESC LIMIT 1",
+                    (oldest_kept[0], oldest_kept[1])
+                )
+                row = cursor.fetchone()
+                if row:
+                    cutoffs.append((row[0], row[1]))
+
+        return max(cutoffs) if cutoffs else None
+
+    def prune_events(self, through: Tuple, limit: int = 200, archive: bool = False) -> Tuple[int, List[str]]:
+        """
+        Delete (or move to event_archive) the oldest events up to and
+        including keyset `through`, at most `limit` per call
+
+        Archived events are stored with storage_state 'removed', as the
+        caller deletes their files.
+
+        Returns:
+            (number of pruned events, their distinct image and clip paths -
+            the files themselves are not touched)
+        """
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT id, image_path, clip_path FROM event WHERE (timestamp, id) <= (?, ?) "
+                "ORDER BY timestamp, id LIMIT ?",
+                (through[0], through[1], limit)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                return 0, []
+
+            ids = [row[0] for row in rows]
+            placeholders = ','.join('?' * len(ids))
+            if archive:
+                cursor.execute(f"""
+                    INSERT OR REPLACE INTO event_archive
+                        (id, timestamp, person_id, confidence, distance, margin, status, image_path, device_id,
+                         clip_path, storage_state)
+                    SELECT id, timestamp, person_id, confidence, distance, margin, status, image_path, device_id,
+                           clip_path, 'removed'
+                    FROM event WHERE id IN ({placeholders})
+                """, ids)
+            cursor.execute(f"DELETE FROM event WHERE id IN ({placeholders})", ids)
+
+        return len(rows), sorted({row[1] for row in rows} | {row[2] for row in rows if row[2]})
+
+    def is_image_referenced(self, image_path: str) -> bool:
+        """True if an event or a face sample still uses this file (image or clip)"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT EXISTS(SELECT 1 FROM event WHERE image_path = ?)
+                OR EXISTS(SELECT 1 FROM face_sample WHERE image_path = ?)
+                OR EXISTS(SELECT 1 FROM event WHERE clip_path = ?)
+        """, (image_path, image_path, image_path))
+        return bool(cursor.fetchone()[0])
+
+    def rename_image_path(self, old_path: str, new_path: str) -> int:
+        """Point all rows referencing old_path to new_path (storage migration)"""
+        with self.transaction():
+            cursor = self.conn.cursor()
+            renamed = 0
+            for table in ('event', 'event_archive', 'face_sample'):
+                cursor.execute(f"UPDATE {table} SET image_path = ? WHERE image_path = ?", (new_path, old_path))
+                renamed += cursor.rowcount
+        return renamed
+
+    def get_sample_image_paths(self) -> set:
+        """Image paths of all face samples (crops that must be kept)"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT image_path FROM face_sample")
+        return {row[0] for row in cursor.fetchall()}
+
+    def incremental_vacuum(self, pages: int = 256) -> int:
+        """
+        Return up to `pages` free pages to the OS
+
+        Returns:
+            Bytes reclaimed (0 if the database is not in incremental
+            auto-vacuum mode)
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            return 0
+
+        cursor.execute("PRAGMA page_size")
+        page_size = cursor.fetchone()[0]
+        cursor.execute("PRAGMA freelist_count")
+        before = cursor.fetchone()[0]
+        cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        cursor.execute("PRAGMA freelist_count")
+        after = cursor.fetchone()[0]
+
+        return (before - after) * page_size
 
     # ========================================================================
     # STATISTICS
     # ========================================================================
 
     def get_stats(self) -> Dict:
-        """Get database statistics"""
+        """Get database statistics (from the materialized counters, no table scans)"""
+        self._sync_writes()
         cursor = self.conn.cursor()
+        cursor.execute("SELECT key, value FROM stats_counter")
+        counters = {row[0]: row[1] for row in cursor.fetchall()}
+
+        by_status = {key[7:]: value for key, value in counters.items() if key.startswith('status:') and value}
+        by_device = {key[7:]: value for key, value in counters.items() if key.startswith('device:') and value}
 
-        cursor.execute("SELECT COUNT(*) FROM person WHERE is_merged_into IS NULL")
-        person_count = cursor.fetchone()[0]
+        return {
+            'total_persons': counters.get('persons', 0),
+            'total_samples': counters.get('samples', 0),
+            'total_events': counters.get('events', 0),
+            'green_events': by_status.get('GREEN', 0),
+            'yellow_events': by_status.get('YELLOW', 0),
+            'unknown_events': by_status.get('UNKNOWN', 0),
+            'events_by_status': by_status,
+            'events_by_device': by_device
+        }
 
-        cursor.execute("SELECT COUNT(*) FROM face_sample")
-        sample_count = cursor.fetchone()[0]
+    def rebuild_stats(self) -> Dict:
+        """Recount all statistics counters and per-person aggregates from the real tables"""
+        self._flush_writes()
 
-        cursor.execute("SELECT COUNT(*) FROM event")
-        event_count = cursor.fetchone()[0]
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.execute("DELETE FROM stats_counter")
+            cursor.execute(f"INSERT INTO stats_counter (key, value) {STATS_RECOUNT}")
+            cursor.execute("DELETE FROM person_stats")
+            cursor.execute(f"""
+                INSERT INTO person_stats (person_id, sample_count, event_count, last_seen, best_sample_id)
+                {PERSON_STATS_RECOUNT}
+            """)
 
-        cursor.execute("SELECT COUNT(*) FROM event WHERE status = 'GREEN'")
-        green_count = cursor.fetchone()[0]
+        logger.info("Statistics counters rebuilt")
+        return self.get_stats()
 
-        cursor.execute("SELECT COUNT(*) FROM event WHERE status = 'YELLOW'")
-        yellow_count = cursor.fetchone()[0]
+    def verify_stats(self) -> Dict:
+        """
+        Compare the counters with the real tables
 
-        cursor.execute("SELECT COUNT(*) FROM event WHERE status = 'UNKNOWN'")
-        unknown_count = cursor.fetchone()[0]
+        Returns:
+            {'ok': bool, 'mismatches': {key: {'counter': n, 'actual': m}}}
+        """
+        self._flush_writes()
 
-        return {
-            'total_persons': person_count,
-            'total_samples': sample_count,
-            'total_events': event_count,
-            'green_events': green_count,
-            'yellow_events': yellow_count,
-            'unknown_events': unknown_count
+        # One transaction, so both sides see the same state
+        with self.transaction():
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT key, value FROM stats_counter")
+            counters = {row[0]: row[1] for row in cursor.fetchall()}
+            cursor.execute(STATS_RECOUNT)
+            actual = {row[0]: row[1] for row in cursor.fetchall()}
+
+            # Per-person aggregates, keyed person:<id>
+            cursor.execute("SELECT person_id, sample_count, event_count, last_seen, best_sample_id FROM person_stats")
+            counters.update((f"person:{row[0]}", list(row[1:])) for row in cursor.fetchall())
+            cursor.execute(PERSON_STATS_RECOUNT)
+            actual.update((f"person:{row[0]}", list(row[1:])) for row in cursor.fetchall())
+
+        mismatches = {
+            key: {'counter': counters.get(key, 0), 'actual': actual.get(key, 0)}
+            for key in set(counters) | set(actual)
+            if counters.get(key, 0) != actual.get(key, 0)
         }
+        if mismatches:
+            logger.warning(f"Statistics counters out of sync: {mismatches}")
+
+        return {'ok': not mismatches, 'mismatches': mismatches}
 
     def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
+        """Flush queued writes and close the pooled connections"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+        self.release()
+        count = self.pool.close()
+        logger.info(f"Database connections closed ({count})")
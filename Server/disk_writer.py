@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Disk Writer - Background Persistence of Uploaded Images
+=======================================================
+Takes image bytes that are already in memory and writes them to disk in
+a background thread, so slow storage (SD card, NAS) stays off the upload
+latency path. Recognition works on the in-memory bytes; the file is never
+read back.
+
+Memory is bounded: once max_pending_bytes are queued, submit() writes the
+file in the caller's thread instead (back-pressure, never unbounded RAM).
+
+fsync policies:
+    always  fsync every file and its directory before it counts as stored
+    batch   write all queued files, then fsync them (and their directories)
+            together - one flush round per batch instead of per file
+    none    leave flushing to the OS (stored = handed to the page cache)
+
+Until a file is stored, get() serves its bytes from memory and status()
+reports 'pending'; on_stored / on_failed are called once it is done.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from threading import Condition, Thread
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ('always', 'batch', 'none')
+
+# Failed paths remembered for status()
+MAX_REMEMBERED_FAILURES = 1000
+
+
+class DiskWriter:
+    """
+    Background file writer with a memory bound and an fsync policy
+
+    Args:
+        max_pending_bytes: Queued bytes before submit() writes synchronously
+        fsync: 'always', 'batch' or 'none'
+        max_batch: Files written per batch (fsync: batch)
+        on_stored: Called with the path (str) once a queued file is stored
+        on_failed: Called with the path (str) and the error if a write fails
+    """
+
+    def __init__(
+        self,
+        max_pending_bytes: int = 64 * 1024 * 1024,
+        fsync: str = 'batch',
+        max_batch: int = 32,
+        on_stored: Optional[Callable[[str], None]] = None,
+        on_failed: Optional[Callable[[str, Exception], None]] = None
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}' (use {', '.join(FSYNC_POLICIES)})")
+
+        self.max_pending_bytes = max_pending_bytes
+        self.fsync = fsync
+        self.max_batch = max(1, max_batch)
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+
+        self._cond = Condition()
+        self._queue = deque()                 # paths in submit order
+        self._pending: Dict[str, bytes] = {}  # path -> bytes not yet stored
+        self._pending_bytes = 0
+        self._failed = OrderedDict()          # path -> error message
+        self._closing = False
+
+        # Statistics
+        self.stored = 0
+        self.sync_writes = 0
+        self.failures = 0
+        self.batches = 0
+        self.bytes_written = 0
+        self.total_write_time = 0.0
+        self.max_queued_bytes = 0
+
+        self._thread = Thread(target=self._run, name="disk-writer", daemon=True)
+        self._thread.start()
+
+        logger.info(f"Disk writer started (fsync: {fsync}, max pending {max_pending_bytes // (1024 * 1024)} MB)")
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, path: Path, data: bytes) -> bool:
+        """
+        Persist data to path
+
+        Returns:
+            True if the write is queued (pending), False if the file was
+            written synchronously because the memory bound was reached
+
+        Raises:
+            OSError: Synchronous write failed
+        """
+        key = str(path)
+        with self._cond:
+            if not self._closing and self._pending_bytes + len(data) <= self.max_pending_bytes:
+                self._pending[key] = data
+                self._pending_bytes += len(data)
+                self.max_queued_bytes = max(self.max_queued_bytes, self._pending_bytes)
+                self._queue.append(key)
+                self._cond.notify()
+                return True
+            self.sync_writes += 1
+
+        logger.debug(f"Disk writer full, writing {key} synchronously")
+        self._write_file(key, data, sync=self.fsync != 'none')
+        return False
+
+    def get(self, path: Path) -> Optional[bytes]:
+        """Bytes of a file that is still pending, else None"""
+        with self._cond:
+            return self._pending.get(str(path))
+
+    def status(self, path: Path) -> str:
+        """'pending', 'failed' or 'stored' (anything not pending or failed)"""
+        key = str(path)
+        with self._cond:
+            if key in self._pending:
+                return 'pending'
+            if key in self._failed:
+                return 'failed'
+        return 'stored'
+
+    def wait(self, path: Path, timeout: float = 10.0) -> bool:
+        """Block until path is no longer pending"""
+        key = str(path)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while key in self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _write_file(self, key: str, data: bytes, sync: bool):
+        path = Path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        if sync:
+            self._fsync_dir(path.parent)
+
+    @staticmethod
+    def _fsync_dir(directory: Path):
+        """Make the new directory entry durable (not supported on Windows)"""
+        if os.name == 'nt':
+            return
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _take_batch(self):
+        """Wait for work, then take up to max_batch queued paths (lock held by caller)"""
+        while not self._queue and not self._closing:
+            self._cond.wait()
+        batch = []
+        while self._queue and len(batch) < self.max_batch:
+            key = self._queue.popleft()
+            batch.append((key, self._pending[key]))
+        return batch
+
+    def _write_batch(self, batch):
+        """Write a batch; returns {path: error} of the failed files"""
+        failed = {}
+
+        if self.fsync == 'batch':
+            # Write everything first, then flush: the device can merge the writes
+            open_files = []
+            for key, data in batch:
+                try:
+                    path = Path(key)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    f = open(path, 'wb')
+                    open_files.append((key, f))
+                    f.write(data)
+                except OSError as e:
+                    failed[key] = e
+            directories = set()
+            for key, f in open_files:
+                try:
+                    if key not in failed:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        directories.add(Path(key).parent)
+                except OSError as e:
+                    failed[key] = e
+                finally:
+                    f.close()
+            for directory in directories:
+                try:
+                    self._fsync_dir(directory)
+                except OSError as e:
+                    logger.warning(f"Disk writer: directory fsync failed for {directory}: {e}")
+        else:
+            for key, data in batch:
+                try:
+                    self._write_file(key, data, sync=self.fsync == 'always')
+                except OSError as e:
+                    failed[key] = e
+
+        return failed
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+                if not batch:
+                    break  # Closing and drained
+
+            start = time.perf_counter()
+            failed = self._write_batch(batch)
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                for key, data in batch:
+                    del self._pending[key]
+                    self._pending_bytes -= len(data)
+                    if key in failed:
+                        self._failed[key] = str(failed[key])
+                        if len(self._failed) > MAX_REMEMBERED_FAILURES:
+                            self._failed.popitem(last=False)
+                    else:
+                        self.bytes_written += len(data)
+                self.stored += len(batch) - len(failed)
+                self.failures += len(failed)
+                self.batches += 1
+                self.total_write_time += elapsed
+                self._cond.notify_all()
+
+            # Callbacks run after the path left the pending set (see status())
+            for key, _ in batch:
+                try:
+                    if key in failed:
+                        logger.error(f"Disk writer: cannot store {key}: {failed[key]}")
+                        if self.on_failed:
+                            self.on_failed(key, failed[key])
+                    elif self.on_stored:
+                        self.on_stored(key)
+                except Exception as e:
+                    logger.error(f"Disk writer callback failed for {key}: {e}")
+
+    # ------------------------------------------------------------------
+    # Status / shutdown
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'fsync': self.fsync,
+                'queued_files': len(self._pending),
+                'queued_bytes': self._pending_bytes,
+                'max_pending_bytes': self.max_pending_bytes,
+                'max_queued_bytes': self.max_queued_bytes,
+                'stored': self.stored,
+                'sync_writes': self.sync_writes,
+                'failures': self.failures,
+                'batches': self.batches,
+                'bytes_written': self.bytes_written,
+                'avg_batch_ms': round(self.total_write_time / self.batches * 1000, 2) if self.batches else 0.0
+            }
+
+    def close(self, timeout: float = 30.0):
+        """Write everything queued, then stop the writer thread"""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        logger.info("Disk writer drained and stopped")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Embedding Batcher - Batched SFace Forward Passes
+================================================
+Collects aligned 112x112 face crops from all concurrent requests for a
+short time window and runs them through the SFace ONNX model as one
+batch, instead of one forward pass per face.
+
+Preprocessing matches cv2.FaceRecognizerSF.feature(): BGR -> RGB,
+112x112, no scaling or mean subtraction.
+"""
+
+import logging
+import queue
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Batching stage in front of the SFace network
+
+    Args:
+        model_path: SFace ONNX model
+        window_ms: How long to wait for more crops after the first one
+        max_batch: Run immediately once this many crops are waiting
+    """
+
+    def __init__(self, model_path: str, window_ms: float = 10.0, max_batch: int = 16):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+
+        self._net = cv2.dnn.readNetFromONNX(str(model_path))
+        self._batch_supported = True
+        self._queue = queue.Queue()
+
+        # Statistics
+        self._stats_lock = Lock()
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+
+        self._thread = Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+        logger.info(f"Embedding batcher started (window={window_ms} ms, max_batch={self.max_batch})")
+
+    def submit(self, aligned_face: np.ndarray) -> Future:
+        """Queue one aligned face; the Future resolves to its 128-dim embedding"""
+        future = Future()
+        self._queue.put((aligned_face, future, time.perf_counter()))
+        return future
+
+    def embed(self, aligned_faces: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """Embed several aligned faces (blocks until all are done)"""
+        futures = [self.submit(face) for face in aligned_faces]
+
+        embeddings = []
+        for future in futures:
+            try:
+                embeddings.append(future.result())
+            except Exception as e:
+                logger.error(f"Embedding extraction error: {e}")
+                embeddings.append(None)
+        return embeddings
+
+    def _collect(self) -> list:
+        """Block for the first crop, then gather more until window or max_batch"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _forward(self, faces: List[np.ndarray]) -> np.ndarray:
+        blob = cv2.dnn.blobFromImages(faces, 1.0, (112, 112), (0, 0, 0), True, False)
+        self._net.setInput(blob)
+        return self._net.forward().reshape(len(faces), -1)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            faces = [face for face, _, _ in batch]
+
+            try:
+                if self._batch_supported and len(faces) > 1:
+                    try:
+                        features = self._forward(faces)
+                    except cv2.error as e:
+                        # Model exported with a fixed batch size of 1
+                        logger.warning(f"SFace model does not accept batches, falling back to single passes: {e}")
+                        self._batch_supported = False
+                        features = np.vstack([self._forward([face]) for face in faces])
+                elif len(faces) > 1:
+                    features = np.vstack([self._forward([face]) for face in faces])
+                else:
+                    features = self._forward(faces)
+
+                for (_, future, _), feature in zip(batch, features):
+                    future.set_result(feature.copy())
+
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+                for _, _, submitted in batch:
+                    delay = started - submitted
+                    self.total_delay += delay
+                    self.max_delay = max(self.max_delay, delay)
+
+    def stats(self) -> Dict:
+        """Batch-size and queueing-delay statistics"""
+        with self._stats_lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'avg_queue_delay_ms': round(self.total_delay / self.items * 1000, 2) if self.items else 0.0,
+                'max_queue_delay_ms': round(self.max_delay * 1000, 2),
+                'batch_supported': self._batch_supported,
+                'pending': self._queue.qsize()
+            }
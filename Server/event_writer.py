@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Event Writer - Group Commit for High-Rate Ingest
+================================================
+Write-behind queue for event and face-sample writes.
+
+Instead of one commit (and fsync) per statement, writes from all requests
+are collected and committed together in one transaction every
+flush_interval_ms, or as soon as max_batch statements are waiting.
+
+Row ids are allocated by Database up front, so callers get their event id
+immediately. Database waits for the writer before reads that must see the
+caller's own writes (read-your-writes), and close() flushes durably.
+
+Callbacks passed with a group (e.g. gallery cache updates) run in the
+writer thread once the group is committed - never for a dropped group -
+and before waiters of the group are woken.
+
+A group that cannot be committed (even on its own) is dropped and its
+sequence number remembered as failed; check() raises WriteFailedError for
+it, so the submitting thread learns about the lost write on its next
+read-your-writes sync instead of reading around a silent gap.
+"""
+
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Condition, Thread
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT_SECONDS = metrics.histogram(
+    'facerec_db_group_commit_seconds',
+    'Latency of one EventWriter batch commit'
+)
+
+# One write: (sql, params)
+WriteOp = Tuple[str, tuple]
+# Queued group: (seq, writes, callbacks run after its commit)
+WriteGroup = Tuple[int, List[WriteOp], List[Callable[[], None]]]
+
+# Failed groups remembered for check()
+MAX_REMEMBERED_FAILURES = 1000
+
+
+class WriteFailedError(RuntimeError):
+    """Queued writes were dropped because they could not be committed"""
+
+
+class EventWriter:
+    """
+    Background thread that commits queued writes in batches
+
+    Args:
+        db_path: SQLite database file
+        flush_interval_ms: Maximum time a write waits before being committed
+        max_batch: Commit early once this many statements are queued
+    """
+
+    def __init__(self, db_path: Path, flush_interval_ms: float = 100.0, max_batch: int = 500):
+        self.db_path = db_path
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+
+        self._cond = Condition()
+        self._pending: List[WriteGroup] = []
+        self._pending_ops = 0
+        self._next_seq = 1
+        # Every group up to completed_seq is committed or listed in _failed
+        self.completed_seq = 0
+        self._failed: 'OrderedDict[int, str]' = OrderedDict()  # seq -> error
+        self._flush_requested = False
+        self._closing = False
+
+        # Statistics
+        self.commits = 0
+        self.statements = 0
+        self.failed_groups = 0
+        self.total_commit_time = 0.0
+
+        self._thread = Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+        logger.info(f"Event writer started (flush every {flush_interval_ms} ms, max batch {self.max_batch})")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        # Each group commit is durable: one fsync per batch, not per statement
+        conn.execute("PRAGMA synchronous = FULL")
+        return conn
+
+    def submit(self, ops: List[WriteOp], on_commit: Optional[List[Callable[[], None]]] = None) -> int:
+        """
+        Queue a group of writes that must commit together
+
+        Args:
+            ops: Writes of the group
+            on_commit: Called (in the writer thread) once the group is committed
+
+        Returns:
+            Sequence number; done once completed_seq >= it (committed
+            unless check() reports it as failed)
+        """
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("Event writer is closed")
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append((seq, ops, on_commit or []))
+            self._pending_ops += len(ops)
+            # Wake the writer: idle (first group starts the flush interval) or batch full
+            if len(self._pending) == 1 or self._pending_ops >= self.max_batch:
+                self._cond.notify_all()
+            return seq
+
+    def wait(self, seq: int, timeout: float = 10.0) -> bool:
+        """Commit now (no interval wait) and block until seq is done (committed or failed)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.completed_seq < seq:
+                self._flush_requested = True
+                self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"Timed out waiting for event writer (seq {seq})")
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def check(self, seqs: Iterable[int]):
+        """
+        Raise WriteFailedError if one of the given (done) groups was dropped
+
+        Raises:
+            WriteFailedError: With the errors of the failed groups
+        """
+        with self._cond:
+            errors = [f"group {seq}: {self._failed[seq]}" for seq in seqs if seq in self._failed]
+        if errors:
+            raise WriteFailedError(f"Queued writes were not committed ({'; '.join(errors)})")
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Commit everything queued so far"""
+        with self._cond:
+            seq = self._next_seq - 1
+        return self.wait(seq, timeout)
+
+    def _take_batch(self) -> List[WriteGroup]:
+        """Wait for work, then take all pending groups (lock held by caller)"""
+        while not self._pending and not self._closing:
+            self._cond.wait()
+
+        deadline = time.monotonic() + self.flush_interval
+        while (self._pending and not self._closing and not self._flush_requested
+               and self._pending_ops < self.max_batch):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+        batch, self._pending = self._pending, []
+        self._pending_ops = 0
+        self._flush_requested = False
+        return batch
+
+    def _commit(self, conn: sqlite3.Connection, groups: List[WriteGroup]):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for _, ops, _ in groups:
+                for sql, params in ops:
+                    conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _run(self):
+        conn = self._connect()
+
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+                closing = self._closing
+
+            if batch:
+                start = time.perf_counter()
+                failed = {}
+                try:
+                    self._commit(conn, batch)
+                except Exception as e:
+                    # Isolate the failing group(s); commit the rest one by one
+                    logger.error(f"Event writer batch failed ({e}), retrying groups individually")
+                    for group in batch:
+                        try:
+                            self._commit(conn, [group])
+                        except Exception as group_error:
+                            failed[group[0]] = str(group_error)
+                            logger.error(f"Event writer dropped write group {group[0]}: {group_error}")
+
+                elapsed = time.perf_counter() - start
+                GROUP_COMMIT_SECONDS.observe(elapsed)
+
+                # Before completed_seq moves: read-your-writes sees the callbacks' effects
+                for seq, _, callbacks in batch:
+                    if seq in failed:
+                        continue
+                    for callback in callbacks:
+                        try:
+                            callback()
+                        except Exception as e:
+                            logger.error(f"Event writer commit callback failed (group {seq}): {e}")
+
+                with self._cond:
+                    self.commits += 1
+                    self.statements += sum(len(ops) for seq, ops, _ in batch if seq not in failed)
+                    self.total_commit_time += elapsed
+                    self.failed_groups += len(failed)
+                    self._failed.update(failed)
+                    while len(self._failed) > MAX_REMEMBERED_FAILURES:
+                        self._failed.popitem(last=False)
+                    self.completed_seq = batch[-1][0]
+                    self._cond.notify_all()
+
+            if closing and not batch:
+                break
+
+        # Durable shutdown: move the WAL into the main database file
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            logger.warning(f"WAL checkpoint on shutdown failed: {e}")
+        conn.close()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'pending_groups': len(self._pending),
+                'pending_statements': self._pending_ops,
+                'commits': self.commits,
+                'statements': self.statements,
+                'avg_batch': round(self.statements / self.commits, 1) if self.commits else 0.0,
+                'avg_commit_ms': round(self.total_commit_time / self.commits * 1000, 2) if self.commits else 0.0,
+                'failed_groups': self.failed_groups
+            }
+
+    def close(self, timeout: float = 30.0):
+        """Flush all queued writes and stop the writer thread"""
+        with self._cond:
+            if self._closing:
+                return
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        logger.info("Event writer flushed and stopped")
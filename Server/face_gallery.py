@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Face Gallery - Vectorized Embedding Search
+==========================================
+Keeps all known face embeddings as one contiguous, L2-normalized
+float32 matrix plus a parallel person-id array.
+
+Cosine distance to every sample is a single matrix product, and the
+two nearest samples (needed for the d1/d2 margin logic) are picked
+with a partial selection instead of a full sort.
+"""
+
+import logging
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Distance reported when no (second) neighbour exists
+NO_MATCH_DISTANCE = 999.0
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize embeddings row-wise
+
+    Args:
+        embeddings: (n, d) or (d,) array
+
+    Returns:
+        Contiguous float32 (n, d) array with unit-length rows
+    """
+    matrix = np.array(embeddings, dtype=np.float32, copy=True, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix)
+
+
+class FaceGallery:
+    """
+    Immutable gallery of normalized face embeddings
+
+    Attributes:
+        matrix: (n, d) float32, L2-normalized rows
+        person_ids: (n,) int64, person id for each row
+        sample_ids: (n,) int64, face_sample id for each row (-1 if unknown)
+    """
+
+    def __init__(
+        self,
+        matrix: Optional[np.ndarray] = None,
+        person_ids: Optional[np.ndarray] = None,
+        sample_ids: Optional[np.ndarray] = None
+    ):
+        if matrix is None or len(matrix) == 0:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self.person_ids = np.zeros(0, dtype=np.int64)
+            self.sample_ids = np.zeros(0, dtype=np.int64)
+        else:
+            self.matrix = normalize_embeddings(matrix)
+            self.person_ids = np.asarray(person_ids, dtype=np.int64)
+            if sample_ids is None:
+                self.sample_ids = np.full(len(self.person_ids), -1, dtype=np.int64)
+            else:
+                self.sample_ids = np.asarray(sample_ids, dtype=np.int64)
+
+        if not len(self.matrix) == len(self.person_ids) == len(self.sample_ids):
+            raise ValueError("matrix, person_ids and sample_ids must have the same length")
+
+    @classmethod
+    def _from_normalized(cls, matrix: np.ndarray, person_ids: np.ndarray, sample_ids: np.ndarray) -> 'FaceGallery':
+        """Build gallery from rows that are already normalized (skips normalization)"""
+        gallery = cls.__new__(cls)
+        gallery.matrix = matrix
+        gallery.person_ids = person_ids
+        gallery.sample_ids = sample_ids
+        return gallery
+
+    @classmethod
+    def from_pairs(cls, known_embeddings: List[Tuple[int, np.ndarray]]) -> 'FaceGallery':
+        """Build gallery from a list of (person_id, embedding) tuples"""
+        if not known_embeddings:
+            return cls()
+
+        person_ids = np.fromiter((pid for pid, _ in known_embeddings), dtype=np.int64,
+                                 count=len(known_embeddings))
+        matrix = np.stack([np.asarray(emb, dtype=np.float32).ravel() for _, emb in known_embeddings])
+        return cls(matrix, person_ids)
+
+    def __len__(self) -> int:
+        return len(self.person_ids)
+
+    def with_sample(self, sample_id: int, person_id: int, embedding: np.ndarray) -> 'FaceGallery':
+        """Return a new gallery with one sample appended"""
+        row = normalize_embeddings(np.asarray(embedding, dtype=np.float32).ravel())
+        matrix = row if len(self) == 0 else np.vstack([self.matrix, row])
+        return FaceGallery._from_normalized(
+            matrix,
+            np.append(self.person_ids, np.int64(person_id)),
+            np.append(self.sample_ids, np.int64(sample_id))
+        )
+
+    def filtered(self, keep: np.ndarray) -> 'FaceGallery':
+        """Return a new gallery with only the rows where keep is True"""
+        if keep.all():
+            return self
+        return FaceGallery._from_normalized(
+            np.ascontiguousarray(self.matrix[keep]),
+            self.person_ids[keep],
+            self.sample_ids[keep]
+        )
+
+    def relabeled(self, from_person_id: int, into_person_id: int) -> 'FaceGallery':
+        """Return a new gallery with from_person_id's samples moved to into_person_id"""
+        person_ids = np.where(self.person_ids == from_person_id, into_person_id, self.person_ids)
+        return FaceGallery._from_normalized(self.matrix, person_ids, self.sample_ids)
+
+    def search(self, queries: np.ndarray, k: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest samples for each query (cosine distance)
+
+        Args:
+            queries: (n, d) or (d,) query embeddings (need not be normalized)
+            k: Number of neighbours to return
+
+        Returns:
+            (person_ids, distances), both shaped (n, k) and sorted by
+            ascending distance. Missing neighbours (gallery smaller than k)
+            are padded with person_id -1 and NO_MATCH_DISTANCE.
+        """
+        queries = normalize_embeddings(queries)
+        n = len(queries)
+
+        out_ids = np.full((n, k), -1, dtype=np.int64)
+        out_dist = np.full((n, k), NO_MATCH_DISTANCE, dtype=np.float64)
+
+        size = len(self)
+        if size == 0 or n == 0:
+            return out_ids, out_dist
+
+        # Cosine distance = 1 - cosine similarity (rows are unit length)
+        distances = 1.0 - queries @ self.matrix.T
+
+        kk = min(k, size)
+        if kk < size:
+            top = np.argpartition(distances, kk - 1, axis=1)[:, :kk]
+        else:
+            top = np.broadcast_to(np.arange(size), (n, size))
+
+        top_dist = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        out_ids[:, :kk] = self.person_ids[top]
+        out_dist[:, :kk] = np.take_along_axis(top_dist, order, axis=1)
+        return out_ids, out_dist
+
+
+class GalleryCache:
+    """
+    In-memory copy of the face gallery and person names
+
+    Owned by Database: loaded once, then kept consistent by the write
+    methods (add/delete sample, create/rename/merge/delete person)
+    instead of re-reading face_sample on every upload.
+
+    Readers get an immutable FaceGallery snapshot; writers swap in a new
+    one under the lock, so matching never sees a half-applied update.
+
+    With index mode 'ivf', galleries of at least exact_threshold samples
+    are additionally served through an approximate IVFIndex (ann_index.py)
+    that receives the same incremental updates.
+    """
+
+    def __init__(self, index_config: Optional[Dict] = None):
+        index_config = index_config or {}
+        self.index_mode = index_config.get('mode', 'exact')
+        self.exact_threshold = index_config.get('exact_threshold', 5000)
+        self.nlist = index_config.get('nlist', 0)
+        self.nprobe = index_config.get('nprobe', 8)
+
+        self._lock = Lock()
+        self._gallery = None
+        self._index = None
+        self._names: Dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.name_hits = 0
+        self.name_misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._gallery is not None
+
+    def load(self, samples: Iterable[Tuple[int, int, np.ndarray]], names: Dict[int, str]) -> FaceGallery:
+        """
+        Replace cache contents
+
+        Args:
+            samples: (sample_id, person_id, embedding) for all active samples
+            names: {person_id: name} for all active persons
+
+        Returns:
+            The freshly loaded gallery
+        """
+        samples = list(samples)
+        if samples:
+            gallery = FaceGallery(
+                np.stack([np.asarray(emb, dtype=np.float32).ravel() for _, _, emb in samples]),
+                np.fromiter((pid for _, pid, _ in samples), dtype=np.int64, count=len(samples)),
+                np.fromiter((sid for sid, _, _ in samples), dtype=np.int64, count=len(samples))
+            )
+        else:
+            gallery = FaceGallery()
+
+        with self._lock:
+            self._gallery = gallery
+            self._index = None
+            self._names = dict(names)
+            self._update_index_mode()
+
+        logger.info(f"Gallery cache loaded: {len(gallery)} samples, {len(names)} persons")
+        return gallery
+
+    def invalidate(self):
+        """Drop cached data; next access reloads from the database"""
+        with self._lock:
+            self._gallery = None
+            self._index = None
+            self._names = {}
+
+    def snapshot(self):
+        """
+        Current searchable gallery, or None if not loaded (counted as a miss)
+
+        Returns the exact FaceGallery, or the IVFIndex once the gallery is
+        large enough for approximate search. Both provide search().
+        """
+        with self._lock:
+            if self._gallery is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._index if self._index is not None else self._gallery
+
+    def _update_index_mode(self):
+        """Build, rebuild or drop the IVF index depending on gallery size (lock held)"""
+        if self.index_mode != 'ivf' or self._gallery is None:
+            return
+
+        size = len(self._gallery)
+        if size < self.exact_threshold:
+            if self._index is not None:
+                logger.info(f"Gallery below {self.exact_threshold} samples, using exact search")
+            self._index = None
+        elif self._index is None or size >= 2 * self._index.trained_size:
+            # Import here: only needed for very large galleries
+            from ann_index import IVFIndex
+            index = IVFIndex(nlist=self.nlist, nprobe=self.nprobe)
+            index.build(self._gallery)
+            self._index = index
+
+    def get_name(self, person_id: int) -> Optional[str]:
+        """Cached person name, or None if unknown (counted as a miss)"""
+        with self._lock:
+            name = self._names.get(person_id)
+            if name is None:
+                self.name_misses += 1
+            else:
+                self.name_hits += 1
+            return name
+
+    def set_name(self, person_id: int, name: str):
+        with self._lock:
+            self._names[person_id] = name
+
+    def add_sample(self, sample_id: int, person_id: int, embedding: np.ndarray):
+        with self._lock:
+            # Already there if the gallery was (re)loaded after the sample's commit
+            if self._gallery is not None and not (self._gallery.sample_ids == sample_id).any():
+                self._gallery = self._gallery.with_sample(sample_id, person_id, embedding)
+                if self._index is not None:
+                    self._index.add(sample_id, person_id, embedding)
+                self._update_index_mode()
+
+    def remove_sample(self, sample_id: int):
+        with self._lock:
+            if self._gallery is not None:
+                self._gallery = self._gallery.filtered(self._gallery.sample_ids != sample_id)
+                if self._index is not None:
+                    self._index.remove(sample_id)
+                self._update_index_mode()
+
+    def merge_person(self, from_id: int, into_id: int):
+        with self._lock:
+            if self._gallery is not None:
+                self._gallery = self._gallery.relabeled(from_id, into_id)
+                if self._index is not None:
+                    self._index.relabel(from_id, into_id)
+            self._names.pop(from_id, None)
+
+    def remove_person(self, person_id: int):
+        with self._lock:
+            if self._gallery is not None:
+                self._gallery = self._gallery.filtered(self._gallery.person_ids != person_id)
+                if self._index is not None:
+                    self._index.remove_person(person_id)
+                self._update_index_mode()
+            self._names.pop(person_id, None)
+
+    def stats(self) -> Dict:
+        """Cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                'loaded': self._gallery is not None,
+                'samples': len(self._gallery) if self._gallery is not None else 0,
+                'persons': len(self._names),
+                'hits': self.hits,
+                'misses': self.misses,
+                'name_hits': self.name_hits,
+                'name_misses': self.name_misses,
+                'index_mode': 'ivf' if self._index is not None else 'exact',
+                'index': self._index.stats() if self._index is not None else None
+            }
@@ -14,13 +14,198 @@ No PyTorch, no dlib, no heavy dependencies.
 import cv2
 import numpy as np
 import logging
+import time
+import queue
+from contextlib import contextmanager
+from threading import Lock
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 from io import BytesIO
 from PIL import Image
 
+import metrics
+from face_gallery import FaceGallery, NO_MATCH_DISTANCE
+
 logger = logging.getLogger(__name__)
 
+# Per-stage latency of process_image (in this process; worker processes
+# of execution mode 'process' are only visible as the upload's recognition stage)
+RECOGNITION_STAGE_SECONDS = metrics.histogram(
+    'facerec_recognition_stage_seconds',
+    'Latency of the face recognition stages (decode, model_wait, detect, embed, match)',
+    ['stage'],
+    trace_prefix=''
+)
+
+class DecodedFrame:
+    """
+    JPEG frame decoded at most once per upload
+
+    Shared by detection, alignment, embedding and cropping so that a
+    frame with several faces is not decoded again for every step.
+    """
+
+    def __init__(self, image_bytes: bytes):
+        self.image_bytes = image_bytes
+        self._image = None
+        self._decoded = False
+        self._scaled = {}
+
+    @classmethod
+    def wrap(cls, image: Union[bytes, 'DecodedFrame']) -> 'DecodedFrame':
+        """Return image unchanged if already a DecodedFrame, else wrap the bytes"""
+        return image if isinstance(image, DecodedFrame) else cls(image)
+
+    @property
+    def image(self) -> Optional[np.ndarray]:
+        """Decoded BGR image (None if the bytes are not a valid image)"""
+        if not self._decoded:
+            img_array = np.frombuffer(self.image_bytes, dtype=np.uint8)
+            self._image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            self._decoded = True
+        return self._image
+
+    def scaled(self, scale: float) -> Optional[np.ndarray]:
+        """Downscaled copy of the image (cached per scale)"""
+        if scale >= 1.0:
+            return self.image
+
+        if scale not in self._scaled:
+            img = self.image
+            if img is None:
+                return None
+            self._scaled[scale] = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self._scaled[scale]
+
+    def crop(self, bbox: List[int], padding: float = 0.2) -> Optional['FaceCrop']:
+        """
+        Crop face region with padding (not encoded until needed)
+
+        Args:
+            bbox: [x, y, w, h]
+            padding: Padding ratio (0.2 = 20% on each side)
+
+        Returns:
+            FaceCrop or None if the frame could not be decoded
+        """
+        img = self.image
+        if img is None:
+            return None
+
+        h, w = img.shape[:2]
+        x, y, fw, fh = bbox
+
+        # Add padding
+        pad_w = int(fw * padding)
+        pad_h = int(fh * padding)
+
+        x1 = max(0, x - pad_w)
+        y1 = max(0, y - pad_h)
+        x2 = min(w, x + fw + pad_w)
+        y2 = min(h, y + fh + pad_h)
+
+        return FaceCrop(img[y1:y2, x1:x2])
+
+
+class FaceCrop:
+    """
+    Face crop that is JPEG-encoded lazily
+
+    Only crops that are actually persisted (new person, auto-learning)
+    pay for the encode.
+    """
+
+    def __init__(self, pixels: np.ndarray, jpeg_quality: int = 90):
+        self.pixels = pixels
+        self.jpeg_quality = jpeg_quality
+        self._jpeg = None
+
+    def tobytes(self) -> bytes:
+        """Encode crop as JPEG (cached)"""
+        if self._jpeg is None:
+            _, buffer = cv2.imencode('.jpg', self.pixels, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            self._jpeg = buffer.tobytes()
+        return self._jpeg
+
+
+class ModelPair:
+    """
+    One YuNet detector + SFace recognizer
+
+    cv2 model objects are not thread-safe (detect_faces mutates the
+    detector input size), so a pair is only ever used by one request at
+    a time via ModelPool.checkout().
+    """
+
+    def __init__(self, detector, recognizer):
+        self.detector = detector
+        self.recognizer = recognizer
+        self.input_size = None
+
+    def set_input_size(self, size: Tuple[int, int]):
+        """Set detector input size, skipping the call if it is unchanged"""
+        if size != self.input_size:
+            self.detector.setInputSize(size)
+            self.input_size = size
+
+
+class ModelPool:
+    """
+    Bounded pool of ModelPairs shared by concurrent requests
+
+    Requests check out a pair for the duration of their pipeline. When all
+    pairs are busy the request blocks; wait time is recorded in stats().
+    """
+
+    def __init__(self, factory, size: int = 1):
+        self.size = max(1, size)
+        self._pairs = queue.Queue()
+        for _ in range(self.size):
+            self._pairs.put(factory())
+
+        self._stats_lock = Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a ModelPair (blocks while the pool is exhausted)"""
+        waited = 0.0
+        try:
+            pair = self._pairs.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter()
+            pair = self._pairs.get()
+            waited = time.perf_counter() - start
+            logger.debug(f"Model pool exhausted, waited {waited * 1000:.1f} ms")
+
+        with self._stats_lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+        try:
+            yield pair
+        finally:
+            self._pairs.put(pair)
+
+    def stats(self) -> Dict:
+        """Pool size, availability and wait-time statistics"""
+        with self._stats_lock:
+            return {
+                'size': self.size,
+                'available': self._pairs.qsize(),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'avg_wait_ms': round(self.total_wait / self.waits * 1000, 2) if self.waits else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2)
+            }
+
+
 class FaceRecognitionCV:
     """
     Face Recognition using OpenCV YuNet (detection) + SFace (embedding)
@@ -40,13 +225,23 @@ class FaceRecognitionCV:
         self.min_face_size = config['face_recognition']['min_face_size']
         self.min_quality_score = config['face_recognition']['min_quality_score']
 
+        # Reduced-resolution detection
+        detection = config['face_recognition'].get('detection', {})
+        self.detect_downscale = detection.get('downscale', False)
+        self.detect_min_face_px = detection.get('min_face_px', 40)
+
         # Models
         models_dir = Path(__file__).parent / 'models'
         self.yunet_model = models_dir / 'face_detection_yunet_2023mar.onnx'
         self.sface_model = models_dir / 'face_recognition_sface_2021dec.onnx'
 
-        self.detector = None
-        self.recognizer = None
+        # Pool of detector/recognizer pairs for concurrent requests
+        self.pool_size = config['face_recognition'].get('model_pool_size', 1)
+        self.models = None
+
+        # Optional: batch SFace forward passes across faces and requests
+        self.batching = config['face_recognition'].get('batching', {})
+        self.batcher = None
 
         if self.enabled:
             self._load_models()
@@ -65,58 +260,98 @@ class FaceRecognitionCV:
                 logger.error("Run: python server/models/download_models.py")
                 raise FileNotFoundError(f"SFace model missing: {self.sface_model}")
 
-            # Load YuNet (Face Detector)
-            self.detector = cv2.FaceDetectorYN.create(
-                model=str(self.yunet_model),
-                config="",
-                input_size=(320, 320),
-                score_threshold=0.6,
-                nms_threshold=0.3,
-                top_k=5000
-            )
+            self.models = ModelPool(self._create_model_pair, self.pool_size)
 
-            # Load SFace (Face Recognizer)
-            self.recognizer = cv2.FaceRecognizerSF.create(
-                model=str(self.sface_model),
-                config=""
-            )
+            if self.batching.get('enabled', False):
+                from embedding_batcher import EmbeddingBatcher
+                self.batcher = EmbeddingBatcher(
+                    self.sface_model,
+                    window_ms=self.batching.get('window_ms', 10),
+                    max_batch=self.batching.get('max_batch', 16)
+                )
 
-            logger.info("✓ YuNet and SFace models loaded successfully")
+            logger.info(f"✓ YuNet and SFace models loaded successfully (pool size: {self.models.size})")
 
         except Exception as e:
             logger.error(f"Failed to load models: {e}")
             self.enabled = False
             raise
 
-    def detect_faces(self, image_bytes: bytes) -> List[Dict]:
+    def _create_model_pair(self) -> ModelPair:
+        """Load one YuNet + SFace pair"""
+        # Load YuNet (Face Detector)
+        detector = cv2.FaceDetectorYN.create(
+            model=str(self.yunet_model),
+            config="",
+            input_size=(320, 320),
+            score_threshold=0.6,
+            nms_threshold=0.3,
+            top_k=5000
+        )
+
+        # Load SFace (Face Recognizer)
+        recognizer = cv2.FaceRecognizerSF.create(
+            model=str(self.sface_model),
+            config=""
+        )
+
+        return ModelPair(detector, recognizer)
+
+    @contextmanager
+    def _use_models(self, models: Optional[ModelPair]):
+        """Use the given ModelPair, or check one out of the pool"""
+        if models is not None:
+            yield models
+        else:
+            start = time.perf_counter()
+            with self.models.checkout() as models:
+                RECOGNITION_STAGE_SECONDS.observe(time.perf_counter() - start, stage='model_wait')
+                yield models
+
+    def detect_faces(self, image: Union[bytes, 'DecodedFrame'], models: Optional[ModelPair] = None) -> List[Dict]:
         """
         Detect faces in image
 
+        Args:
+            image: JPEG bytes or DecodedFrame
+            models: ModelPair already checked out by the caller (optional)
+
         Returns:
-            List of face dicts with keys: bbox, landmarks, score
+            List of face dicts with keys: bbox, landmarks, score, quality_score, detection
         """
         if not self.enabled:
             return []
 
         try:
-            # Convert bytes to numpy array
-            img_array = np.frombuffer(image_bytes, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            frame = DecodedFrame.wrap(image)
+            img = frame.image
 
             if img is None:
                 logger.error("Failed to decode image")
                 return []
 
-            # Set input size for detector
             h, w = img.shape[:2]
-            self.detector.setInputSize((w, h))
 
-            # Detect faces
-            _, faces = self.detector.detect(img)
+            # Run YuNet on a downscaled copy if configured
+            scale = self.detection_scale()
+            detect_img = frame.scaled(scale)
+            dh, dw = detect_img.shape[:2]
+
+            with self._use_models(models) as pair:
+                # Set input size for detector (only changes per resolution)
+                pair.set_input_size((dw, dh))
+
+                # Detect faces
+                _, faces = pair.detector.detect(detect_img)
 
             if faces is None:
                 return []
 
+            # Map boxes and landmarks back to full-resolution coordinates
+            if detect_img is not img:
+                faces = faces.copy()
+                faces[:, 0:14] *= np.tile(np.array([w / dw, h / dh], dtype=np.float32), 7)
+
             # Parse detections
             face_list = []
             for face in faces:
@@ -135,7 +370,8 @@ class FaceRecognitionCV:
                     'bbox': bbox,
                     'landmarks': landmarks,
                     'score': score,
-                    'quality_score': quality_score
+                    'quality_score': quality_score,
+                    'detection': face[:15].astype(np.float32)  # Raw YuNet row for alignCrop
                 })
 
             logger.debug(f"Detected {len(face_list)} faces")
@@ -145,13 +381,75 @@ class FaceRecognitionCV:
             logger.error(f"Face detection error: {e}")
             return []
 
-    def extract_embedding(self, image_bytes: bytes, face: Dict) -> Optional[np.ndarray]:
+    def align_face(
+        self,
+        image: Union[bytes, 'DecodedFrame'],
+        face: Dict,
+        models: Optional[ModelPair] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Align and crop face to 112x112 using its landmarks (SFace input)
+
+        Args:
+            image: Original image as JPEG bytes or DecodedFrame
+            face: Face dict from detect_faces()
+            models: ModelPair already checked out by the caller (optional)
+
+        Returns:
+            Aligned BGR face or None
+        """
+        img = DecodedFrame.wrap(image).image
+
+        if img is None:
+            return None
+
+        with self._use_models(models) as pair:
+            return pair.recognizer.alignCrop(img, self._detection_row(face))
+
+    @staticmethod
+    def _detection_row(face: Dict) -> np.ndarray:
+        """
+        Full-resolution YuNet row [x, y, w, h, 5 landmarks, score]
+
+        alignCrop reads the landmarks at columns 4-13 of this row, so it
+        must be given the whole detection, not just the landmarks.
+        """
+        if 'detection' in face:
+            return face['detection'].reshape(1, -1)
+        row = list(face['bbox']) + [c for point in face['landmarks'] for c in point] + [face.get('score', 0.0)]
+        return np.array([row], dtype=np.float32)
+
+    def detection_scale(self) -> float:
+        """
+        Downscale factor for detection, derived from min_face_size
+
+        The smallest face of interest (sqrt(min_face_size) px wide at full
+        resolution) is shrunk to about min_face_px, which YuNet still finds
+        reliably. Never upscales.
+        """
+        if not self.detect_downscale or self.min_face_size <= 0:
+            return 1.0
+
+        scale = self.detect_min_face_px / np.sqrt(self.min_face_size)
+        # Round to a few fixed steps so the detector input size stays cached
+        for step in (0.25, 0.5, 0.75):
+            if scale <= step:
+                return step
+        return 1.0
+
+    def extract_embedding(
+        self,
+        image: Union[bytes, 'DecodedFrame'],
+        face: Dict,
+        models: Optional[ModelPair] = None
+    ) -> Optional[np.ndarray]:
         """
         Extract embedding for detected face
 
         Args:
-            image_bytes: Original image as bytes
+            image: Original image as JPEG bytes or DecodedFrame
             face: Face dict from detect_faces()
+            models: ModelPair already checked out by the caller (optional)
 
         Returns:
             128-dim embedding vector or None
@@ -160,18 +458,15 @@ class FaceRecognitionCV:
             return None
 
         try:
-            # Convert bytes to numpy array
-            img_array = np.frombuffer(image_bytes, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            with self._use_models(models) as pair:
+                # Align face using landmarks (required for SFace)
+                aligned_face = self.align_face(image, face, pair)
 
-            if img is None:
-                return None
-
-            # Align face using landmarks (required for SFace)
-            aligned_face = self.recognizer.alignCrop(img, face['landmarks'])
+                if aligned_face is None:
+                    return None
 
-            # Extract feature (embedding)
-            embedding = self.recognizer.feature(aligned_face)
+                # Extract feature (embedding)
+                embedding = pair.recognizer.feature(aligned_face)
 
             # embedding is 1x128, flatten to 128
             return embedding.flatten()
@@ -180,12 +475,12 @@ class FaceRecognitionCV:
             logger.error(f"Embedding extraction error: {e}")
             return None
 
-    def crop_face(self, image_bytes: bytes, bbox: List[int], padding: float = 0.2) -> Optional[bytes]:
+    def crop_face(self, image: Union[bytes, 'DecodedFrame'], bbox: List[int], padding: float = 0.2) -> Optional[bytes]:
         """
         Crop face from image with padding
 
         Args:
-            image_bytes: Original image
+            image: Original image as JPEG bytes or DecodedFrame
             bbox: [x, y, w, h]
             padding: Padding ratio (0.2 = 20% on each side)
 
@@ -193,30 +488,8 @@ class FaceRecognitionCV:
             Cropped face as JPEG bytes
         """
         try:
-            img_array = np.frombuffer(image_bytes, dtype=np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-
-            if img is None:
-                return None
-
-            h, w = img.shape[:2]
-            x, y, fw, fh = bbox
-
-            # Add padding
-            pad_w = int(fw * padding)
-            pad_h = int(fh * padding)
-
-            x1 = max(0, x - pad_w)
-            y1 = max(0, y - pad_h)
-            x2 = min(w, x + fw + pad_w)
-            y2 = min(h, y + fh + pad_h)
-
-            # Crop
-            cropped = img[y1:y2, x1:x2]
-
-            # Encode to JPEG
-            _, buffer = cv2.imencode('.jpg', cropped, [cv2.IMWRITE_JPEG_QUALITY, 90])
-            return buffer.tobytes()
+            crop = DecodedFrame.wrap(image).crop(bbox, padding)
+            return crop.tobytes() if crop is not None else None
 
         except Exception as e:
             logger.error(f"Face crop error: {e}")
@@ -225,14 +498,14 @@ class FaceRecognitionCV:
     def match_embedding(
         self,
         query_embedding: np.ndarray,
-        known_embeddings: List[Tuple[int, np.ndarray]]
+        known_embeddings: Union[FaceGallery, List[Tuple[int, np.ndarray]]]
     ) -> Dict:
         """
         Match query embedding against known embeddings
 
         Args:
             query_embedding: 128-dim vector
-            known_embeddings: List of (person_id, embedding) tuples
+            known_embeddings: FaceGallery/IVFIndex or list of (person_id, embedding) tuples
 
         Returns:
             {
@@ -243,35 +516,55 @@ class FaceRecognitionCV:
                 'confidence': float (0-100)
             }
         """
-        if not known_embeddings:
+        return self.match_embeddings([query_embedding], known_embeddings)[0]
+
+    def match_embeddings(
+        self,
+        query_embeddings: Union[np.ndarray, List[np.ndarray]],
+        known_embeddings: Union[FaceGallery, List[Tuple[int, np.ndarray]]]
+    ) -> List[Dict]:
+        """
+        Match several query embeddings (e.g. all faces of one frame) in one call
+
+        Args:
+            query_embeddings: (n, 128) array or list of 128-dim vectors
+            known_embeddings: FaceGallery/IVFIndex or list of (person_id, embedding) tuples
+
+        Returns:
+            List of match results (see match_embedding), one per query
+        """
+        gallery = known_embeddings
+        if isinstance(gallery, list):
+            gallery = FaceGallery.from_pairs(known_embeddings)
+
+        if len(query_embeddings) == 0:
+            return []
+
+        queries = np.stack([np.asarray(q, dtype=np.float32).ravel() for q in query_embeddings])
+
+        # Top-2 nearest samples per query (d1 = best, d2 = second best)
+        person_ids, distances = gallery.search(queries, k=2)
+
+        results = []
+        for ids, dists in zip(person_ids, distances):
+            best_person_id = int(ids[0]) if ids[0] >= 0 else None
+            result = self._classify_match(best_person_id, float(dists[0]), float(dists[1]))
+            logger.debug(f"Match result: {result}")
+            results.append(result)
+
+        return results
+
+    def _classify_match(self, best_person_id: Optional[int], d1: float, d2: float) -> Dict:
+        """Turn best/second-best distances into a GREEN/YELLOW/UNKNOWN decision"""
+        if best_person_id is None:
             return {
                 'person_id': None,
-                'distance': 999.0,
+                'distance': NO_MATCH_DISTANCE,
                 'margin': 0.0,
                 'status': 'UNKNOWN',
                 'confidence': 0.0
             }
 
-        # Calculate distances to all known embeddings
-        distances = []
-        for person_id, emb in known_embeddings:
-            # Cosine distance (SFace uses L2-normalized embeddings)
-            dist = self.recognizer.match(
-                query_embedding.reshape(1, -1),
-                emb.reshape(1, -1),
-                dis_type=cv2.FaceRecognizerSF_FR_COSINE
-            )
-            distances.append((person_id, float(dist)))
-
-        # Sort by distance
-        distances.sort(key=lambda x: x[1])
-
-        # Best match
-        best_person_id, d1 = distances[0]
-
-        # Second best (for margin calculation)
-        d2 = distances[1][1] if len(distances) > 1 else 999.0
-
         # Margin (how much better is best vs second best)
         margin = d2 - d1
 
@@ -294,7 +587,7 @@ class FaceRecognitionCV:
         margin_bonus = min(margin / self.m_strict * 20, 20)
         confidence = min(100, base_conf + margin_bonus)
 
-        result = {
+        return {
             'person_id': best_person_id if status != 'UNKNOWN' else None,
             'distance': d1,
             'margin': margin,
@@ -302,9 +595,6 @@ class FaceRecognitionCV:
             'confidence': round(confidence, 1)
         }
 
-        logger.debug(f"Match result: {result}")
-        return result
-
     def is_quality_acceptable(self, face: Dict) -> bool:
         """
         Check if face quality is acceptable for learning
@@ -329,17 +619,118 @@ class FaceRecognitionCV:
 
         return True
 
+    def extract_faces(
+        self,
+        image: Union[bytes, DecodedFrame],
+        models: Optional[ModelPair] = None
+    ) -> List[Tuple[Dict, np.ndarray]]:
+        """
+        Detect faces and extract their embeddings (the model-bound half of process_image)
+
+        Args:
+            image: Image as JPEG bytes or DecodedFrame
+            models: ModelPair already checked out by the caller (optional)
+
+        Returns:
+            List of (face dict, 128-dim embedding) tuples
+        """
+        frame = DecodedFrame.wrap(image)
+        embedded = []
+
+        # One detector/recognizer pair for the whole frame
+        with self._use_models(models) as pair:
+            # Detect faces
+            with RECOGNITION_STAGE_SECONDS.time(stage='detect'):
+                faces = self.detect_faces(frame, pair)
+
+            if not faces:
+                logger.debug("No faces detected")
+                return []
+
+            embed_start = time.perf_counter()
+
+            if self.batcher is None:
+                # Extract embeddings (one forward pass per face)
+                for face in faces:
+                    embedding = self.extract_embedding(frame, face, pair)
+
+                    if embedding is not None:
+                        embedded.append((face, embedding))
+
+                RECOGNITION_STAGE_SECONDS.observe(time.perf_counter() - embed_start, stage='embed')
+                return embedded
+
+            aligned = []
+            for face in faces:
+                try:
+                    aligned_face = self.align_face(frame, face, pair)
+                except Exception as e:
+                    logger.error(f"Face alignment error: {e}")
+                    continue
+                if aligned_face is not None:
+                    aligned.append((face, aligned_face))
+
+        # Batched SFace pass, shared with concurrent requests (model pair already released)
+        embeddings = self.batcher.embed([aligned_face for _, aligned_face in aligned])
+        RECOGNITION_STAGE_SECONDS.observe(time.perf_counter() - embed_start, stage='embed')
+
+        for (face, _), embedding in zip(aligned, embeddings):
+            if embedding is not None:
+                embedded.append((face, embedding.flatten()))
+
+        return embedded
+
+    def build_results(
+        self,
+        frame: DecodedFrame,
+        embedded: List[Tuple[Dict, np.ndarray]],
+        known_embeddings: Union[FaceGallery, List[Tuple[int, np.ndarray]]]
+    ) -> List[Dict]:
+        """
+        Match extracted faces and attach lazy face crops (see process_image)
+
+        Args:
+            frame: Frame the faces were extracted from
+            embedded: Output of extract_faces()
+            known_embeddings: FaceGallery/IVFIndex or list of (person_id, embedding)
+
+        Returns:
+            Result dicts as returned by process_image()
+        """
+        # Match all faces of this frame in one batched call
+        if isinstance(known_embeddings, list):
+            known_embeddings = FaceGallery.from_pairs(known_embeddings)
+        with RECOGNITION_STAGE_SECONDS.time(stage='match'):
+            match_results = self.match_embeddings([emb for _, emb in embedded], known_embeddings)
+
+        results = []
+
+        for (face, embedding), match_result in zip(embedded, match_results):
+            # Crop face (JPEG encoding deferred until the crop is saved)
+            face_crop = frame.crop(face['bbox'])
+
+            results.append({
+                'bbox': face['bbox'],
+                'landmarks': face['landmarks'],
+                'embedding': embedding,
+                'quality_score': face['quality_score'],
+                'match_result': match_result,
+                'face_crop': face_crop
+            })
+
+        return results
+
     def process_image(
         self,
-        image_bytes: bytes,
-        known_embeddings: List[Tuple[int, np.ndarray]]
+        image_bytes: Union[bytes, DecodedFrame],
+        known_embeddings: Union[FaceGallery, List[Tuple[int, np.ndarray]]]
     ) -> List[Dict]:
         """
         Complete pipeline: detect faces, extract embeddings, match
 
         Args:
-            image_bytes: Image as bytes
-            known_embeddings: List of (person_id, embedding) from DB
+            image_bytes: Image as JPEG bytes or DecodedFrame
+            known_embeddings: FaceGallery/IVFIndex or list of (person_id, embedding) from DB
 
         Returns:
             List of results:
@@ -350,7 +741,7 @@ class FaceRecognitionCV:
                     'embedding': np.ndarray,
                     'quality_score': float,
                     'match_result': {...},
-                    'face_crop': bytes
+                    'face_crop': FaceCrop (call .tobytes() to encode)
                 },
                 ...
             ]
@@ -359,36 +750,17 @@ class FaceRecognitionCV:
             logger.warning("Face recognition is disabled")
             return []
 
-        # Detect faces
-        faces = self.detect_faces(image_bytes)
-
-        if not faces:
-            logger.debug("No faces detected")
-            return []
-
-        results = []
-
-        for face in faces:
-            # Extract embedding
-            embedding = self.extract_embedding(image_bytes, face)
-
-            if embedding is None:
-                continue
+        # Decode once, shared by all pipeline steps
+        frame = DecodedFrame.wrap(image_bytes)
+        with RECOGNITION_STAGE_SECONDS.time(stage='decode'):
+            frame.image  # Lazy property: decode here so the stage is timed on its own
 
-            # Match against known embeddings
-            match_result = self.match_embedding(embedding, known_embeddings)
+        embedded = self.extract_faces(frame)
 
-            # Crop face
-            face_crop = self.crop_face(image_bytes, face['bbox'])
+        if not embedded:
+            return []
 
-            results.append({
-                'bbox': face['bbox'],
-                'landmarks': face['landmarks'],
-                'embedding': embedding,
-                'quality_score': face['quality_score'],
-                'match_result': match_result,
-                'face_crop': face_crop
-            })
+        results = self.build_results(frame, embedded, known_embeddings)
 
         logger.info(f"Processed {len(results)} faces")
         return results
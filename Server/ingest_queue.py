@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Ingest Queue - Background Processing for /upload
+================================================
+Bounded job queue for the asynchronous upload mode.
+
+/upload only persists the image and enqueues a job; worker threads run
+face recognition, events, workflow and notifications. Job results can be
+polled via /api/jobs/<id>.
+"""
+
+import logging
+import queue
+import time
+import uuid
+from collections import deque
+from threading import Lock, Thread
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """
+    Bounded queue + worker threads with per-job status tracking
+
+    Args:
+        handler: Called as handler(**payload) for each job; its return
+                 value becomes the job result
+        max_size: Maximum queued (not yet running) jobs
+        workers: Number of worker threads
+        max_finished: Finished jobs kept for status queries
+    """
+
+    def __init__(self, handler: Callable, max_size: int = 100, workers: int = 2, max_finished: int = 1000):
+        self.handler = handler
+        self.max_finished = max_finished
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._jobs: Dict[str, Dict] = {}
+        self._finished = deque()
+        self._lock = Lock()
+
+        # Statistics
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.max_wait = 0.0
+
+        self._workers = []
+        for i in range(max(1, workers)):
+            worker = Thread(target=self._run, name=f"ingest-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        logger.info(f"Ingest queue started ({len(self._workers)} workers, max {max_size} jobs)")
+
+    def submit(self, **payload) -> Optional[str]:
+        """
+        Enqueue a job
+
+        Returns:
+            Job id, or None if the queue is full
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+
+        with self._lock:
+            self._jobs[job_id] = job
+
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                self.rejected += 1
+            logger.warning("Ingest queue full, rejecting upload")
+            return None
+
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job status dict (copy), or None if unknown/expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            job_id, payload = item
+            started = time.time()
+
+            with self._lock:
+                job = self._jobs[job_id]
+                job['status'] = 'running'
+                job['started_at'] = started
+                wait = started - job['submitted_at']
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            try:
+                result = self.handler(**payload)
+                status, error = 'done', None
+            except Exception as e:
+                logger.error(f"Ingest job {job_id} failed: {e}")
+                result, status, error = None, 'failed', str(e)
+
+            finished = time.time()
+
+            with self._lock:
+                job.update(status=status, result=result, error=error, finished_at=finished)
+                self.total_run += finished - started
+                if status == 'done':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+                # Keep only the most recent finished jobs
+                self._finished.append(job_id)
+                while len(self._finished) > self.max_finished:
+                    self._jobs.pop(self._finished.popleft(), None)
+
+    def stats(self) -> Dict:
+        """Queue depth, throughput and latency statistics"""
+        with self._lock:
+            processed = self.completed + self.failed
+            return {
+                'depth': self._queue.qsize(),
+                'capacity': self._queue.maxsize,
+                'max_depth': self.max_depth,
+                'workers': len(self._workers),
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_ms': round(self.total_wait / processed * 1000, 1) if processed else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 1),
+                'avg_run_ms': round(self.total_run / processed * 1000, 1) if processed else 0.0
+            }
+
+    def shutdown(self, timeout: float = 30.0):
+        """Let queued jobs finish, then stop the workers"""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Metrics - Latency Histograms, Counters and Gauges for /metrics
+==============================================================
+Minimal in-process metrics registry, rendered in the Prometheus text
+exposition format (no prometheus_client dependency).
+
+Cheap on the hot path, nothing to do when nobody scrapes:
+- Histogram.observe() is one bisect and three additions under a lock
+- Counter.inc() is one addition under a lock
+- Gauges are callbacks (usually an existing stats() method), evaluated
+  only while /metrics renders
+
+Metrics are module-level objects of the module they instrument:
+
+    DB_SECONDS = metrics.histogram('facerec_db_seconds', 'SQLite latency', ['op'])
+
+    with DB_SECONDS.time(op='commit'):
+        conn.execute("COMMIT")
+
+Per-request traces: while a Trace is active in a thread (tracing()),
+histograms created with a trace_prefix also add their observations to it,
+so one request's stage timings are collected by the same calls that feed
+the histograms.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds (1 ms .. 10 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+GaugeValue = Union[float, Dict[Tuple, float]]
+
+_local = threading.local()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter (per label combination)"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.labelnames:
+            values = [((), 0)]
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """
+    Latency histogram with fixed buckets (per label combination)
+
+    With a trace_prefix, observations are also added to the thread's
+    active Trace as stage '<prefix><first label value>'.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, trace_prefix: Optional[str] = None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.trace_prefix = trace_prefix
+        self._series: Dict[Tuple, List] = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        if self.trace_prefix is not None:
+            trace = getattr(_local, 'trace', None)
+            if trace is not None:
+                trace.add(self.trace_prefix + (key[0] if key else self.name), seconds)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block (also if it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Gauge computed at scrape time
+
+    The callback returns a number, a dict {label values tuple: number}
+    or None (gauge omitted, e.g. component disabled).
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Optional[GaugeValue]],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}"
+                for key, v in sorted(value.items()) if v is not None]
+
+
+class Trace:
+    """
+    Stage timings and facts of one request
+
+    Stages are summed if they occur more than once (e.g. one event write
+    per face) and kept in first-seen order.
+    """
+
+    def __init__(self, **info):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}  # stage -> seconds
+        self.info: Dict = dict(info)
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        """Seconds since the trace was started"""
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> Dict:
+        """Compact JSON-serializable form (times in ms)"""
+        return {
+            'total_ms': round(self.elapsed() * 1000, 1),
+            **self.info,
+            'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+        }
+
+
+@contextmanager
+def tracing(trace: Optional[Trace]):
+    """Make trace the calling thread's active trace (no-op for None)"""
+    if trace is None:
+        yield None
+        return
+    previous = getattr(_local, 'trace', None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def annotate(**info):
+    """Record facts (face count, gallery size, ...) in the active trace, if any"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.info.update(info)
+
+
+class MetricsRegistry:
+    """All metrics of the process, in registration order"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS, trace_prefix: Optional[str] = None) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets, trace_prefix))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], Optional[GaugeValue]],
+              labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                # A failing gauge callback must not break the scrape
+                logger.warning(f"Metric {metric.name} failed: {e}")
+                continue
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry
+registry = MetricsRegistry()
+counter = registry.counter
+histogram = registry.histogram
+gauge = registry.gauge
+render = registry.render
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Motion Detector - Server-Side Motion Detection on Stream Frames
+===============================================================
+Complements the PIR sensor: every live stream frame is compared with a
+per-device background model; when enough of the picture changes for a few
+consecutive frames, the frame is handed to the same recognition pipeline
+as /upload.
+
+Cheap by design (~1 ms per frame):
+- JPEG decoded directly at 1/8 size in grayscale (IMREAD_REDUCED_GRAYSCALE_8)
+- Vectorized NumPy differencing against a running-average background
+- Per-device state is one small float32 image; devices are capped (LRU)
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Decode scale -> OpenCV reduced grayscale flag
+_REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+}
+
+
+class _DeviceState:
+    __slots__ = ('background', 'motion_frames', 'last_trigger', 'last_score')
+
+    def __init__(self, background: np.ndarray):
+        self.background = background
+        self.motion_frames = 0
+        self.last_trigger = 0.0
+        self.last_score = 0.0
+
+
+class MotionDetector:
+    """
+    Frame-differencing motion detector with per-device background models
+
+    Args:
+        config: motion_detection config section
+            scale: JPEG decode scale (1, 2, 4 or 8)
+            pixel_threshold: Grey-level change that marks a pixel as changed
+            min_area: Fraction of changed pixels that counts as motion
+            min_frames: Consecutive motion frames before firing
+            background_alpha: Background adaptation rate per frame (0-1)
+            cooldown_seconds: Minimum time between triggers per device
+            max_devices: Background models kept (least recently seen dropped)
+    """
+
+    def __init__(self, config: Dict):
+        self.decode_flag = _REDUCED_GRAYSCALE.get(config.get('scale', 8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        self.pixel_threshold = float(config.get('pixel_threshold', 25))
+        self.min_area = float(config.get('min_area', 0.02))
+        self.min_frames = max(1, int(config.get('min_frames', 2)))
+        self.alpha = float(config.get('background_alpha', 0.05))
+        self.cooldown = float(config.get('cooldown_seconds', 10))
+        self.max_devices = max(1, int(config.get('max_devices', 16)))
+
+        self._devices: 'OrderedDict[str, _DeviceState]' = OrderedDict()
+        self._lock = Lock()
+
+        # Statistics
+        self.frames = 0
+        self.undecodable = 0
+        self.triggers = 0
+        self.total_time = 0.0
+
+        logger.info(f"Motion detector enabled (threshold {self.pixel_threshold}, min area {self.min_area:.1%})")
+
+    def process(self, device_id: str, frame: bytes) -> Optional[float]:
+        """
+        Update the device's background with a frame
+
+        Returns:
+            Changed-area fraction if the detector fires, else None
+        """
+        start = time.perf_counter()
+        try:
+            gray = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), self.decode_flag)
+            if gray is None:
+                with self._lock:
+                    self.undecodable += 1
+                return None
+            gray = gray.astype(np.float32)
+
+            with self._lock:
+                state = self._devices.get(device_id)
+                if state is None or state.background.shape != gray.shape:
+                    # First frame (or resolution change): becomes the background
+                    self._devices[device_id] = _DeviceState(gray)
+                    self._devices.move_to_end(device_id)
+                    while len(self._devices) > self.max_devices:
+                        self._devices.popitem(last=False)
+                    return None
+                self._devices.move_to_end(device_id)
+
+                diff = np.abs(gray - state.background)
+                score = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+                state.background += self.alpha * (gray - state.background)
+                state.last_score = score
+
+                if score < self.min_area:
+                    state.motion_frames = 0
+                    return None
+
+                state.motion_frames += 1
+                now = time.time()
+                if state.motion_frames < self.min_frames or now - state.last_trigger < self.cooldown:
+                    return None
+
+                state.last_trigger = now
+                state.motion_frames = 0
+                self.triggers += 1
+
+            logger.info(f"Motion detected on stream '{device_id}' ({score:.1%} of the picture changed)")
+            return score
+        finally:
+            with self._lock:
+                self.frames += 1
+                self.total_time += time.perf_counter() - start
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'frames': self.frames,
+                'undecodable': self.undecodable,
+                'triggers': self.triggers,
+                'avg_ms': round(self.total_time / self.frames * 1000, 3) if self.frames else 0.0,
+                'devices': {device_id: round(state.last_score, 4) for device_id, state in self._devices.items()}
+            }
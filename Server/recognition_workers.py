@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Recognition Workers - Process Pool with Shared-Memory Handoff
+==============================================================
+Runs decoding, YuNet and SFace in separate worker processes so that
+several uploads are processed in parallel without competing for the GIL.
+
+Each worker is a `python recognition_workers.py` subprocess that loads
+the ONNX models once. Every worker slot owns a shared-memory block:
+
+    [ JPEG bytes | padding | face records (float32) ]
+
+The request thread copies the upload into the block and sends a one-line
+JSON command over the worker's stdin; the worker decodes straight from
+shared memory, writes one fixed-size record per face back into the same
+block and answers with the face count. Only these small control messages
+cross the pipe - no pickled images or embeddings.
+
+A worker that dies or does not answer within the timeout is killed and
+restarted; if the restart fails, its slot is retired.
+
+Matching against the gallery and face cropping stay in the server
+process (see FaceRecognitionCV.build_results), so the gallery never has
+to be shipped to the workers.
+
+Workers are separate scripts rather than multiprocessing children so that
+spawning them never re-imports app.py (spawn is the only start method on
+Windows).
+"""
+
+import json
+import logging
+import queue
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Face record layout: bbox(4) + landmarks(10) + score + quality + embedding(128)
+EMBEDDING_DIM = 128
+RECORD_FLOATS = 4 + 10 + 2 + EMBEDDING_DIM
+RECORD_BYTES = RECORD_FLOATS * 4
+
+# Maximum faces returned per frame (more are dropped, with a warning)
+MAX_FACES = 32
+
+# Seconds to wait for a worker to load its models
+START_TIMEOUT_S = 60
+
+# Initial shared-memory block size per worker (grown on demand)
+DEFAULT_BLOCK_SIZE = 2 * 1024 * 1024
+
+
+def _results_offset(nbytes: int) -> int:
+    """Start of the face records, 64-byte aligned after the image"""
+    return (nbytes + 63) // 64 * 64
+
+
+def _pack_face(face: Dict, embedding: np.ndarray) -> np.ndarray:
+    record = np.empty(RECORD_FLOATS, dtype=np.float32)
+    record[0:4] = face['bbox']
+    record[4:14] = np.asarray(face['landmarks'], dtype=np.float32).ravel()
+    record[14] = face['score']
+    record[15] = face['quality_score']
+    record[16:] = embedding
+    return record
+
+
+def _unpack_face(record: np.ndarray) -> Tuple[Dict, np.ndarray]:
+    face = {
+        'bbox': record[0:4].astype(int).tolist(),
+        'landmarks': record[4:14].reshape(5, 2).astype(int).tolist(),
+        'score': float(record[14]),
+        'quality_score': float(record[15])
+    }
+    return face, record[16:].copy()
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """Attach to a block owned by the server process"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # The server owns (and unlinks) the block; don't let this
+        # process' resource tracker remove it on exit.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+class _WorkerProcess:
+    """One worker subprocess plus the shared-memory block it reads from"""
+
+    def __init__(self, config: dict, block_size: int, timeout: float = 30.0):
+        self.config = config
+        self.timeout = timeout
+        self.shm = shared_memory.SharedMemory(create=True, size=block_size)
+        self.proc = None
+        self.broken = False
+        self._start()
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve())],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=str(Path(__file__).parent),
+            text=True,
+            bufsize=1
+        )
+        # Replies are read by a thread so that waiting for one can time
+        # out (select() does not work on pipes on Windows)
+        self._replies = queue.Queue()
+        Thread(target=self._read_replies, args=(self.proc.stdout, self._replies),
+               name='recognition-worker-reader', daemon=True).start()
+
+        try:
+            self._send({'config': self.config})
+            reply = self._receive(START_TIMEOUT_S)
+            if not reply.get('ready'):
+                raise RuntimeError(f"Recognition worker failed to start: {reply.get('error')}")
+        except Exception:
+            self.stop(kill=True)
+            raise
+
+    @staticmethod
+    def _read_replies(stdout, replies: queue.Queue):
+        for line in iter(stdout.readline, ''):
+            replies.put(line)
+        replies.put(None)  # Worker exited
+
+    def _send(self, message: dict):
+        self.proc.stdin.write(json.dumps(message) + '\n')
+        self.proc.stdin.flush()
+
+    def _receive(self, timeout: float) -> dict:
+        try:
+            line = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Recognition worker did not answer within {timeout:.0f}s")
+        if line is None:
+            raise RuntimeError("Recognition worker exited")
+        return json.loads(line)
+
+    def _ensure_capacity(self, size: int):
+        if size <= self.shm.size:
+            return
+        new_size = max(size, self.shm.size * 2)
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = shared_memory.SharedMemory(create=True, size=new_size)
+        logger.debug(f"Worker shared memory grown to {new_size} bytes")
+
+    def extract(self, image_bytes: bytes) -> List[Tuple[Dict, np.ndarray]]:
+        """Run detection + embedding in the worker"""
+        nbytes = len(image_bytes)
+        offset = _results_offset(nbytes)
+        self._ensure_capacity(offset + MAX_FACES * RECORD_BYTES)
+
+        self.shm.buf[:nbytes] = image_bytes
+
+        try:
+            self._send({'shm': self.shm.name, 'nbytes': nbytes, 'max_faces': MAX_FACES})
+            reply = self._receive(self.timeout)
+        except (RuntimeError, OSError, ValueError) as e:
+            # Worker died, hangs or the protocol broke - restart for the
+            # next request (a hung worker is killed)
+            try:
+                self.restart(kill=isinstance(e, TimeoutError))
+            except Exception as restart_error:
+                logger.error(f"Recognition worker restart failed: {restart_error}")
+                self.broken = True
+            raise
+
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+
+        if reply.get('dropped'):
+            logger.warning(f"{reply['dropped']} faces beyond MAX_FACES ({MAX_FACES}) dropped")
+
+        count = reply['faces']
+        records = np.ndarray((count, RECORD_FLOATS), dtype=np.float32, buffer=self.shm.buf, offset=offset)
+        embedded = [_unpack_face(record) for record in records]
+        del records
+        return embedded
+
+    def restart(self, kill: bool = False):
+        logger.warning("Restarting recognition worker")
+        self.stop(kill)
+        self._start()
+
+    def stop(self, kill: bool = False):
+        if self.proc and self.proc.poll() is None:
+            if not kill:
+                try:
+                    self.proc.stdin.close()
+                    self.proc.wait(timeout=5)
+                    return
+                except Exception:
+                    pass
+            self.proc.kill()
+            self.proc.wait()
+
+    def close(self):
+        self.stop()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RecognitionWorkerPool:
+    """
+    Pool of recognition worker processes
+
+    Drop-in replacement for FaceRecognitionCV.process_image(): detection
+    and embedding run in a worker, matching and cropping in the caller.
+    """
+
+    def __init__(self, face_rec, config: dict, workers: int = 4, timeout: float = 30.0):
+        self.face_rec = face_rec
+        self.size = max(1, workers)
+
+        worker_config = {'face_recognition': dict(config['face_recognition'], model_pool_size=1)}
+
+        self._workers = queue.Queue()
+        self._all = []
+        for _ in range(self.size):
+            worker = _WorkerProcess(worker_config, DEFAULT_BLOCK_SIZE, timeout)
+            self._all.append(worker)
+            self._workers.put(worker)
+
+        self._stats_lock = Lock()
+        self.processed = 0
+        self.errors = 0
+        self.retired = 0
+        self.total_wait = 0.0
+
+        logger.info(f"✓ Recognition worker pool started ({self.size} processes)")
+
+    @contextmanager
+    def _checkout(self):
+        start = time.perf_counter()
+        worker = self._workers.get()
+        if worker is None:
+            self._workers.put(None)  # Wake the next waiter, too
+            raise RuntimeError("No recognition workers left")
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.total_wait += waited
+        try:
+            yield worker
+        finally:
+            if worker.broken:
+                self._retire(worker)
+            else:
+                self._workers.put(worker)
+
+    def _retire(self, worker: _WorkerProcess):
+        """Drop a worker slot whose process could not be restarted"""
+        with self._stats_lock:
+            self._all.remove(worker)
+            self.retired += 1
+            remaining = len(self._all)
+        try:
+            worker.close()
+        except Exception:
+            pass
+        logger.error(f"Recognition worker slot retired ({remaining} left)")
+        if not remaining:
+            self._workers.put(None)
+
+    def extract_faces(self, image_bytes: bytes) -> List[Tuple[Dict, np.ndarray]]:
+        """Detect faces and extract embeddings in a worker process"""
+        try:
+            with self._checkout() as worker:
+                embedded = worker.extract(image_bytes)
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            logger.error(f"Recognition worker error: {e}")
+            return []
+
+        with self._stats_lock:
+            self.processed += 1
+        return embedded
+
+    def process_image(self, image_bytes, known_embeddings) -> List[Dict]:
+        """
+        Complete pipeline with detection/embedding offloaded to a worker
+
+        Same arguments and results as FaceRecognitionCV.process_image().
+        """
+        # Deferred import: face_recognition_cv pulls in cv2
+        from face_recognition_cv import DecodedFrame
+
+        # The server-side frame is only decoded if a face crop is persisted
+        frame = DecodedFrame.wrap(image_bytes)
+
+        embedded = self.extract_faces(frame.image_bytes)
+
+        if not embedded:
+            return []
+
+        results = self.face_rec.build_results(frame, embedded, known_embeddings)
+
+        logger.info(f"Processed {len(results)} faces (worker)")
+        return results
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'workers': len(self._all),
+                'retired': self.retired,
+                'idle': self._workers.qsize() if self._all else 0,
+                'processed': self.processed,
+                'errors': self.errors,
+                'total_wait_ms': round(self.total_wait * 1000, 1)
+            }
+
+    def close(self):
+        for worker in list(self._all):
+            worker.close()
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+def _reply(message: dict):
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+
+def worker_main():
+    """Worker loop: read commands from stdin, write replies to stdout"""
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr,
+                        format='%(asctime)s - worker - %(levelname)s - %(message)s')
+
+    try:
+        from face_recognition_cv import FaceRecognitionCV, DecodedFrame
+
+        config = json.loads(sys.stdin.readline())['config']
+        config['face_recognition']['enabled'] = True
+        face_rec = FaceRecognitionCV(config)
+    except Exception as e:
+        _reply({'ready': False, 'error': str(e)})
+        return
+
+    _reply({'ready': True})
+
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+
+    for line in sys.stdin:
+        try:
+            command = json.loads(line)
+            name = command['shm']
+
+            if name not in attached:
+                # Server grew its block: drop the old one
+                for old in attached.values():
+                    old.close()
+                attached = {name: _attach_shm(name)}
+            shm = attached[name]
+
+            nbytes = command['nbytes']
+            image = np.ndarray((nbytes,), dtype=np.uint8, buffer=shm.buf)
+            embedded = face_rec.extract_faces(DecodedFrame(image))
+            del image
+
+            dropped = max(0, len(embedded) - command['max_faces'])
+            embedded = embedded[:command['max_faces']]
+            offset = _results_offset(nbytes)
+            records = np.ndarray((len(embedded), RECORD_FLOATS), dtype=np.float32, buffer=shm.buf, offset=offset)
+            for record, (face, embedding) in zip(records, embedded):
+                record[:] = _pack_face(face, embedding)
+            del records
+
+            _reply({'faces': len(embedded), 'dropped': dropped})
+
+        except Exception as e:
+            _reply({'error': str(e)})
+
+    for shm in attached.values():
+        shm.close()
+
+
+if __name__ == '__main__':
+    worker_main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Retention Engine - Background Cleanup of Images, Crops and Events
+=================================================================
+Enforces storage.max_age_days / storage.max_images without pausing ingest:
+
+1. Events beyond the limits are deleted (or moved to event_archive) in
+   small batches, each in its own short transaction, with a pause in
+   between so uploads can take the write lock.
+2. Their images and clips are deleted once no remaining event or face
+   sample references them.
+3. Captured images, face crops and clips that no row references (e.g.
+   uploads without face recognition, crops of replaced samples) are
+   deleted once they are past the limits. Crops backing a face_sample are never
+   deleted - every file is re-checked against the database right before
+   it is removed.
+4. Free database pages are returned with incremental vacuum.
+
+Files are listed and removed through ImageStorage, which also drops
+shard directories left empty. Limits are read from the live config on
+every pass, so changes made on the /config page apply to the next pass.
+"""
+
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionEngine:
+    """
+    Periodic retention passes in a background thread
+
+    Args:
+        db: Database
+        config: Full server config (storage section is read on every pass)
+        storage: ImageStorage with 'images' and 'faces' areas
+    """
+
+    def __init__(self, db, config: dict, storage):
+        self.db = db
+        self.config = config
+        self.storage = storage
+
+        self._wake = Event()
+        self._stop = Event()
+        self._lock = Lock()
+
+        # Progress of the current/last pass and totals
+        self.running = False
+        self.phase = 'idle'
+        self.passes = 0
+        self.errors = 0
+        self.last_started = None
+        self.last_finished = None
+        self.last_duration_s = None
+        self.pass_progress: Dict[str, int] = {}
+        self.totals = {
+            'events_deleted': 0,
+            'events_archived': 0,
+            'images_deleted': 0,
+            'crops_deleted': 0,
+            'clips_deleted': 0,
+            'file_bytes_reclaimed': 0,
+            'db_bytes_reclaimed': 0
+        }
+
+        self._thread = Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+        logger.info(f"Retention engine started (every {self._settings()['interval_minutes']} min)")
+
+    # ------------------------------------------------------------------
+    # Settings
+    # ------------------------------------------------------------------
+
+    def _settings(self) -> Dict:
+        storage = self.config['storage']
+        retention = storage.get('retention', {})
+        return {
+            'max_age_days': int(storage.get('max_age_days', 0) or 0),
+            'max_images': int(storage.get('max_images', 0) or 0),
+            'interval_minutes': retention.get('interval_minutes', 60),
+            'batch_size': retention.get('batch_size', 200),
+            'batch_pause': retention.get('batch_pause_ms', 50) / 1000.0,
+            'archive': retention.get('event_action', 'delete') == 'archive',
+            'vacuum_pages': retention.get('vacuum_pages', 256)
+        }
+
+    # ------------------------------------------------------------------
+    # Thread
+    # ------------------------------------------------------------------
+
+    def trigger(self):
+        """Start a pass now (or right after the one that is running)"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pass()
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logger.error(f"Retention pass failed: {e}")
+            finally:
+                self.db.release()
+
+            self._wake.wait(self._settings()['interval_minutes'] * 60)
+            self._wake.clear()
+
+    def _pause(self, settings: Dict):
+        """Yield the write lock to ingest between batches"""
+        self._stop.wait(settings['batch_pause'])
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.pass_progress[key] = self.pass_progress.get(key, 0) + amount
+            self.totals[key] += amount
+
+    def _set_phase(self, phase: str):
+        with self._lock:
+            self.phase = phase
+
+    # ------------------------------------------------------------------
+    # Pass
+    # ------------------------------------------------------------------
+
+    def run_pass(self):
+        """One complete retention pass (blocking)"""
+        settings = self._settings()
+        started = time.time()
+
+        with self._lock:
+            self.running = True
+            self.last_started = datetime.now().isoformat()
+            self.pass_progress = {key: 0 for key in self.totals}
+
+        try:
+            self._prune_events(settings)
+            self._sweep_files('images', 'images_deleted', settings, max_files=settings['max_images'])
+            self._sweep_files('faces', 'crops_deleted', settings)
+            if 'clips' in self.storage.areas:
+                self._sweep_files('clips', 'clips_deleted', settings, suffix='.mjpeg')
+            self._vacuum(settings)
+        finally:
+            with self._lock:
+                self.running = False
+                self.phase = 'idle'
+                self.passes += 1
+                self.last_finished = datetime.now().isoformat()
+                self.last_duration_s = round(time.time() - started, 2)
+
+        logger.info(f"Retention pass done: {self.pass_progress}")
+
+    def _prune_events(self, settings: Dict):
+        self._set_phase('events')
+
+        cutoff = self.db.get_retention_cutoff(settings['max_age_days'], settings['max_images'])
+        if cutoff is None:
+            return
+
+        while not self._stop.is_set():
+            pruned, image_paths = self.db.prune_events(cutoff, settings['batch_size'], settings['archive'])
+            if not pruned:
+                break
+
+            self._count('events_archived' if settings['archive'] else 'events_deleted', pruned)
+
+            for image_path in image_paths:
+                counter = 'clips_deleted' if image_path.endswith('.mjpeg') else 'images_deleted'
+                self._delete_file(Path(image_path), counter)
+
+            self._pause(settings)
+
+    def _sweep_files(self, area: str, counter: str, settings: Dict, max_files: int = 0, suffix: str = '.jpg'):
+        """
+        Delete unreferenced files older than max_age_days, or beyond the
+        newest max_files (0 = no count limit)
+        """
+        self._set_phase(f'sweep:{area}')
+
+        if settings['max_age_days'] <= 0 and max_files <= 0:
+            return
+
+        files = self.storage.iter_files(area, suffix)
+        files.sort(key=lambda item: item[1], reverse=True)  # Newest first
+
+        expired = []
+        age_limit = time.time() - settings['max_age_days'] * 86400 if settings['max_age_days'] > 0 else None
+        for index, (path, mtime) in enumerate(files):
+            if (age_limit is not None and mtime < age_limit) or (max_files > 0 and index >= max_files):
+                expired.append(path)
+
+        # Cheap pre-filter; every file is re-checked right before deletion
+        protected = self.db.get_sample_image_paths()
+
+        for start in range(0, len(expired), settings['batch_size']):
+            if self._stop.is_set():
+                return
+            for path in expired[start:start + settings['batch_size']]:
+                if str(path) not in protected:
+                    self._delete_file(path, counter)
+            self._pause(settings)
+
+    def _delete_file(self, path: Path, counter: str) -> bool:
+        """Delete a file unless an event or face sample still references it"""
+        if self.db.is_image_referenced(str(path)):
+            return False
+        try:
+            size = self.storage.remove(path)
+        except OSError as e:
+            logger.warning(f"Retention: cannot delete {path}: {e}")
+            return False
+        if size is None:
+            return False
+
+        self._count(counter)
+        self._count('file_bytes_reclaimed', size)
+        return True
+
+    def _vacuum(self, settings: Dict):
+        self._set_phase('vacuum')
+        while not self._stop.is_set():
+            reclaimed = self.db.incremental_vacuum(settings['vacuum_pages'])
+            if reclaimed <= 0:
+                break
+            self._count('db_bytes_reclaimed', reclaimed)
+            self._pause(settings)
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'running': self.running,
+                'phase': self.phase,
+                'passes': self.passes,
+                'errors': self.errors,
+                'last_started': self.last_started,
+                'last_finished': self.last_finished,
+                'last_duration_s': self.last_duration_s,
+                'current_pass': dict(self.pass_progress),
+                'totals': dict(self.totals)
+            }
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Image Storage - Sharded, Collision-Free File Layout
+===================================================
+All stored images (captured uploads and face crops) go through this layer.
+
+Layout:
+    images/2025/03/14/<device_id>/083015_123456_9f3a1c.jpg
+    faces/person_<id>/event_<id>_20250314_083015_9f3a1c.jpg
+    clips/2025/03/14/<device_id>/083010_654321_4b7e20.mjpeg   (if enabled)
+
+Date/device shards keep directories small; the microsecond timestamp plus
+a random suffix makes names unique even for bursts from one device.
+
+Files are addressed by key = "<area>/<path below the area root>". The
+database keeps storing the file path; url_for() turns it into an
+/image/<key> URL and resolve() maps a key back to a file, refusing
+anything outside the area roots. Old flat names (/image/<filename>) still
+resolve to the images area.
+
+Migration of an old flat captured_images/ directory (server stopped):
+    python storage.py migrate [--dry-run]
+"""
+
+import logging
+import os
+import re
+import secrets
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Characters allowed in a device shard directory name
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+# Old flat upload names: {device_id}_{YYYYmmdd_HHMMSS}.jpg
+_FLAT_NAME = re.compile(r'^(?P<device>.+)_(?P<timestamp>\d{8}_\d{6})\.jpg$')
+
+
+def _safe_component(value: Optional[str], default: str = 'unknown') -> str:
+    """Directory-safe version of a client-supplied value (e.g. device_id)"""
+    value = _UNSAFE_CHARS.sub('_', value or '').strip('.')
+    return value[:64] or default
+
+
+class ImageStorage:
+    """
+    Named storage areas ('images', 'faces') with sharded paths
+
+    Args:
+        areas: Area name -> root directory
+    """
+
+    def __init__(self, areas: Dict[str, Path]):
+        self.areas = {name: Path(root) for name, root in areas.items()}
+        for root in self.areas.values():
+            root.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # New files
+    # ------------------------------------------------------------------
+
+    def image_path(self, device_id: Optional[str], when: Optional[datetime] = None) -> Path:
+        """Unique path for a captured image (directories are created)"""
+        when = when or datetime.now()
+        directory = self.areas['images'] / when.strftime('%Y/%m/%d') / _safe_component(device_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"{when.strftime('%H%M%S_%f')}_{secrets.token_hex(3)}.jpg"
+
+    def face_crop_path(self, person_id: int, event_id: int, when: Optional[datetime] = None,
+                       create: bool = True) -> Path:
+        """Unique path for a face crop (directories are created unless create=False)"""
+        when = when or datetime.now()
+        directory = self.areas['faces'] / f"person_{person_id}"
+        if create:
+            directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"event_{event_id}_{when.strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}.jpg"
+
+    def clip_path(self, device_id: Optional[str], when: Optional[datetime] = None) -> Path:
+        """Unique path for an event clip in the 'clips' area (directories are created)"""
+        when = when or datetime.now()
+        directory = self.areas['clips'] / when.strftime('%Y/%m/%d') / _safe_component(device_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"{when.strftime('%H%M%S_%f')}_{secrets.token_hex(3)}.mjpeg"
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def key_for(self, stored_path: str) -> Optional[str]:
+        """Storage key of a stored file path, or None if outside all areas"""
+        if not stored_path:
+            return None
+        path = Path(stored_path)
+        for name, root in self.areas.items():
+            for candidate, base in ((path, root), (path.resolve(), root.resolve())):
+                try:
+                    return f"{name}/{candidate.relative_to(base).as_posix()}"
+                except ValueError:
+                    continue
+        return None
+
+    def url_for(self, stored_path: str, route: str = 'image') -> str:
+        """/image (or /clip) URL of a stored file path (used by the templates)"""
+        key = self.key_for(stored_path)
+        return f"/{route}/{key}" if key else ''
+
+    def locate(self, key: str) -> Optional[Path]:
+        """
+        Path for a storage key (file need not exist yet), built from the
+        configured root like image_path(); None if outside the area root
+
+        Keys without an area (old flat names) are looked up in 'images'.
+        """
+        area, _, rest = key.partition('/')
+        if area not in self.areas or not rest:
+            area, rest = 'images', key
+
+        root = self.areas[area]
+        if root.resolve() not in (root / rest).resolve().parents:
+            return None
+        return root / rest
+
+    def resolve(self, key: str) -> Optional[Path]:
+        """Existing file for a storage key, or None (see locate())"""
+        path = self.locate(key)
+        if path is None or not path.is_file():
+            return None
+        return path.resolve()
+
+    # ------------------------------------------------------------------
+    # Maintenance (retention, migration)
+    # ------------------------------------------------------------------
+
+    def iter_files(self, area: str, suffix: str = '.jpg') -> List[Tuple[Path, float]]:
+        """
+        (path, mtime) of all files with the given suffix in an area
+
+        Paths are built from the configured root, i.e. they compare equal
+        to the paths stored in the database.
+        """
+        files = []
+        stack = [self.areas[area]]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(current / entry.name)
+                        elif entry.name.lower().endswith(suffix):
+                            files.append((current / entry.name, entry.stat().st_mtime))
+            except OSError as e:
+                logger.warning(f"Cannot list {current}: {e}")
+        return files
+
+    def remove(self, path: Path) -> Optional[int]:
+        """
+        Delete a file and any shard directories left empty by it
+
+        Returns:
+            Bytes freed, or None if the file was already gone
+        """
+        path = Path(path)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return None
+
+        roots = {root.resolve() for root in self.areas.values()}
+        parent = path.parent
+        while parent.resolve() not in roots and parent != parent.parent:
+            try:
+                parent.rmdir()  # Only succeeds if empty
+            except OSError:
+                break
+            parent = parent.parent
+
+        return size
+
+    def migrate_flat(self, db, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Move flat files from the images root into date/device shards and
+        rewrite the paths stored in the database
+
+        Each file is renamed inside the transaction that updates its rows,
+        so an interrupted migration can simply be run again.
+        """
+        root = self.areas['images']
+        moved = skipped = 0
+
+        for entry in sorted(os.scandir(root), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.lower().endswith('.jpg'):
+                continue
+
+            match = _FLAT_NAME.match(entry.name)
+            if match:
+                device_id = match.group('device')
+                when = datetime.strptime(match.group('timestamp'), '%Y%m%d_%H%M%S')
+            else:
+                device_id = None
+                when = datetime.fromtimestamp(entry.stat().st_mtime)
+
+            old_path = root / entry.name
+            if dry_run:
+                logger.info(f"Would move {old_path} -> {when:%Y/%m/%d}/{_safe_component(device_id)}/")
+                moved += 1
+                continue
+
+            new_path = self.image_path(device_id, when)
+            try:
+                with db.transaction():
+                    db.rename_image_path(str(old_path), str(new_path))
+                    os.replace(old_path, new_path)
+                moved += 1
+            except OSError as e:
+                logger.error(f"Cannot migrate {old_path}: {e}")
+                skipped += 1
+
+        logger.info(f"Storage migration: {moved} files moved, {skipped} skipped")
+        return {'moved': moved, 'skipped': skipped}
+
+
+def main():
+    """Command line: python storage.py migrate [--dry-run]"""
+    import argparse
+    import yaml
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Image storage maintenance")
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('--dry-run', action='store_true', help="Only list what would be moved")
+    parser.add_argument('--config', default=str(Path(__file__).parent / 'config.yaml'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+
+    storage = ImageStorage({
+        'images': Path(config['storage']['image_dir']),
+        'faces': Path(config['face_recognition']['faces_dir'])
+    })
+    db = Database(config['face_recognition']['db_path'])
+    try:
+        storage.migrate_flat(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
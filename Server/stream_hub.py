@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Stream Hub - Event-Driven MJPEG Broadcasting
+============================================
+Live stream frames are published once and fanned out to all viewers.
+
+Every published frame gets a sequence number. Viewers sleep on a condition
+variable until a frame newer than the one they sent last is published -
+no polling, and no frame is sent twice. A viewer that is slower than the
+camera (or capped by its FPS limit) simply gets the latest frame when it
+is ready again; frames in between are skipped, never queued.
+
+Each camera (device_id) has its own channel in the StreamHub. A channel
+holds only its latest frame and the number of channels is capped (least
+recently active device is dropped), so memory stays bounded no matter how
+many devices connect. MosaicComposer tiles all channels into one picture.
+
+/stream_ingest feeds a channel from one long-running upload that carries
+many frames (read_mjpeg_parts), instead of one POST per frame.
+
+Renditions (e.g. 'medium', 'low') are smaller/lower-quality versions for
+slow links. A rendition of a frame is transcoded lazily - only when a
+viewer of that rendition is about to send the frame - and at most once:
+all viewers of the same rendition share the result.
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MJPEG_BOUNDARY = 'frame'
+
+
+def mjpeg_part(frame: bytes) -> bytes:
+    """One part of a multipart/x-mixed-replace MJPEG response"""
+    return (b'--' + MJPEG_BOUNDARY.encode() + b'\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            b'Content-Length: ' + str(len(frame)).encode() + b'\r\n\r\n' + frame + b'\r\n')
+
+
+def transcode_jpeg(frame: bytes, max_width: int, quality: int,
+                   source_width: Optional[int] = None) -> Tuple[Optional[bytes], Optional[int]]:
+    """
+    Re-encode a JPEG, downscaled to at most max_width (0 = keep size)
+
+    If the source width is known (from the previous frame of the same
+    camera), the JPEG is decoded at 1/2, 1/4 or 1/8 size right away,
+    which is much cheaper than a full decode.
+
+    Returns:
+        (JPEG bytes or None if undecodable, full source width)
+    """
+    flag, factor = cv2.IMREAD_COLOR, 1
+    if max_width and source_width:
+        for reduced_flag, reduced_factor in ((cv2.IMREAD_REDUCED_COLOR_8, 8),
+                                             (cv2.IMREAD_REDUCED_COLOR_4, 4),
+                                             (cv2.IMREAD_REDUCED_COLOR_2, 2)):
+            if source_width // reduced_factor >= max_width:
+                flag, factor = reduced_flag, reduced_factor
+                break
+
+    image = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), flag)
+    if image is None:
+        return None, source_width
+
+    height, width = image.shape[:2]
+    if max_width and width > max_width:
+        image = cv2.resize(image, (max_width, max(1, height * max_width // width)), interpolation=cv2.INTER_AREA)
+
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return (buffer.tobytes() if ok else None), width * factor
+
+
+def read_mjpeg_parts(stream, max_frame_bytes: int) -> Iterator[bytes]:
+    """
+    JPEG frames from a continuous multipart body (/stream_ingest)
+
+    Every part needs a Content-Length header, so frames are read with
+    exact-size reads instead of scanning for the boundary:
+
+        --frame
+        Content-Type: image/jpeg
+        Content-Length: 12345
+
+        <12345 bytes JPEG>
+
+    Raises:
+        ValueError: Malformed part or frame larger than max_frame_bytes
+    """
+    while True:
+        # Boundary line (blank lines between parts are tolerated)
+        line = stream.readline(1024)
+        if not line:
+            return
+        if not line.strip():
+            continue
+        if not line.startswith(b'--'):
+            raise ValueError("Expected multipart boundary")
+        if line.rstrip().endswith(b'--'):
+            return  # Closing boundary
+
+        length = None
+        while True:
+            header = stream.readline(1024)
+            if not header:
+                return  # Sender closed mid-part
+            if not header.strip():
+                break
+            name, _, value = header.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                value = value.strip()
+                if not (value.isascii() and value.isdigit()):
+                    raise ValueError(f"Invalid Content-Length: {value[:20]!r}")
+                length = int(value)
+
+        if length is None:
+            raise ValueError("Part without Content-Length")
+        if length > max_frame_bytes:
+            raise ValueError(f"Frame too large ({length} bytes)")
+
+        chunks = []
+        remaining = length
+        while remaining:
+            chunk = stream.read(remaining)
+            if not chunk:
+                return  # Sender closed mid-frame
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        yield b''.join(chunks)
+
+
+class FrameBroadcaster:
+    """
+    Latest-frame broadcaster with sequence numbers
+
+    Args:
+        keepalive_s: Re-send the current frame after this long without a
+            new one, so disconnected viewers are noticed and released
+        renditions: Name -> {'width': max width (0 = original),
+            'quality': JPEG quality (omitted = default_quality())}
+        default_quality: Returns the JPEG quality for renditions without one
+    """
+
+    def __init__(self, keepalive_s: float = 10.0, renditions: Optional[Dict[str, Dict]] = None,
+                 default_quality: Optional[Callable[[], int]] = None):
+        self.keepalive_s = keepalive_s
+        self.renditions = renditions or {}
+        self.default_quality = default_quality or (lambda: 80)
+
+        self._cond = Condition()
+        self._frame: Optional[bytes] = None
+        self._seq = 0
+        self._closed = False
+
+        # Latest transcoded frame per rendition; one lock per rendition so
+        # concurrent viewers wait for (and share) a single transcode
+        self._rendition_cache: Dict[str, Tuple[int, bytes]] = {}
+        self._rendition_locks = {name: Lock() for name in self.renditions}
+        self._source_width: Optional[int] = None
+
+        # Statistics
+        self.viewers = 0
+        self.rendition_viewers = {name: 0 for name in self.renditions}
+        self.transcodes = {name: 0 for name in self.renditions}
+        self.transcode_time = 0.0
+        self.frames_published = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.last_frame_at = None
+
+    def publish(self, frame: bytes) -> int:
+        """Make frame the current frame and wake all viewers; returns its sequence number"""
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self.frames_published += 1
+            self.last_frame_at = time.time()
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self) -> Tuple[int, Optional[bytes]]:
+        """(sequence number, frame) of the current frame"""
+        with self._cond:
+            return self._seq, self._frame
+
+    def wait_frame(self, after_seq: int, timeout: Optional[float] = None) -> Tuple[int, Optional[bytes]]:
+        """
+        Block until a frame newer than after_seq is published
+
+        Returns:
+            (seq, frame); frame is None on timeout or close
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq or self._closed, timeout):
+                return after_seq, None
+            if self._closed:
+                return after_seq, None
+            return self._seq, self._frame
+
+    def render(self, seq: int, frame: bytes, rendition: str) -> bytes:
+        """Frame seq in the given rendition (transcoded once, then shared)"""
+        spec = self.renditions[rendition]
+        with self._rendition_locks[rendition]:
+            cached = self._rendition_cache.get(rendition)
+            if cached is not None and cached[0] >= seq:
+                return cached[1]
+
+            start = time.perf_counter()
+            data, self._source_width = transcode_jpeg(
+                frame, spec.get('width', 0), spec.get('quality') or self.default_quality(), self._source_width
+            )
+            if data is None:
+                data = frame  # Undecodable: pass through unchanged
+            self._rendition_cache[rendition] = (seq, data)
+
+            with self._cond:
+                self.transcodes[rendition] += 1
+                self.transcode_time += time.perf_counter() - start
+            return data
+
+    def frames(self, fps: float = 0, rendition: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Frames for one viewer: each new frame at most once, at most fps
+        frames per second (0 = as fast as they are published), in the
+        given rendition (None = frames as published)
+
+        Raises:
+            ValueError: Unknown rendition
+        """
+        if rendition is not None and rendition not in self.renditions:
+            raise ValueError(f"Unknown rendition '{rendition}'")
+
+        min_interval = 1.0 / fps if fps > 0 else 0.0
+        last_seq = 0
+        next_send = 0.0
+
+        with self._cond:
+            self.viewers += 1
+            if rendition is not None:
+                self.rendition_viewers[rendition] += 1
+        try:
+            while not self._closed:
+                # FPS cap: sleep first, then take whatever is newest by then
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                seq, frame = self.wait_frame(last_seq, self.keepalive_s)
+                if frame is None:
+                    if self._closed:
+                        break
+                    seq, frame = self.latest()  # Keepalive
+                    if frame is None:
+                        continue
+
+                if last_seq and seq > last_seq + 1:
+                    with self._cond:
+                        self.frames_skipped += seq - last_seq - 1
+                last_seq = seq
+                next_send = time.monotonic() + min_interval
+
+                if rendition is not None:
+                    frame = self.render(seq, frame, rendition)
+
+                with self._cond:
+                    self.frames_sent += 1
+                yield frame
+        finally:
+            with self._cond:
+                self.viewers -= 1
+                if rendition is not None:
+                    self.rendition_viewers[rendition] -= 1
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'viewers': self.viewers,
+                'frames_published': self.frames_published,
+                'frames_sent': self.frames_sent,
+                'frames_skipped': self.frames_skipped,
+                'last_frame_age_s': round(time.time() - self.last_frame_at, 1) if self.last_frame_at else None,
+                'renditions': {
+                    name: {'viewers': self.rendition_viewers[name], 'transcodes': self.transcodes[name]}
+                    for name in self.renditions
+                },
+                'transcode_ms_total': round(self.transcode_time * 1000, 1)
+            }
+
+    def close(self):
+        """Release all waiting viewers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamHub:
+    """
+    Live stream channels per device (one FrameBroadcaster each)
+
+    Args:
+        max_devices: Channels kept; publishing for a new device beyond this
+            drops the least recently active one (its viewers are ended)
+        keepalive_s, renditions, default_quality: See FrameBroadcaster
+    """
+
+    def __init__(self, max_devices: int = 16, keepalive_s: float = 10.0,
+                 renditions: Optional[Dict[str, Dict]] = None,
+                 default_quality: Optional[Callable[[], int]] = None):
+        self.max_devices = max(1, max_devices)
+        self.keepalive_s = keepalive_s
+        self.renditions = renditions or {}
+        self.default_quality = default_quality
+
+        self._lock = Condition()
+        self._channels: 'OrderedDict[str, FrameBroadcaster]' = OrderedDict()  # Least recently active first
+        self.evicted = 0
+
+    def publish(self, device_id: str, frame: bytes) -> int:
+        """Publish a frame on the device's channel (created on first frame)"""
+        evicted = []
+        with self._lock:
+            channel = self._channels.get(device_id)
+            if channel is None:
+                channel = self.new_broadcaster()
+                self._channels[device_id] = channel
+                while len(self._channels) > self.max_devices:
+                    evicted.append(self._channels.popitem(last=False))
+                    self.evicted += 1
+                self._lock.notify_all()
+            self._channels.move_to_end(device_id)
+
+        for old_device, old_channel in evicted:
+            logger.info(f"Stream channel '{old_device}' dropped (max_devices={self.max_devices})")
+            old_channel.close()
+
+        return channel.publish(frame)
+
+    def new_broadcaster(self) -> FrameBroadcaster:
+        """Broadcaster with this hub's keepalive and renditions"""
+        return FrameBroadcaster(self.keepalive_s, self.renditions, self.default_quality)
+
+    def channel(self, device_id: Optional[str] = None) -> Optional[FrameBroadcaster]:
+        """Channel of a device, or of the most recently active device if None"""
+        with self._lock:
+            if device_id is None:
+                return next(reversed(self._channels.values()), None)
+            return self._channels.get(device_id)
+
+    def wait_channel(self, timeout: Optional[float] = None) -> Optional[FrameBroadcaster]:
+        """Most recently active channel; waits for the first device if there is none yet"""
+        with self._lock:
+            self._lock.wait_for(lambda: self._channels, timeout)
+            return next(reversed(self._channels.values()), None)
+
+    def devices(self) -> List[str]:
+        """Device ids, most recently active first"""
+        with self._lock:
+            return list(reversed(self._channels))
+
+    def snapshot(self) -> List[Tuple[str, int, bytes]]:
+        """(device_id, seq, frame) of every channel that has a frame, sorted by device_id"""
+        with self._lock:
+            channels = sorted(self._channels.items())
+        frames = []
+        for device_id, channel in channels:
+            seq, frame = channel.latest()
+            if frame is not None:
+                frames.append((device_id, seq, frame))
+        return frames
+
+    def stats(self) -> Dict:
+        with self._lock:
+            channels = list(self._channels.items())
+        return {
+            'devices': len(channels),
+            'max_devices': self.max_devices,
+            'evicted': self.evicted,
+            'channels': {device_id: channel.stats() for device_id, channel in channels}
+        }
+
+    def close(self):
+        with self._lock:
+            channels, self._channels = list(self._channels.values()), OrderedDict()
+        for channel in channels:
+            channel.close()
+
+
+class MosaicComposer:
+    """
+    Tiles the latest frame of every channel into one JPEG
+
+    Runs only while the mosaic has viewers, and re-composes only when a
+    channel has a new frame, at most fps times per second.
+
+    Args:
+        hub: StreamHub
+        fps: Composition rate
+        tile_size: (width, height) of one tile
+        jpeg_quality: JPEG quality of the mosaic
+    """
+
+    def __init__(self, hub: StreamHub, fps: float = 2.0, tile_size: Tuple[int, int] = (320, 240),
+                 jpeg_quality: int = 80):
+        self.hub = hub
+        self.fps = max(0.1, fps)
+        self.tile_size = tile_size
+        self.jpeg_quality = jpeg_quality
+
+        self.broadcaster = hub.new_broadcaster()
+        self.compositions = 0
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="stream-mosaic", daemon=True)
+        self._thread.start()
+
+    def compose(self, frames: List[Tuple[str, int, bytes]]) -> Optional[bytes]:
+        """One mosaic JPEG from (device_id, seq, frame) tuples"""
+        tile_w, tile_h = self.tile_size
+        cols = math.ceil(math.sqrt(len(frames)))
+        rows = math.ceil(len(frames) / cols)
+        mosaic = np.zeros((rows * tile_h, cols * tile_w, 3), dtype=np.uint8)
+
+        for index, (device_id, _, frame) in enumerate(frames):
+            # Decode at reduced size; tiles are much smaller than camera frames
+            image = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+            if image is None:
+                continue
+            tile = cv2.resize(image, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+            cv2.putText(tile, device_id, (6, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            y, x = divmod(index, cols)
+            mosaic[y * tile_h:(y + 1) * tile_h, x * tile_w:(x + 1) * tile_w] = tile
+
+        ok, buffer = cv2.imencode('.jpg', mosaic, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buffer.tobytes() if ok else None
+
+    def _run(self):
+        last_key = None
+        while not self._stop.wait(1.0 / self.fps):
+            if not self.broadcaster.viewers:
+                continue
+            frames = self.hub.snapshot()
+            key = tuple((device_id, seq) for device_id, seq, _ in frames)
+            if not frames or key == last_key:
+                continue
+            try:
+                mosaic = self.compose(frames)
+            except Exception as e:
+                logger.error(f"Mosaic composition failed: {e}")
+                continue
+            last_key = key
+            if mosaic is not None:
+                self.compositions += 1
+                self.broadcaster.publish(mosaic)
+
+    def stats(self) -> Dict:
+        stats = self.broadcaster.stats()
+        stats['compositions'] = self.compositions
+        return stats
+
+    def close(self):
+        self._stop.set()
+        self.broadcaster.close()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Server modules are imported as top-level modules (as app.py does)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,77 @@
+"""IVFIndex top-1 must agree with exact FaceGallery search"""
+
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from face_gallery import FaceGallery, normalize_embeddings
+
+DIM = 32
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(42)
+
+
+def make_gallery(rng, persons=20, per_person=5):
+    centers = normalize_embeddings(rng.normal(size=(persons, DIM)))
+    rows, person_ids = [], []
+    for person_id, center in enumerate(centers, start=1):
+        for _ in range(per_person):
+            rows.append(center + 0.05 * rng.normal(size=DIM))
+            person_ids.append(person_id)
+    sample_ids = np.arange(1, len(rows) + 1)
+    return FaceGallery(np.array(rows), np.array(person_ids), sample_ids)
+
+
+def queries_near(rng, gallery, n=30):
+    picks = rng.choice(len(gallery), n, replace=False)
+    return gallery.matrix[picks] + 0.01 * rng.normal(size=(n, DIM))
+
+
+def assert_same_top1(index, gallery, queries):
+    ivf_ids, ivf_dist = index.search(queries)
+    exact_ids, exact_dist = gallery.search(queries)
+    np.testing.assert_array_equal(ivf_ids[:, 0], exact_ids[:, 0])
+    np.testing.assert_allclose(ivf_dist[:, 0], exact_dist[:, 0], atol=1e-5)
+
+
+def test_top1_matches_exact_search(rng):
+    gallery = make_gallery(rng)
+    index = IVFIndex(nlist=8, nprobe=2)
+    index.build(gallery)
+
+    assert len(index) == len(gallery)
+    assert_same_top1(index, gallery, queries_near(rng, gallery))
+
+
+def test_top1_after_add_remove_relabel(rng):
+    gallery = make_gallery(rng)
+    index = IVFIndex(nlist=8, nprobe=2)
+    index.build(gallery)
+
+    # Add a new person
+    center = normalize_embeddings(rng.normal(size=DIM))
+    new = normalize_embeddings(center + 0.05 * rng.normal(size=(3, DIM)))
+    for i, row in enumerate(new):
+        sample_id = 1000 + i
+        index.add(sample_id, 99, row)
+        gallery = gallery.with_sample(sample_id, 99, row)
+    assert_same_top1(index, gallery, np.vstack([new, queries_near(rng, gallery)]))
+
+    # Remove single samples and a whole person
+    for sample_id in (1, 7, 1001):
+        index.remove(sample_id)
+        gallery = gallery.filtered(gallery.sample_ids != sample_id)
+    index.remove_person(3)
+    gallery = gallery.filtered(gallery.person_ids != 3)
+    assert len(index) == len(gallery)
+    assert_same_top1(index, gallery, queries_near(rng, gallery))
+
+    # Merge person 5 into person 6
+    index.relabel(5, 6)
+    gallery = gallery.relabeled(5, 6)
+    queries = queries_near(rng, gallery)
+    assert_same_top1(index, gallery, queries)
+    assert 5 not in index.search(queries)[0]
@@ -0,0 +1,55 @@
+"""Group commit: read-your-writes, dropped groups, nested rollback"""
+
+import numpy as np
+import pytest
+
+from database import Database
+from event_writer import WriteFailedError
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "faces.db"), group_commit={'enabled': True, 'flush_interval_ms': 10})
+    yield db
+    db.close()
+
+
+def test_read_your_writes(db):
+    event_id = db.create_event("a.jpg", status="UNKNOWN")
+    person_id = db.create_person()
+    db.add_face_sample(person_id, np.ones(128, dtype=np.float32), "a.jpg")
+
+    # Visible right away, without waiting for the flush interval
+    assert db.get_event(event_id)['image_path'] == "a.jpg"
+    assert db.get_person(person_id) is not None
+    assert len(db.get_face_samples(person_id)) == 1
+
+
+def test_failed_group_raises(db):
+    with db.transaction():
+        event_id = db.create_event("a.jpg")
+        db._queue_write('event', "INSERT INTO nope VALUES (1)", ())
+
+    with pytest.raises(WriteFailedError):
+        db.get_event(event_id)
+
+    # Reported once; the whole group was dropped
+    assert db.get_event(event_id) is None
+    assert db.writer.stats()['failed_groups'] == 1
+
+
+def test_nested_rollback_drops_queued_writes(db):
+    with pytest.raises(ValueError):
+        with db.transaction():
+            person_id = db.create_person()
+            with db.transaction():
+                event_id = db.create_event("a.jpg", person_id=person_id)
+                raise ValueError("abort")
+
+    db.writer.flush()
+    assert db.get_person(person_id) is None
+    assert db.get_event(event_id) is None
+
+    # The thread keeps working after the rollback
+    event_id = db.create_event("b.jpg")
+    assert db.get_event(event_id)['image_path'] == "b.jpg"